@@ -1,10 +1,10 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from .config import Config
+from .storage import RoutingSession, configure_storage, init_storage
 import os
-import stripe
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 def create_free_agent_team():
     from .models import Team  # avoid circular import
@@ -23,6 +23,22 @@ def create_free_agent_team():
         db.session.commit()
 
 
+def setup_database():
+    """
+    Create missing tables, apply migrations and seed the Free Agent Pool.
+    Needs an app context. Idempotent; `flask init-db` runs it once per deploy.
+    """
+    db.create_all()
+
+    # bring older database files up to the current schema
+    from .migrations import upgrade
+    applied = upgrade()
+
+    # ⭐ Create Free Agent Pool here (Flask 3.1-compatible)
+    create_free_agent_team()
+    return applied
+
+
 def create_app():
     app = Flask(__name__, template_folder="templates", static_folder="static")
 
@@ -30,27 +46,40 @@ def create_app():
     app.config.from_object(Config)
 
     # Core config
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///sports.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///sports.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = 'dev-secret'
 
-    # Stripe config
-    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    # Stripe config (the stripe module itself is imported by app/payments.py on first use)
     app.config['STRIPE_SECRET_KEY'] = os.environ.get('STRIPE_SECRET_KEY')
     app.config['STRIPE_PUBLIC_KEY'] = os.environ.get('STRIPE_PUBLIC_KEY')
     app.config['APP_COMMISSION'] = 0.05
 
-    # Init DB
+    # Init DB (WAL pragmas, single writer engine, read-only "reader" bind)
+    configure_storage(app)
     db.init_app(app)
 
+    # background task runner (after-commit follow-ups)
+    from .tasks import init_tasks
+    init_tasks(app)
+
+    # KDF work on its own process pool (app/passwords.py)
+    from .passwords import init_passwords
+    init_passwords(app)
+
     with app.app_context():
+        init_storage(app, db)
+
         # import routes + models
         from . import routes, models
 
-        # Create tables
-        db.create_all()
+        # entity-versioned response cache (app/cache.py)
+        from .cache import init_cache
+        init_cache(app)
 
-        # ⭐ Create Free Agent Pool here (Flask 3.1-compatible)
-        create_free_agent_team()
+        # schema checks and seeding; with SCHEMA_ON_BOOT=0 workers skip them
+        # and `flask init-db` runs them once instead
+        if app.config["SCHEMA_ON_BOOT"]:
+            setup_database()
 
     return app
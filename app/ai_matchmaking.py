@@ -1,26 +1,170 @@
 # ai_matchmaking.py
 import random
-from app.models import Team  # adjust import path as needed
-import stripe
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+from math import inf
+from app import db
+from app.models import Team, Venue  # adjust import path as needed
+from app.utils import ring_cells, ring_clearance_km, haversine_km, geo_midpoint
+
+
+DEFAULT_RATING = 1000
+OPPONENT_WINDOW = 300
+# rings of VENUE_CELL_DEG cells to search before giving up (~5 degrees)
+MAX_VENUE_RINGS = 50
+
+TeamEntry = namedtuple("TeamEntry", "id name skill_rating sport")
+
+
+def _is_pool(team):
+    return bool(getattr(team, "is_free_agent_pool", False)) or team.name == "Free Agent Pool"
+
+
+class OpponentIndex:
+    """
+    In-process, per-sport sorted list of (skill_rating, team_id) so opponent
+    lookups are a bisect plus a slice instead of a Team table scan.
+    Loaded lazily on first use; call update()/remove() whenever a team's
+    rating, name or sport changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_sport = {}
+        self._entries = {}
+        self._loaded = False
+
+    def _key(self, sport):
+        return (sport or "").lower()
+
+    def _load(self):
+        rows = db.session.query(
+            Team.id, Team.name, Team.skill_rating, Team.sport, Team.is_free_agent_pool
+        ).all()
+        by_sport, entries = {}, {}
+        for team in rows:
+            if _is_pool(team):
+                continue
+            entry = TeamEntry(team.id, team.name, team.skill_rating or DEFAULT_RATING, team.sport)
+            entries[team.id] = entry
+            by_sport.setdefault(self._key(team.sport), []).append((entry.skill_rating, team.id))
+        for ratings in by_sport.values():
+            ratings.sort()
+        self._by_sport, self._entries, self._loaded = by_sport, entries, True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+
+    def _discard(self, team_id):
+        old = self._entries.pop(team_id, None)
+        if old:
+            ratings = self._by_sport.get(self._key(old.sport), [])
+            pos = bisect_left(ratings, (old.skill_rating, team_id))
+            if pos < len(ratings) and ratings[pos] == (old.skill_rating, team_id):
+                del ratings[pos]
+
+    def update(self, team):
+        if not self._loaded or team.id is None:
+            return
+        with self._lock:
+            self._discard(team.id)
+            if _is_pool(team):
+                return
+            entry = TeamEntry(team.id, team.name, team.skill_rating or DEFAULT_RATING, team.sport)
+            self._entries[team.id] = entry
+            insort(self._by_sport.setdefault(self._key(team.sport), []), (entry.skill_rating, team.id))
+
+    def remove(self, team_id):
+        with self._lock:
+            self._discard(team_id)
+
+    def reset(self):
+        with self._lock:
+            self._by_sport, self._entries, self._loaded = {}, {}, False
+
+    def nearby(self, team, k=3, window=OPPONENT_WINDOW):
+        """
+        Up to k teams of the same sport rated within `window` of `team`, picked
+        at random; if none are that close, the k nearest ratings instead.
+        """
+        self._ensure_loaded()
+        rating = team.skill_rating or DEFAULT_RATING
+        with self._lock:
+            ratings = self._by_sport.get(self._key(team.sport), [])
+            lo = bisect_right(ratings, (rating - window, inf))
+            hi = bisect_left(ratings, (rating + window, -inf))
+            picks = random.sample(range(lo, hi), min(hi - lo, k + 1))
+            ids = [ratings[i][1] for i in picks if ratings[i][1] != team.id][:k]
+            if not ids:
+                # walk outwards from the team's position for the nearest ratings
+                left = bisect_left(ratings, (rating, -inf)) - 1
+                right = left + 1
+                while len(ids) < k and (left >= 0 or right < len(ratings)):
+                    take_left = right >= len(ratings) or (
+                        left >= 0 and rating - ratings[left][0] <= ratings[right][0] - rating
+                    )
+                    i = left if take_left else right
+                    if take_left:
+                        left -= 1
+                    else:
+                        right += 1
+                    if ratings[i][1] != team.id:
+                        ids.append(ratings[i][1])
+            return [self._entries[i] for i in ids]
+
+
+opponent_index = OpponentIndex()
 
 
 def recommend_opponents(team):
     """Suggest teams close in skill rating to the given team."""
     if not team:
         return []
-    all_teams = Team.query.filter(Team.id != team.id).all()
-    # compute average or existing skill rating on teams
-    candidates = [t for t in all_teams if abs((t.skill_rating or 1000) - (team.skill_rating or 1000)) < 300]
-    if not candidates:
-        return random.sample(all_teams, min(len(all_teams), 3))
-    return random.sample(candidates, min(len(candidates), 3))
-
-def recommend_venues(team):
-    """Suggest venues — prioritise same city if team has a ‘city’ attribute."""
-    venues = Venue.query.all()
-    if hasattr(team, "city") and team.city:
-        same_city = [v for v in venues if getattr(v, "city", None) == team.city]
-        if len(same_city) >= 3:
-            return random.sample(same_city, 3)
-    # fallback
-    return random.sample(venues, min(len(venues), 3))
+    return opponent_index.nearby(team)
+
+def nearest_venues(lat, lon, k=3, max_rings=MAX_VENUE_RINGS):
+    """
+    The k venues closest to (lat, lon). Grid rings around the point are read
+    through the indexed grid_cell column, one ring per query, until the k-th
+    best distance is closer than anything an unread ring could hold.
+    Each returned venue carries a transient distance_km attribute.
+    """
+    found = []
+    for r in range(max_rings + 1):
+        cells = ring_cells(lat, lon, r)
+        for v in Venue.query.filter(Venue.grid_cell.in_(cells)).all():
+            found.append((haversine_km(lat, lon, v.latitude, v.longitude), v.id, v))
+        if len(found) >= k:
+            found.sort(key=lambda t: (t[0], t[1]))
+            if found[k - 1][0] <= ring_clearance_km(lat, r):
+                break
+    found.sort(key=lambda t: (t[0], t[1]))
+    venues = []
+    for dist, _, v in found[:k]:
+        v.distance_km = round(dist, 2)
+        venues.append(v)
+    return venues
+
+
+def recommend_venues(team, k=3):
+    """Suggest the venues nearest the team's home ground."""
+    if not team or team.latitude is None or team.longitude is None:
+        return []
+    return nearest_venues(team.latitude, team.longitude, k)
+
+
+def recommend_venues_for_match(match, k=3):
+    """Suggest venues near the midpoint of the two teams (or the one that has a location)."""
+    points = [(t.latitude, t.longitude) for t in (match.team1, match.team2)
+              if t and t.latitude is not None and t.longitude is not None]
+    if not points:
+        return []
+    if len(points) == 2:
+        lat, lon = geo_midpoint(points[0][0], points[0][1], points[1][0], points[1][1])
+    else:
+        lat, lon = points[0]
+    return nearest_venues(lat, lon, k)
@@ -1,38 +1,4 @@
 import random
-import stripe
-
-
-def update_skill_rating(player, wins, total_matches):
-    """
-    Dynamically updates the player's skill rating based on their win rate.
-    Called after each match or when viewing player stats.
-    """
-
-    # Prevent divide-by-zero errors
-    if total_matches == 0:
-        return getattr(player, "skill_rating", 1000)
-
-    win_rate = (wins / total_matches) * 100
-    base_rating = getattr(player, "skill_rating", 1000)
-
-    # Simple ELO-style adjustment
-    if win_rate > 70:
-        new_rating = base_rating + random.randint(20, 50)
-    elif win_rate > 50:
-        new_rating = base_rating + random.randint(5, 20)
-    elif win_rate > 30:
-        new_rating = base_rating - random.randint(5, 15)
-    else:
-        new_rating = base_rating - random.randint(15, 40)
-
-    # Clamp rating between 500 and 2000
-    new_rating = max(500, min(2000, new_rating))
-
-    # Save to player if applicable
-    if hasattr(player, "skill_rating"):
-        player.skill_rating = new_rating
-
-    return new_rating
 
 
 def generate_ai_recommendations(player, stats=None, sport=None, win_rate=None, skill_rating=None):
@@ -0,0 +1,231 @@
+# cache.py
+"""
+Response cache for the hottest read pages, invalidated by entity versions.
+
+Every write to a team, player (or its skills) or match bumps a counter in
+the entity_version table, inside the same transaction as the write:
+
+    team:<id>     the team row, its players and skills, its matches
+    player:<id>   the player row and skills
+    match:<id>    the match row
+    teams         any team        matches   any match
+
+ORM flushes bump exactly the rows they touch. Bulk Core statements run
+through the session (settlement, schedules) either name what they touch
+with execution_options(touches=[...]) or bump the table-wide "<table>:*"
+key that every page depending on that table includes.
+
+A cached page's key is its path plus the current versions of what it
+depends on, so a write makes the old entry unreachable; nothing is ever
+deleted by hand, stale entries just age out. Versions live in the database,
+so every worker agrees on them; rendered bodies live in a per-process LRU
+(CACHE_MAX_BYTES) or, with CACHE_REDIS_URL, in Redis shared by all workers.
+"""
+import pickle
+import threading
+from collections import OrderedDict
+from flask import current_app, make_response, request, session
+from sqlalchemy import event
+from app import db
+from app.models import EntityVersion, Match, Player, PlayerSkill, Team
+from app.storage import RoutingSession
+
+TABLES = ("team", "player", "player_skill", "match")
+
+
+# -------------------------
+# Versions
+# -------------------------
+def _upsert(conn, keys):
+    table = EntityVersion.__table__
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table).on_conflict_do_update(index_elements=[table.c.key],
+                                                set_={"version": table.c.version + 1})
+    conn.execute(stmt, [{"key": k, "version": 1} for k in sorted(keys)])
+
+
+def _touched_by_flush(session):
+    keys, skill_players = set(), set()
+
+    def both(instance, attr):
+        """Current and (if it changed in this flush) previous value of a column."""
+        hist = db.inspect(instance).attrs[attr].history
+        return {v for v in (getattr(instance, attr), *hist.deleted) if v is not None}
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Team):
+            keys.update((f"team:{obj.id}", "teams"))
+        elif isinstance(obj, Player):
+            keys.add(f"player:{obj.id}")
+            keys.update(f"team:{t}" for t in both(obj, "team_id"))
+        elif isinstance(obj, PlayerSkill):
+            keys.add(f"player:{obj.player_id}")
+            skill_players.add(obj.player_id)
+        elif isinstance(obj, Match):
+            keys.update((f"match:{obj.id}", "matches"))
+            keys.update(f"team:{t}" for t in both(obj, "team1_id") | both(obj, "team2_id"))
+    return keys, skill_players
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _bump_flushed(session, flush_context):
+    keys, skill_players = _touched_by_flush(session)
+    if skill_players:
+        conn = session.connection()
+        rows = conn.execute(db.select(Player.team_id).where(Player.id.in_(skill_players), Player.team_id.isnot(None)))
+        keys.update(f"team:{team_id}" for (team_id,) in rows)
+    if keys:
+        _upsert(session.connection(), keys)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _bump_bulk(state):
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    table = getattr(state.statement, "table", None)
+    name = getattr(table, "name", None)
+    if name not in TABLES:
+        return
+    keys = state.execution_options.get("touches") or [f"{name}:*"]
+    _upsert(state.session.connection(bind_arguments={"clause": state.statement}), keys)
+
+
+def versions(keys):
+    """{key: version} for keys; keys never written are 0."""
+    found = dict(db.session.query(EntityVersion.key, EntityVersion.version).filter(EntityVersion.key.in_(keys)))
+    return {k: found.get(k, 0) for k in keys}
+
+
+def team_keys(team_id):
+    return [f"team:{team_id}", "team:*", "player:*", "player_skill:*", "match:*"]
+
+
+# -------------------------
+# Stores
+# -------------------------
+class LRUStore:
+    """Bytes-bounded LRU of rendered responses, local to this process."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def set(self, key, item):
+        size = len(item[2]) + len(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[2]) + len(key)
+            self._items[key] = item
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                k, v = self._items.popitem(last=False)
+                self.bytes -= len(v[2]) + len(k)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RedisStore:
+    """Shared store for multi-worker deployments; needs the redis package."""
+
+    def __init__(self, url, ttl):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.bytes = None
+        self.evictions = None
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, item):
+        self.client.set(key, pickle.dumps(item), ex=self.ttl)
+
+    def __len__(self):
+        return self.client.dbsize()
+
+
+# -------------------------
+# Views
+# -------------------------
+class ResponseCache:
+    def __init__(self, app):
+        cfg = app.config
+        self.enabled = cfg.get("CACHE_ENABLED", True)
+        if cfg.get("CACHE_REDIS_URL"):
+            self.store = RedisStore(cfg["CACHE_REDIS_URL"], cfg.get("CACHE_TTL_S", 3600))
+        else:
+            self.store = LRUStore(cfg.get("CACHE_MAX_BYTES", 32 * 1024 * 1024))
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def _count(self, view, outcome):
+        with self._lock:
+            per_view = self.counts.setdefault(view, {"hit": 0, "miss": 0, "bypass": 0})
+            per_view[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            views = {k: dict(v) for k, v in self.counts.items()}
+        hits = sum(v["hit"] for v in views.values())
+        misses = sum(v["miss"] for v in views.values())
+        return {
+            "hits": hits, "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            "entries": len(self.store), "bytes": self.store.bytes, "evictions": self.store.evictions,
+            "views": views,
+        }
+
+    def view(self, name, keys, render):
+        """
+        The response of render(), cached under the request path and the
+        current versions of `keys`. Requests with pending flash messages are
+        never cached or served from cache (the page would carry or swallow
+        them).
+        """
+        if not self.enabled or request.method != "GET" or "_flashes" in session:
+            self._count(name, "bypass")
+            return render()
+        current = versions(keys)
+        key = "page:%s:%s:%s" % (name, request.full_path, ",".join(f"{k}={current[k]}" for k in keys))
+        item = self.store.get(key)
+        if item is not None:
+            self._count(name, "hit")
+            status, mimetype, body = item
+            response = current_app.response_class(body, status=status, mimetype=mimetype)
+            response.headers["X-Cache"] = "HIT"
+            return response
+        self._count(name, "miss")
+        response = make_response(render())
+        # a flash raised while rendering belongs to this request only
+        if response.status_code == 200 and not response.direct_passthrough and "_flashes" not in session:
+            self.store.set(key, (response.status_code, response.mimetype, response.get_data()))
+        response.headers["X-Cache"] = "MISS"
+        return response
+
+
+def init_cache(app):
+    app.extensions["response_cache"] = ResponseCache(app)
+    return app.extensions["response_cache"]
+
+
+def cached_view(name, keys, render):
+    return current_app.extensions["response_cache"].view(name, keys, render)
@@ -1,6 +1,4 @@
 import os
-import stripe
-import stripe
 
 
 class Config:
@@ -12,3 +10,74 @@ class Config:
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', 'x')
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLIC_KEY', 'x')
     APP_COMMISSION = 0.05
+
+    # time budget for the k-way balancing local search
+    BALANCE_DEADLINE_MS = 200
+
+    # batch auto-balance: worker processes and matches per request
+    BALANCE_WORKERS = os.cpu_count() or 2
+    BALANCE_BATCH_MAX = 64
+
+    # largest season /admin/schedules will generate in one request
+    SCHEDULE_MAX_MATCHES = 200000
+
+    # rating engine: "elo" or "glicko2"
+    RATING_SYSTEM = os.environ.get('RATING_SYSTEM', 'elo')
+    ELO_K = 32
+    GLICKO_TAU = 0.5
+
+    # rows per list on the home page
+    HOME_PAGE_SIZE = 20
+
+    # rows per tab on the admin dashboard
+    ADMIN_PAGE_SIZE = 25
+
+    # SQLite storage profile (app/storage.py)
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -20000,       # KiB, i.e. ~20 MB page cache
+        "mmap_size": 268435456,     # 256 MB
+        "busy_timeout": 5000,       # ms
+        "temp_store": "MEMORY",
+    }
+    SQLITE_READ_ENGINE = os.environ.get('SQLITE_READ_ENGINE', '1') == '1'
+    SQLITE_READ_POOL_SIZE = 8
+    SQLITE_WRITER_POOL_SIZE = 1
+
+    # Server-Sent Events (app/events.py)
+    SSE_KEEPALIVE_S = 15
+    SSE_MAX_SUBSCRIBERS = 5000
+
+    # ledger: snapshot an account's balance every N entries (app/ledger.py)
+    LEDGER_SNAPSHOT_EVERY = 100
+
+    # stake checkout jobs (app/payments.py); PAYMENT_BACKEND=fake for offline runs
+    PAYMENT_BACKEND = os.environ.get('PAYMENT_BACKEND', 'stripe')
+    PAYMENT_WORKERS = 4
+    PAYMENT_MAX_ATTEMPTS = 5
+    PAYMENT_RETRY_BACKOFF_S = 0.5
+    PAYMENT_POLL_S = 3.0
+    PAYMENT_SESSION_TTL_S = 1800
+    PAYMENT_RETURN_BASE = os.environ.get('PAYMENT_RETURN_BASE', 'http://localhost:5000/')
+
+    # background tasks (app/tasks.py); TASKS_EAGER=1 runs them inline
+    TASK_WORKERS = 2
+    TASK_QUEUE_MAX = 1000
+    TASK_DRAIN_TIMEOUT_S = 30
+    TASKS_EAGER = os.environ.get('TASKS_EAGER', '0') == '1'
+
+    # response cache (app/cache.py); set CACHE_REDIS_URL to share it between workers
+    CACHE_ENABLED = os.environ.get('CACHE_ENABLED', '1') == '1'
+    CACHE_MAX_BYTES = 32 * 1024 * 1024
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CACHE_TTL_S = 3600
+
+    # create_all/migrations/Free Agent Pool on every create_app(); prefork
+    # deployments set SCHEMA_ON_BOOT=0 and run `flask init-db` once per deploy
+    SCHEMA_ON_BOOT = os.environ.get('SCHEMA_ON_BOOT', '1') == '1'
+
+    # password KDF (app/passwords.py): werkzeug method with every parameter
+    # spelled out; changing it rehashes each account on its next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
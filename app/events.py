@@ -0,0 +1,132 @@
+"""
+In-process change bus and Server-Sent Events helpers.
+
+Routes publish small JSON payloads on named channels ("team:<id>:winnings",
+"match:<id>:roster") after their commit; every open SSE response subscribed
+to that channel gets the payload pushed instead of polling for it. The bus
+lives in the web process, so it only fans out to clients of the same process
+(the dev server and single-process threaded deployments).
+"""
+import json
+import queue
+import threading
+from collections import defaultdict
+
+from flask import Response
+
+
+class Subscription:
+    """One subscriber's mailbox. Bounded: when a slow client falls behind the
+    oldest event is dropped, which is fine when every payload carries the
+    latest state. Channels that carry diffs pass a resync event instead; on
+    overflow the backlog is replaced by it and the client starts over from a
+    fresh snapshot."""
+
+    def __init__(self, bus, channel, maxsize, resync=None):
+        self.bus = bus
+        self.channel = channel
+        self.resync = resync
+        self.queue = queue.Queue(maxsize)
+
+    def put(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                if self.resync is not None:
+                    self._drain()
+                    event = self.resync
+                    continue
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def get(self, timeout):
+        """Next event, or None if nothing arrived within timeout seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class ChangeBus:
+    """Channel -> subscribers fan-out; safe to use from request threads."""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._channels = defaultdict(set)
+
+    def subscribe(self, channel, resync=None):
+        sub = Subscription(self, channel, self.maxsize, resync)
+        with self._lock:
+            self._channels[channel].add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._channels.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._channels[sub.channel]
+
+    def publish(self, channel, event):
+        """Deliver event to every subscriber of channel; returns how many."""
+        with self._lock:
+            subs = list(self._channels.get(channel, ()))
+        for sub in subs:
+            sub.put(event)
+        return len(subs)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._channels.get(channel, ()))
+            return sum(len(subs) for subs in self._channels.values())
+
+
+bus = ChangeBus()
+
+
+# -------------------------
+# SSE
+# -------------------------
+def sse_format(data, event=None):
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def sse_stream(sub, initial=None, event=None, keepalive=15):
+    """Generator for a text/event-stream body: the initial snapshot, then one
+    message per published change, with comment keepalives in between so dead
+    connections are noticed. Unsubscribes when the client goes away."""
+    try:
+        yield "retry: 3000\n\n"
+        if initial is not None:
+            yield sse_format(initial, event)
+        while True:
+            data = sub.get(keepalive)
+            yield sse_format(data, event) if data is not None else ": keepalive\n\n"
+    finally:
+        sub.close()
+
+
+def sse_response(stream):
+    return Response(stream, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
@@ -0,0 +1,199 @@
+# ledger.py
+"""
+Append-only double-entry ledger behind winnings and stakes.
+
+Every money movement is one Transaction (the journal header) plus two or more
+LedgerEntry rows whose amounts sum to zero. Accounts are plain strings:
+"team:<id>", "player:<id>", "match:<id>" (the stake pot), "house" (the app)
+and "external" (money coming in from outside). Amounts are integer cents so
+the books balance exactly.
+
+Balances are never recomputed from scratch: each account gets a
+BalanceSnapshot every LEDGER_SNAPSHOT_EVERY entries, and a balance is the
+latest snapshot plus the entries after it, an index range on
+(account, id). A team's lifetime winnings are read from the ledger too
+(team_winnings_cents); the old Team.total_winnings column is only the input
+for the opening journals.
+"""
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func
+from app import db
+from app.models import BalanceSnapshot, LedgerEntry, Match, Team, Transaction
+
+HOUSE = "house"
+EXTERNAL = "external"
+
+
+def team_account(team_id):
+    return f"team:{team_id}"
+
+
+def player_account(player_id):
+    return f"player:{player_id}"
+
+
+def match_account(match_id):
+    return f"match:{match_id}"
+
+
+def to_cents(amount):
+    return int(round((amount or 0) * 100))
+
+
+# -------------------------
+# Reads
+# -------------------------
+def _latest_snapshot(account, at=None):
+    query = BalanceSnapshot.query.filter_by(account=account)
+    if at is not None:
+        query = query.filter(BalanceSnapshot.as_of <= at)
+    return query.order_by(BalanceSnapshot.entry_id.desc()).first()
+
+
+def balance_cents(account, at=None):
+    """
+    Balance of an account now, or as of `at`: latest snapshot (taken at or
+    before `at`) plus the entries after it. For a past time the range also
+    stops at the next snapshot, so either way at most one snapshot interval
+    of entries is read. Returns (cents, entries_read).
+    """
+    snap = _latest_snapshot(account, at)
+    query = db.session.query(func.coalesce(func.sum(LedgerEntry.amount_cents), 0), func.count(LedgerEntry.id)) \
+        .filter(LedgerEntry.account == account)
+    if snap:
+        query = query.filter(LedgerEntry.id > snap.entry_id)
+    if at is not None:
+        after = BalanceSnapshot.query.filter(BalanceSnapshot.account == account, BalanceSnapshot.as_of > at) \
+            .order_by(BalanceSnapshot.entry_id).first()
+        if after:
+            query = query.filter(LedgerEntry.id <= after.entry_id)
+        query = query.filter(LedgerEntry.created_at <= at)
+    total, count = query.one()
+    return (snap.balance_cents if snap else 0) + total, count
+
+
+def balance(account, at=None):
+    """Balance in currency units (what the routes show)."""
+    return balance_cents(account, at)[0] / 100.0
+
+
+def team_winnings_cents(team_id):
+    """
+    Lifetime winnings of a team: what settlement paid out (to its players or
+    its own account) for the matches it won, plus its opening journal.
+    """
+    won = db.session.query(Match.id).filter(db.or_(Match.team1_id == team_id, Match.team2_id == team_id),
+                                            Match.winner_team_id == team_id)
+    paid = db.session.query(func.coalesce(func.sum(LedgerEntry.amount_cents), 0)) \
+        .join(Transaction, Transaction.id == LedgerEntry.transaction_id) \
+        .filter(LedgerEntry.match_id.in_(won), Transaction.type == "settlement",
+                LedgerEntry.amount_cents > 0, LedgerEntry.account != HOUSE).scalar()
+    opening = db.session.query(func.coalesce(func.sum(LedgerEntry.amount_cents), 0)) \
+        .join(Transaction, Transaction.id == LedgerEntry.transaction_id) \
+        .filter(LedgerEntry.account == team_account(team_id), Transaction.type == "opening").scalar()
+    return paid + opening
+
+
+def entries(account, before_id=None, limit=50):
+    """Newest-first page of an account's entries (keyset on id)."""
+    query = LedgerEntry.query.filter_by(account=account)
+    if before_id:
+        query = query.filter(LedgerEntry.id < before_id)
+    return query.order_by(LedgerEntry.id.desc()).limit(limit).all()
+
+
+# -------------------------
+# Writes
+# -------------------------
+def post(kind, legs, match_id=None, player_id=None, status="completed", tx=None):
+    """
+    Append one balanced journal: `legs` is [(account, amount)] in currency
+    units and must sum to zero. Writes the Transaction header (or books the
+    legs under an existing one, `tx`) and its entries and snapshots accounts
+    that are due one. The caller commits.
+    """
+    cents = [(account, to_cents(amount)) for account, amount in legs if to_cents(amount)]
+    if sum(c for _, c in cents) != 0:
+        raise ValueError("journal does not balance: %r" % (legs,))
+    if not cents:
+        return None
+    now = datetime.utcnow()
+    if tx is None:
+        tx = Transaction(match_id=match_id, player_id=player_id, type=kind, status=status, created_at=now,
+                         amount=sum(c for _, c in cents if c > 0) / 100.0)
+        db.session.add(tx)
+        db.session.flush()
+    db.session.execute(LedgerEntry.__table__.insert(), [
+        {"transaction_id": tx.id, "account": account, "amount_cents": c, "match_id": match_id, "created_at": now}
+        for account, c in cents
+    ])
+    refresh_snapshots({a for a, _ in cents})
+    return tx
+
+
+def refresh_snapshots(accounts):
+    """
+    Snapshot every account in `accounts` that has LEDGER_SNAPSHOT_EVERY or
+    more entries since its last snapshot. One grouped query for the lot, so
+    bulk writers can call it once per batch.
+    """
+    accounts = list(accounts)
+    if not accounts:
+        return 0
+    every = current_app.config.get("LEDGER_SNAPSHOT_EVERY", 100)
+    last = db.session.query(BalanceSnapshot.account, func.max(BalanceSnapshot.entry_id)) \
+        .filter(BalanceSnapshot.account.in_(accounts)).group_by(BalanceSnapshot.account).subquery()
+    rows = db.session.query(
+        LedgerEntry.account, func.count(LedgerEntry.id), func.max(LedgerEntry.id),
+    ).outerjoin(last, last.c.account == LedgerEntry.account) \
+        .filter(LedgerEntry.account.in_(accounts), LedgerEntry.id > func.coalesce(last.c[1], 0)) \
+        .group_by(LedgerEntry.account).having(func.count(LedgerEntry.id) >= every).all()
+    for account, _, _ in rows:
+        snapshot(account)
+    return len(rows)
+
+
+def snapshot(account, total=None):
+    """Record the account's current balance as of its newest entry."""
+    last = LedgerEntry.query.filter_by(account=account).order_by(LedgerEntry.id.desc()).first()
+    if last is None:
+        return None
+    if total is None:
+        total, _ = balance_cents(account)
+    snap = BalanceSnapshot(account=account, entry_id=last.id, balance_cents=total, as_of=last.created_at)
+    db.session.add(snap)
+    return snap
+
+
+def snapshot_all():
+    """Snapshot every account with entries past its last snapshot (CLI / cron)."""
+    last = db.session.query(BalanceSnapshot.account, func.max(BalanceSnapshot.entry_id)) \
+        .group_by(BalanceSnapshot.account).all()
+    done = dict(last)
+    accounts = [a for a, newest in db.session.query(LedgerEntry.account, func.max(LedgerEntry.id))
+                .group_by(LedgerEntry.account) if newest > done.get(a, 0)]
+    for account in accounts:
+        snapshot(account)
+    db.session.commit()
+    return len(accounts)
+
+
+def open_balances():
+    """
+    One-off: post opening journals for money recorded before the ledger
+    existed: house -> team for total_winnings, external -> pot for the stakes
+    of unfinished matches. Accounts that already have entries are skipped.
+    """
+    booked = {a for (a,) in db.session.query(LedgerEntry.account).distinct()}
+    opened = 0
+    for team in Team.query.filter(Team.total_winnings.isnot(None), Team.total_winnings != 0).all():
+        if team_account(team.id) not in booked:
+            post("opening", [(HOUSE, -team.total_winnings), (team_account(team.id), team.total_winnings)])
+            opened += 1
+    for match in Match.query.filter(Match.stakes > 0, Match.status != "completed").all():
+        if match_account(match.id) not in booked:
+            post("opening", [(EXTERNAL, -match.stakes), (match_account(match.id), match.stakes)], match_id=match.id)
+            opened += 1
+    db.session.commit()
+    return opened
@@ -0,0 +1,227 @@
+# migrations.py
+"""
+Versioned schema migrations for existing SQLite databases.
+
+db.create_all() only creates missing tables; it never adds columns or indexes
+to tables that already exist. Each entry in MIGRATIONS is applied once, in
+order, and recorded in the schema_version table. Steps are written to be
+idempotent so they are also safe on a database create_all just built.
+"""
+from datetime import datetime
+from sqlalchemy import text
+from app import db
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(text(f'PRAGMA table_info("{table}")'))}
+
+
+def _add_columns(conn, table, columns):
+    existing = _columns(conn, table)
+    for name, ddl in columns:
+        if name not in existing:
+            conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{name}" {ddl}'))
+
+
+def _create_indexes(conn, statements):
+    for sql in statements:
+        conn.execute(text(sql))
+
+
+def m001_columns(conn):
+    """Columns added to existing tables since the first release."""
+    _add_columns(conn, "match_assignment", [("pinned", "BOOLEAN")])
+    _add_columns(conn, "match", [("result_recorded", "BOOLEAN")])
+    _add_columns(conn, "team", [
+        ("latitude", "FLOAT"), ("longitude", "FLOAT"),
+        ("rating", "FLOAT"), ("rating_deviation", "FLOAT"), ("rating_volatility", "FLOAT"),
+        ("skill_value_sum", "INTEGER"), ("skill_value_count", "INTEGER"),
+        ("player_rating_sum", "INTEGER"), ("player_count", "INTEGER"),
+    ])
+    _add_columns(conn, "player", [
+        ("rating", "FLOAT"), ("rating_deviation", "FLOAT"), ("rating_volatility", "FLOAT"),
+    ])
+
+
+def m002_listing_indexes(conn):
+    """Indexes behind venue lookups, rating history and home-page pagination."""
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS ix_venue_grid_cell ON venue (grid_cell)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_rating_history_player_seq ON rating_history (player_id, seq)',
+        'CREATE INDEX IF NOT EXISTS ix_team_name_id ON team (name, id)',
+        'CREATE INDEX IF NOT EXISTS ix_match_created_id ON "match" (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS ix_match_open_created ON "match" (created_at, id) '
+        'WHERE team1_id IS NULL OR team2_id IS NULL',
+    ])
+
+
+def m003_hot_lookup_indexes(conn):
+    """Foreign-key and status lookups used by the busiest routes."""
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS ix_match_team1_id ON "match" (team1_id)',
+        'CREATE INDEX IF NOT EXISTS ix_match_team2_id ON "match" (team2_id)',
+        'CREATE INDEX IF NOT EXISTS ix_match_status ON "match" (status)',
+        'CREATE INDEX IF NOT EXISTS ix_match_assignment_match_player ON match_assignment (match_id, player_id)',
+        'CREATE INDEX IF NOT EXISTS ix_player_team_id ON player (team_id)',
+        'CREATE INDEX IF NOT EXISTS ix_player_skill_player_id ON player_skill (player_id)',
+        'CREATE INDEX IF NOT EXISTS ix_player_stats_player_id ON player_stats (player_id)',
+        'CREATE INDEX IF NOT EXISTS ix_dispute_status ON dispute (status)',
+        'CREATE INDEX IF NOT EXISTS ix_team_is_free_agent_pool ON team (is_free_agent_pool)',
+    ])
+
+
+def m004_schedule_columns(conn):
+    """Generated fixtures: schedule, round, venue and bracket links on match."""
+    _add_columns(conn, "match", [
+        ("schedule_id", "INTEGER REFERENCES schedule (id)"),
+        ("round_no", "INTEGER"),
+        ("venue_id", "INTEGER REFERENCES venue (id)"),
+        ("next_match_id", 'INTEGER REFERENCES "match" (id)'),
+        ("next_slot", "INTEGER"),
+    ])
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS ix_match_schedule_id ON "match" (schedule_id)',
+        'CREATE INDEX IF NOT EXISTS ix_match_venue_id ON "match" (venue_id)',
+    ])
+
+
+def m005_settlement(conn):
+    """Settlement bookkeeping: match.settled_at and unique transaction keys."""
+    _add_columns(conn, "match", [("settled_at", "DATETIME")])
+    _add_columns(conn, "transaction", [("idempotency_key", "VARCHAR(120)")])
+    _create_indexes(conn, [
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_transaction_idempotency_key ON "transaction" (idempotency_key)',
+    ])
+    # results approved before settlement existed were already paid in place
+    conn.execute(text('UPDATE "match" SET settled_at = CURRENT_TIMESTAMP '
+                      "WHERE status = 'completed' AND settled_at IS NULL"))
+
+def m006_payment_queue(conn):
+    """Checkout jobs: session url, attempt count and the lookups the queue runs."""
+    _add_columns(conn, "transaction", [("checkout_url", "VARCHAR(500)"), ("attempts", "INTEGER")])
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS ix_transaction_status ON "transaction" (status)',
+        'CREATE INDEX IF NOT EXISTS ix_transaction_stripe_payment_id ON "transaction" (stripe_payment_id)',
+    ])
+
+def m007_rating_history_kind(conn):
+    """
+    Split rating history into Elo ("rating") and PlayerStats.skill_rating
+    ("skill") series. Points without a match came from the stats form or the
+    legacy blobs, so they are skill points; each series is renumbered 1..n.
+    """
+    _add_columns(conn, "rating_history", [("kind", "VARCHAR(16) NOT NULL DEFAULT 'rating'")])
+    conn.execute(text("UPDATE rating_history SET kind = 'skill' WHERE match_id IS NULL"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_rating_history_player_seq"))
+    conn.execute(text(
+        "UPDATE rating_history SET seq = (SELECT n FROM (SELECT id, ROW_NUMBER() OVER "
+        "(PARTITION BY player_id, kind ORDER BY seq) AS n FROM rating_history) r WHERE r.id = rating_history.id)"
+    ))
+    _create_indexes(conn, [
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_rating_history_player_kind_seq ON rating_history (player_id, kind, seq)',
+    ])
+
+
+def m008_ledger_match_index(conn):
+    """Ledger legs by match, for team winnings read from the ledger."""
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS ix_ledger_entry_match_id ON ledger_entry (match_id)',
+    ])
+
+
+MIGRATIONS = [
+    (1, "columns added since first release", m001_columns),
+    (2, "listing indexes", m002_listing_indexes),
+    (3, "hot lookup indexes", m003_hot_lookup_indexes),
+    (4, "schedule columns", m004_schedule_columns),
+    (5, "settlement columns", m005_settlement),
+    (6, "payment queue columns", m006_payment_queue),
+    (7, "rating history kinds", m007_rating_history_kind),
+    (8, "ledger match index", m008_ledger_match_index),
+]
+
+
+def current_version(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at DATETIME)"
+    ))
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def upgrade(engine=None):
+    """Apply every pending migration, each in its own transaction. Returns the versions applied."""
+    engine = engine or db.engine
+    applied = []
+    with engine.begin() as conn:
+        version = current_version(conn)
+    for number, description, step in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": number, "d": description, "t": datetime.utcnow()},
+            )
+        applied.append(number)
+    return applied
+
+
+def hot_queries():
+    """
+    (label, statement) pairs for the lookups the busy routes issue, built from
+    the same ORM expressions so the plans match what actually runs.
+    """
+    from app.models import (Match, MatchAssignment, Player, PlayerSkill, PlayerStats, Dispute, Team, RatingHistory, Venue,
+                            LedgerEntry, BalanceSnapshot, Transaction, EntityVersion)
+    return [
+        ("match by team1", Match.query.filter(Match.team1_id == 1)),
+        ("match by team2", Match.query.filter(Match.team2_id == 1)),
+        ("matches of a team", Match.query.filter((Match.team1_id == 1) | (Match.team2_id == 1))),
+        ("pending matches", Match.query.filter(Match.status == "pending")),
+        ("open matches page", Match.query.filter(db.or_(Match.team1_id.is_(None), Match.team2_id.is_(None)),
+                                                 Match.status != "awaiting")
+            .order_by(Match.created_at.desc(), Match.id.desc()).limit(21)),
+        ("assignments of a match", MatchAssignment.query.filter_by(match_id=1)),
+        ("assignment of a player in a match", MatchAssignment.query.filter_by(match_id=1, player_id=1)),
+        ("players of a team", Player.query.filter_by(team_id=1)),
+        ("skills of a player", PlayerSkill.query.filter_by(player_id=1)),
+        ("stats of a player", PlayerStats.query.filter_by(player_id=1)),
+        ("open disputes", Dispute.query.filter(Dispute.status == "open")),
+        ("free agent pool", Team.query.filter_by(is_free_agent_pool=True)),
+        ("teams page", Team.query.filter(Team.name > "m").order_by(Team.name, Team.id).limit(21)),
+        ("rating history", RatingHistory.query.filter_by(player_id=1, kind="rating").order_by(RatingHistory.seq)),
+        ("venues in cells", Venue.query.filter(Venue.grid_cell.in_([1, 2, 3]))),
+        ("fixtures of a schedule", Match.query.filter_by(schedule_id=1).order_by(Match.round_no, Match.date)),
+        ("unsettled matches", Match.query.filter(Match.status == "completed", Match.settled_at.is_(None))),
+        ("ledger entries since snapshot", LedgerEntry.query.filter(LedgerEntry.account == "team:1", LedgerEntry.id > 1)),
+        ("ledger legs of a match", LedgerEntry.query.filter(LedgerEntry.match_id == 1)),
+        ("latest balance snapshot", BalanceSnapshot.query.filter_by(account="team:1")
+            .order_by(BalanceSnapshot.entry_id.desc()).limit(1)),
+        ("balance snapshot before a time", BalanceSnapshot.query.filter(
+            BalanceSnapshot.account == "team:1", BalanceSnapshot.as_of <= datetime(2026, 1, 1))
+            .order_by(BalanceSnapshot.entry_id.desc()).limit(1)),
+        ("payments in flight", Transaction.query.filter(Transaction.type == "stake",
+                                                        Transaction.status.in_(("queued", "pending")))),
+        ("payment by checkout session", Transaction.query.filter_by(stripe_payment_id="cs_1")),
+        ("cached page versions", EntityVersion.query.filter(EntityVersion.key.in_(("team:1", "teams")))),
+    ]
+
+
+def check_query_plans(engine=None):
+    """
+    Run EXPLAIN QUERY PLAN for every hot query. Returns (label, plan rows)
+    for each one that still scans a whole table; an empty list means all of
+    them are served by an index.
+    """
+    engine = engine or db.engine
+    failures = []
+    with engine.connect() as conn:
+        for label, query in hot_queries():
+            sql = str(query.statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            plan = [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+            scans = [d for d in plan if d.startswith("SCAN") and "INDEX" not in d]
+            if scans:
+                failures.append((label, plan))
+    return failures
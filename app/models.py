@@ -1,10 +1,13 @@
 from . import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-import stripe
+from . import passwords
+from .utils import grid_cell_for
 
 
 class Team(db.Model):
+    # keyset pagination on the home page walks (name, id)
+    __table_args__ = (db.Index("ix_team_name_id", "name", "id"),)
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     total_winnings = db.Column(db.Float, default=0)
@@ -19,16 +22,29 @@ class Team(db.Model):
     matches_lost = db.Column(db.Integer, default=0)
     stripe_account_id = db.Column(db.String(255))
     stripe_customer_id = db.Column(db.String(255))
-    is_free_agent_pool = db.Column(db.Boolean, default=False)
+    is_free_agent_pool = db.Column(db.Boolean, default=False, index=True)
+    # home ground, used for venue suggestions
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    # incremental rating engine (app/ratings.py); deviation is unused by Elo
+    rating = db.Column(db.Float, default=1500.0)
+    rating_deviation = db.Column(db.Float, default=350.0)
+    rating_volatility = db.Column(db.Float, default=0.06)
+    # running totals behind skill_rating; NULL until first initialised
+    skill_value_sum = db.Column(db.Integer, default=0)
+    skill_value_count = db.Column(db.Integer, default=0)
+    player_rating_sum = db.Column(db.Integer, default=0)
+    player_count = db.Column(db.Integer, default=0)
     players = db.relationship("Player", backref="team", lazy=True, foreign_keys="Player.team_id")
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        # may rehash with the current PASSWORD_HASH_METHOD; the caller commits
+        return passwords.check_and_upgrade(self, password)
 
 
 class Player(db.Model):
@@ -38,23 +54,27 @@ class Player(db.Model):
     role = db.Column(db.String(80), nullable=True)
     skill_rating = db.Column(db.Integer, default=50)
     invited = db.Column(db.Boolean, default=False)
-    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True, index=True)
     games_played = db.Column(db.Integer, default=0)
     wins = db.Column(db.Integer, default=0)
     losses = db.Column(db.Integer, default=0)
     # NEW: admin flag so you can mark a player as an admin
     is_admin = db.Column(db.Boolean, default=False)
+    # incremental rating engine (app/ratings.py); deviation is unused by Elo
+    rating = db.Column(db.Float, default=1500.0)
+    rating_deviation = db.Column(db.Float, default=350.0)
+    rating_volatility = db.Column(db.Float, default=0.06)
     skills = db.relationship("PlayerSkill", backref="player", lazy=True, cascade="all, delete-orphan")
 
 class PlayerStats(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False, index=True)
     sport = db.Column(db.String(80))
     wins = db.Column(db.Integer, default=0, nullable=False)
     losses = db.Column(db.Integer, default=0, nullable=False)
     matches_played = db.Column(db.Integer, default=0, nullable=False)
     skill_rating = db.Column(db.Float, default=50, nullable=False)
-    progress_data = db.Column(db.Text)  # JSON of skill rating history
+    progress_data = db.Column(db.Text)  # legacy JSON history, moved to RatingHistory
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
 
     def win_rate(self):
@@ -62,39 +82,121 @@ class PlayerStats(db.Model):
 
 
 
-class PlayerSkill(db.Model):
+class RatingHistory(db.Model):
+    """
+    One row per rating change, appended and never rewritten. kind keeps the
+    two scales apart: "rating" is Player.rating (Elo, from recorded results),
+    "skill" is PlayerStats.skill_rating (the stats form, legacy blobs).
+    seq numbers a player's points of one kind 1, 2, 3, ... so charts can read
+    a range or every n-th point straight off the (player_id, kind, seq) index.
+    """
+    __table_args__ = (db.Index("ix_rating_history_player_kind_seq", "player_id", "kind", "seq", unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
     player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    rating = db.Column(db.Float, nullable=False)
+    kind = db.Column(db.String(16), nullable=False, default="rating")
+    sport = db.Column(db.String(80), nullable=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=True)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PlayerSkill(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False, index=True)
     sport = db.Column(db.String(50), nullable=False)
     name = db.Column(db.String(80), nullable=False)
     value = db.Column(db.Integer, nullable=False, default=0)
 
 
 class Match(db.Model):
+    __table_args__ = (
+        # keyset pagination, newest first
+        db.Index("ix_match_created_id", "created_at", "id"),
+        # partial index: only matches with an open slot
+        db.Index("ix_match_open_created", "created_at", "id",
+                 sqlite_where=db.text("team1_id IS NULL OR team2_id IS NULL")),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     sport = db.Column(db.String(80), nullable=False, default="soccer")
     location = db.Column(db.String(200), nullable=True)
     date = db.Column(db.DateTime, nullable=True)
-    team1_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True)
-    team2_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True)
+    team1_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True, index=True)
+    team2_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True, index=True)
     stakes = db.Column(db.Float, default=0.0)
-    status = db.Column(db.String(50), default="pending")
+    status = db.Column(db.String(50), default="pending", index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     team1 = db.relationship("Team", foreign_keys=[team1_id], lazy=True)
     team2 = db.relationship("Team", foreign_keys=[team2_id], lazy=True)
     winner_team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True)
+    # set once the result has been counted and rated (stats.record_result)
+    result_recorded = db.Column(db.Boolean, default=False)
+    # generated fixtures (app/scheduler.py); NULL for hand-made matches
+    schedule_id = db.Column(db.Integer, db.ForeignKey('schedule.id'), nullable=True, index=True)
+    round_no = db.Column(db.Integer, nullable=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=True, index=True)
+    # elimination brackets: the winner moves into next_match_id as team<next_slot>
+    next_match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=True)
+    next_slot = db.Column(db.Integer, nullable=True)
+    # set when the payout has been posted (app/settlement.py)
+    settled_at = db.Column(db.DateTime, nullable=True)
+    venue = db.relationship("Venue", lazy=True)
 
 
 
 class MatchAssignment(db.Model):
+    __table_args__ = (db.Index("ix_match_assignment_match_player", "match_id", "player_id"),)
+
     id = db.Column(db.Integer, primary_key=True)
     match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False)
     player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
     team_side = db.Column(db.String(2), nullable=False)
+    # set when an organizer places the player by hand; auto-balance keeps it
+    pinned = db.Column(db.Boolean, default=False)
     match = db.relationship("Match", backref=db.backref("assignments", cascade="all, delete-orphan"))
     player = db.relationship("Player", lazy=True)
 
 
+class Venue(db.Model):
+    """
+    A place matches can be played. grid_cell is the fixed-size lat/lon cell
+    (utils.grid_cell_for) and is indexed so nearest-venue lookups only read
+    the cells around a point.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    city = db.Column(db.String(120), nullable=True)
+    address = db.Column(db.String(200), nullable=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    grid_cell = db.Column(db.Integer, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def set_location(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.grid_cell = grid_cell_for(latitude, longitude)
+
+
+class Schedule(db.Model):
+    """
+    A generated season: a round robin or an elimination bracket. Its matches
+    point back here through Match.schedule_id and carry round/slot/venue.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=True)
+    sport = db.Column(db.String(80), nullable=False)
+    format = db.Column(db.String(20), nullable=False)  # "round_robin" | "elimination"
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=True)
+    slot_minutes = db.Column(db.Integer, nullable=False, default=90)
+    team_count = db.Column(db.Integer, nullable=False, default=0)
+    match_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class Invite(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     token = db.Column(db.String(120), unique=True, nullable=False)
@@ -131,7 +233,7 @@ class Dispute(db.Model):
     match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False)
     filed_by_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
     reason = db.Column(db.Text, nullable=False)
-    status = db.Column(db.String(50), default="open")
+    status = db.Column(db.String(50), default="open", index=True)
     resolution = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -144,14 +246,62 @@ class Transaction(db.Model):
     player_id = db.Column(db.Integer, db.ForeignKey('player.id'))
     amount = db.Column(db.Float, nullable=False)
     type = db.Column(db.String(50))  # 'stake', 'payout', 'commission'
-    status = db.Column(db.String(50), default='pending')  # 'pending', 'completed', 'failed'
-    stripe_payment_id = db.Column(db.String(255))
+    status = db.Column(db.String(50), default='pending', index=True)  # 'queued', 'pending', 'completed', 'failed', 'expired'
+    stripe_payment_id = db.Column(db.String(255), index=True)
+    # unique per logical operation ("settle:<match_id>"); replays become no-ops
+    idempotency_key = db.Column(db.String(120), nullable=True, unique=True, index=True)
+    # checkout payments (app/payments.py): hosted page and backend calls made so far
+    checkout_url = db.Column(db.String(500))
+    attempts = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     match = db.relationship("Match", backref=db.backref("transactions", lazy=True))
     player = db.relationship("Player", backref=db.backref("transactions", lazy=True))
 
 
+class LedgerEntry(db.Model):
+    """
+    One leg of a journal (app/ledger.py): a signed amount in cents on an
+    account string. Append-only; the legs of a Transaction sum to zero.
+    """
+    __tablename__ = "ledger_entry"
+    __table_args__ = (db.Index("ix_ledger_entry_account_id", "account", "id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=False, index=True)
+    account = db.Column(db.String(64), nullable=False)
+    amount_cents = db.Column(db.Integer, nullable=False)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class BalanceSnapshot(db.Model):
+    """An account's balance including every entry up to entry_id (whose time is as_of)."""
+    __tablename__ = "balance_snapshot"
+    __table_args__ = (
+        db.Index("ix_balance_snapshot_account_entry", "account", "entry_id"),
+        db.Index("ix_balance_snapshot_account_as_of", "account", "as_of"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account = db.Column(db.String(64), nullable=False)
+    entry_id = db.Column(db.Integer, nullable=False)
+    balance_cents = db.Column(db.Integer, nullable=False)
+    as_of = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class EntityVersion(db.Model):
+    """
+    Write counter behind the response cache (app/cache.py): "team:3",
+    "teams", "match:*", ... Bumped in the same transaction as the write.
+    """
+    __tablename__ = "entity_version"
+
+    key = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
 class Bet(db.Model):
     __tablename__ = 'bets'
 
@@ -174,9 +324,8 @@ class Admin(db.Model):
     password_hash = db.Column(db.String(200), nullable=False)
 
     def set_password(self, password):
-        from werkzeug.security import generate_password_hash
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        from werkzeug.security import check_password_hash
-        return check_password_hash(self.password_hash, password)
\ No newline at end of file
+        # may rehash with the current PASSWORD_HASH_METHOD; the caller commits
+        return passwords.check_and_upgrade(self, password)
\ No newline at end of file
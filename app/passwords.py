@@ -0,0 +1,108 @@
+# passwords.py
+"""
+Password hashing on a dedicated process pool, with a configurable cost.
+
+werkzeug's KDF (scrypt by default) is CPU-bound on purpose. Run in the
+request thread, a burst of logins at league sign-up takes every core and
+stalls unrelated routes. Here each hash and check is sent to a pool of
+PASSWORD_HASH_WORKERS processes, so KDF work uses at most that many cores;
+the request thread just waits for the result.
+
+PASSWORD_HASH_METHOD is werkzeug's method string with every parameter
+spelled out ("scrypt:32768:8:1", "pbkdf2:sha256:600000"), which is also the
+prefix werkzeug stores in front of the hash. A successful login whose stored
+hash has another prefix is rehashed with the current method, so changing
+the cost takes effect as users log in. PASSWORD_HASH_WORKERS=0 hashes in the
+request thread.
+
+Only requests use the pool. Seeding, CLI commands and scripts hash inline:
+a spawned worker re-imports the parent's main module, which for those is
+the script doing the seeding.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, has_app_context, has_request_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = "scrypt:32768:8:1"
+
+
+class PasswordHasher:
+    def __init__(self, method=DEFAULT_METHOD, workers=1):
+        self.method = method
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _run(self, fn, *args):
+        if self.workers <= 0 or not has_request_context():
+            return fn(*args)
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a threaded web server can copy held locks
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            pool = self._pool
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # a dead worker breaks the pool; start a fresh one next time
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            return fn(*args)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return bool(pwhash) and self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split("$", 1)[0] != self.method
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+# scripts that build models outside an app get werkzeug's defaults, inline
+_inline = PasswordHasher(workers=0)
+
+
+def init_passwords(app):
+    app.extensions["passwords"] = PasswordHasher(app.config.get("PASSWORD_HASH_METHOD", DEFAULT_METHOD),
+                                                 app.config.get("PASSWORD_HASH_WORKERS", 1))
+    return app.extensions["passwords"]
+
+
+def hasher():
+    if has_app_context() and "passwords" in current_app.extensions:
+        return current_app.extensions["passwords"]
+    return _inline
+
+
+def hash_password(password):
+    return hasher().hash(password)
+
+
+def check(pwhash, password):
+    """
+    (matches, new_hash). new_hash is a rehash with the current method when the
+    password matches but pwhash was made with another one, else None.
+    """
+    h = hasher()
+    if not h.verify(pwhash, password):
+        return False, None
+    return True, (h.hash(password) if h.needs_rehash(pwhash) else None)
+
+
+def check_and_upgrade(user, password):
+    """check() against user.password_hash, storing any rehash on user; the caller commits."""
+    ok, upgraded = check(user.password_hash, password)
+    if upgraded:
+        user.password_hash = upgraded
+    return ok
@@ -0,0 +1,408 @@
+# payments.py
+"""
+Stake payments, handled outside the request.
+
+create_checkout_session only writes a "queued" Transaction and returns; a
+small pool of worker threads then talks to the payment backend:
+
+    queued  --create session-->  pending  --poll-->  completed
+                                                \-->  expired / failed
+
+Every Transaction carries an idempotency key, which is also sent to Stripe
+when the session is created, so a create retried after a timeout gets the
+same session back instead of a second one. Completion is a conditional
+UPDATE (pending -> completed) before the stake is booked, so a poll racing
+the success redirect books it once.
+
+The backend is pluggable: StripeBackend talks to the Stripe API (imported on
+first use), FakeStripe is an in-process stand-in with configurable latency,
+failure rate and payment outcome for offline load tests.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import url_for
+from app import db
+from app import ledger
+from app.models import Match, Transaction
+
+
+class TransientPaymentError(Exception):
+    """The backend may succeed if asked again (timeout, rate limit, 5xx)."""
+
+
+class PaymentError(Exception):
+    """The backend refused the request; retrying will not help."""
+
+
+def new_key():
+    return f"checkout:{uuid.uuid4().hex}"
+
+
+# -------------------------
+# Backends
+# -------------------------
+class StripeBackend:
+    """Stripe Checkout. The stripe module is imported on first use."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self._stripe = None
+
+    def _client(self):
+        if self._stripe is None:
+            import stripe
+            stripe.api_key = self.api_key
+            self._stripe = stripe
+        return self._stripe
+
+    def _call(self, fn, *args, **kwargs):
+        stripe = self._client()
+        try:
+            return fn(*args, **kwargs)
+        except (stripe.APIConnectionError, stripe.RateLimitError, stripe.APIError) as e:
+            raise TransientPaymentError(str(e))
+        except stripe.StripeError as e:
+            raise PaymentError(str(e))
+
+    def create_session(self, amount_cents, description, success_url, cancel_url, idempotency_key, metadata=None):
+        stripe = self._client()
+        session = self._call(
+            stripe.checkout.Session.create,
+            payment_method_types=["card"],
+            line_items=[{
+                "price_data": {
+                    "currency": "usd",
+                    "product_data": {"name": description},
+                    "unit_amount": amount_cents,
+                },
+                "quantity": 1,
+            }],
+            mode="payment",
+            success_url=success_url,
+            cancel_url=cancel_url,
+            metadata=metadata or {},
+            idempotency_key=idempotency_key,
+        )
+        return {"id": session.id, "url": session.url}
+
+    def session_status(self, session_id):
+        """"open", "complete" (paid) or "expired"."""
+        session = self._call(self._client().checkout.Session.retrieve, session_id)
+        if session.status == "complete" and session.payment_status != "paid":
+            return "open"
+        return session.status
+
+
+class FakeStripe:
+    """
+    In-process Checkout stand-in. Each call sleeps `latency` seconds and
+    fails transiently with probability `failure_rate`; a session reports
+    "complete" after `complete_after` polls, unless it is abandoned
+    (probability `abandon_rate`), in which case it reports "expired".
+    Honours idempotency keys like Stripe does and counts what it was asked.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, complete_after=1, abandon_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.complete_after = complete_after
+        self.abandon_rate = abandon_rate
+        self._rand = random.Random(seed)
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._sessions = {}
+        self.calls = 0
+        self.failures = 0
+
+    def _io(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self._rand.random() < self.failure_rate:
+                self.failures += 1
+                raise TransientPaymentError("simulated network error")
+
+    def create_session(self, amount_cents, description, success_url, cancel_url, idempotency_key, metadata=None):
+        self._io()
+        if amount_cents <= 0:
+            raise PaymentError("amount must be positive")
+        with self._lock:
+            sid = self._by_key.get(idempotency_key)
+            if sid is None:
+                sid = f"cs_fake_{len(self._sessions) + 1}"
+                self._by_key[idempotency_key] = sid
+                self._sessions[sid] = {"polls": 0, "abandoned": self._rand.random() < self.abandon_rate,
+                                       "amount": amount_cents}
+        return {"id": sid, "url": f"https://checkout.fake/{sid}"}
+
+    def session_status(self, session_id):
+        self._io()
+        with self._lock:
+            s = self._sessions.get(session_id)
+            if s is None:
+                raise PaymentError(f"no such session {session_id}")
+            s["polls"] += 1
+            if s["polls"] < self.complete_after:
+                return "open"
+            return "expired" if s["abandoned"] else "complete"
+
+    @property
+    def sessions_created(self):
+        return len(self._sessions)
+
+
+def make_backend(config):
+    if config.get("PAYMENT_BACKEND") == "fake":
+        return FakeStripe(latency=config.get("FAKE_STRIPE_LATENCY_S", 0.0),
+                          failure_rate=config.get("FAKE_STRIPE_FAILURE_RATE", 0.0))
+    return StripeBackend(config.get("STRIPE_SECRET_KEY"))
+
+
+# -------------------------
+# Queue
+# -------------------------
+class PaymentQueue:
+    """
+    Delayed-job queue drained by `workers` daemon threads. Jobs are
+    (transaction id, action) pairs; the Transaction row is the durable state,
+    so after a restart recover() rebuilds the queue from the database.
+    Threads start on the first submit.
+    """
+
+    def __init__(self, app, backend=None):
+        # workers push their own context, so keep the app itself, not current_app
+        self.app = app._get_current_object() if hasattr(app, "_get_current_object") else app
+        self.backend = backend or make_backend(app.config)
+        cfg = app.config
+        self.workers = cfg.get("PAYMENT_WORKERS", 4)
+        self.max_attempts = cfg.get("PAYMENT_MAX_ATTEMPTS", 5)
+        self.backoff = cfg.get("PAYMENT_RETRY_BACKOFF_S", 0.5)
+        self.poll_every = cfg.get("PAYMENT_POLL_S", 3.0)
+        self.session_ttl = cfg.get("PAYMENT_SESSION_TTL_S", 1800)
+        self.return_base = cfg.get("PAYMENT_RETURN_BASE", "http://localhost:5000/")
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._busy = 0
+        self._threads = []
+        self._stopping = False
+        self.stats = {"created": 0, "completed": 0, "failed": 0, "expired": 0, "retries": 0, "polls": 0}
+
+    # -- scheduling --
+    def submit(self, tx_id, action="create", delay=0.0, base=None):
+        self.start()
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), tx_id, action, base))
+            self._cond.notify()
+
+    def start(self):
+        if self._threads:
+            return
+        with self._cond:
+            if self._threads:
+                return
+            self._threads = [threading.Thread(target=self._run, name=f"payments-{i}", daemon=True)
+                             for i in range(self.workers)]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+
+    def idle(self):
+        with self._cond:
+            return not self._heap and not self._busy
+
+    def wait_idle(self, timeout=None):
+        """
+        Block until nothing is queued or running (benchmarks, CLI). Release
+        the caller's session first: workers share the single writer
+        connection.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while not self.idle():
+            if end is not None and time.monotonic() > end:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _next(self):
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None
+                if self._heap:
+                    due = self._heap[0][0] - time.monotonic()
+                    if due <= 0:
+                        self._busy += 1
+                        return heapq.heappop(self._heap)
+                    self._cond.wait(due)
+                else:
+                    self._cond.wait()
+
+    def _run(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            _, _, tx_id, action, base = job
+            try:
+                with self.app.app_context():
+                    try:
+                        if action == "create":
+                            self._create(tx_id, base)
+                        else:
+                            self._poll(tx_id)
+                    finally:
+                        db.session.remove()
+            except Exception:
+                self.app.logger.exception("payment job %s for transaction %s failed", action, tx_id)
+            finally:
+                with self._cond:
+                    self._busy -= 1
+
+    def _count(self, name):
+        with self._cond:
+            self.stats[name] += 1
+
+    def _retry(self, tx_id, attempts, action, base=None):
+        self._count("retries")
+        self.submit(tx_id, action, delay=self.backoff * 2 ** min(attempts, 6), base=base)
+
+    # -- jobs --
+    def _return_urls(self, base):
+        with self.app.test_request_context(base_url=base or self.return_base):
+            # Stripe fills in {CHECKOUT_SESSION_ID}; url_for would escape the braces
+            success = url_for("payment_success", _external=True) + "?session_id={CHECKOUT_SESSION_ID}"
+            cancel = url_for("payment_cancel", _external=True) + "?session_id={CHECKOUT_SESSION_ID}"
+        return success, cancel
+
+    def _create(self, tx_id, base):
+        tx = db.session.get(Transaction, tx_id)
+        if tx is None or tx.status != "queued":
+            return
+        success, cancel = self._return_urls(base)
+        tx.attempts = attempts = (tx.attempts or 0) + 1
+        args = (ledger.to_cents(tx.amount), f"Stake for Match #{tx.match_id}", success, cancel, tx.idempotency_key)
+        metadata = {"transaction_id": str(tx.id), "match_id": str(tx.match_id)}
+        # never hold the writer connection across a network call
+        db.session.commit()
+        try:
+            session = self.backend.create_session(*args, metadata=metadata)
+        except TransientPaymentError:
+            if attempts < self.max_attempts:
+                self._retry(tx_id, attempts, "create", base)
+            elif close(tx, "failed", expected="queued"):
+                self._count("failed")
+            return
+        except PaymentError:
+            if close(tx, "failed", expected="queued"):
+                self._count("failed")
+            return
+        t = Transaction.__table__
+        moved = db.session.execute(
+            t.update().where(t.c.id == tx_id, t.c.status == "queued")
+            .values(status="pending", stripe_payment_id=session["id"], checkout_url=session["url"])
+        ).rowcount
+        db.session.commit()
+        if moved:
+            self._count("created")
+            self.submit(tx_id, "poll", delay=self.poll_every)
+
+    def _poll(self, tx_id):
+        tx = db.session.get(Transaction, tx_id)
+        if tx is None or tx.status != "pending":
+            return
+        session_id, created_at, attempts = tx.stripe_payment_id, tx.created_at, tx.attempts or 0
+        db.session.commit()
+        self._count("polls")
+        try:
+            status = self.backend.session_status(session_id)
+        except TransientPaymentError:
+            tx.attempts = attempts + 1
+            db.session.commit()
+            self._retry(tx_id, attempts + 1, "poll")
+            return
+        except PaymentError:
+            status = "expired"
+        if status == "complete":
+            if complete(tx):
+                self._count("completed")
+        elif status == "expired" or datetime.utcnow() - created_at > timedelta(seconds=self.session_ttl):
+            if close(tx, "expired"):
+                self._count("expired")
+        else:
+            self.submit(tx_id, "poll", delay=self.poll_every)
+
+    def recover(self):
+        """Re-queue every stake still in flight; returns how many."""
+        rows = db.session.query(Transaction.id, Transaction.status) \
+            .filter(Transaction.type == "stake", Transaction.status.in_(("queued", "pending"))).all()
+        for tx_id, status in rows:
+            self.submit(tx_id, "create" if status == "queued" else "poll")
+        return len(rows)
+
+
+# -------------------------
+# Completion
+# -------------------------
+def _claim(tx, status, expected="pending"):
+    """expected -> status, only if nobody else got there first."""
+    t = Transaction.__table__
+    done = db.session.execute(
+        t.update().where(t.c.id == tx.id, t.c.status == expected).values(status=status)
+    ).rowcount
+    return done == 1
+
+
+def complete(tx):
+    """Book a paid stake into the match pot, exactly once. Commits."""
+    if not _claim(tx, "completed"):
+        db.session.rollback()
+        return False
+    m = Match.__table__
+    match = db.session.get(Match, tx.match_id)
+    # in SQL, so concurrent payments into one pot can't lose an update
+    touches = [f"match:{match.id}", "matches", f"team:{match.team1_id}", f"team:{match.team2_id}"]
+    db.session.execute(m.update().where(m.c.id == tx.match_id)
+                       .values(stakes=db.func.coalesce(m.c.stakes, 0) + tx.amount),
+                       execution_options={"touches": touches})
+    ledger.post("stake", [(ledger.EXTERNAL, -tx.amount), (ledger.match_account(tx.match_id), tx.amount)],
+                match_id=tx.match_id, player_id=tx.player_id, tx=tx)
+    db.session.commit()
+    from app.routes import publish_winnings  # routes import this module
+    publish_winnings(match.team1, match.team2)
+    return True
+
+
+def close(tx, status, expected="pending"):
+    """Move a payment to a final status without booking anything. Commits."""
+    if not _claim(tx, status, expected):
+        db.session.rollback()
+        return False
+    db.session.commit()
+    return True
+
+
+def queue_for(app):
+    """The app's payment queue, created on first use."""
+    queue = app.extensions.get("payments")
+    if queue is None:
+        queue = app.extensions["payments"] = PaymentQueue(app)
+    return queue
+
+
+def init_payments(app, backend=None):
+    """Attach a queue with an explicit backend (tests, benchmarks, fakes)."""
+    app.extensions["payments"] = PaymentQueue(app, backend)
+    return app.extensions["payments"]
@@ -0,0 +1,143 @@
+# ratings.py
+"""
+Incremental rating engine (Elo or Glicko-2, chosen by RATING_SYSTEM).
+
+Each completed match is rated exactly once (see stats.record_result): both
+teams are rated against each other and every assigned player against the opposing side's composite rating.
+All updates use the pre-match ratings, so the work is O(participants).
+"""
+import math
+from flask import current_app
+
+DEFAULT_RATING = 1500.0
+DEFAULT_DEVIATION = 350.0
+DEFAULT_VOLATILITY = 0.06
+
+GLICKO_SCALE = 173.7178
+GLICKO_EPSILON = 0.000001
+
+
+def expected_score(rating, opp_rating):
+    return 1.0 / (1.0 + 10 ** ((opp_rating - rating) / 400.0))
+
+
+def elo_update(rating, opp_rating, score, k=32):
+    """New Elo rating after one game; score is 1 (win), 0.5 (draw) or 0 (loss)."""
+    return rating + k * (score - expected_score(rating, opp_rating))
+
+
+def _g(phi):
+    return 1.0 / math.sqrt(1.0 + 3.0 * phi * phi / (math.pi * math.pi))
+
+
+def glicko2_update(rating, deviation, volatility, opp_rating, opp_deviation, score, tau=0.5):
+    """
+    One Glicko-2 rating period containing a single game.
+    Returns (rating, deviation, volatility).
+    """
+    mu = (rating - DEFAULT_RATING) / GLICKO_SCALE
+    phi = deviation / GLICKO_SCALE
+    mu_j = (opp_rating - DEFAULT_RATING) / GLICKO_SCALE
+    phi_j = opp_deviation / GLICKO_SCALE
+
+    g = _g(phi_j)
+    e = 1.0 / (1.0 + math.exp(-g * (mu - mu_j)))
+    v = 1.0 / (g * g * e * (1.0 - e))
+    delta = v * g * (score - e)
+
+    # new volatility (Illinois iteration, step 5 of Glickman's paper)
+    a = math.log(volatility * volatility)
+
+    def f(x):
+        ex = math.exp(x)
+        return (ex * (delta * delta - phi * phi - v - ex)) / (2.0 * (phi * phi + v + ex) ** 2) - (x - a) / (tau * tau)
+
+    big_a = a
+    if delta * delta > phi * phi + v:
+        big_b = math.log(delta * delta - phi * phi - v)
+    else:
+        k = 1
+        while f(a - k * tau) < 0:
+            k += 1
+        big_b = a - k * tau
+    f_a, f_b = f(big_a), f(big_b)
+    while abs(big_b - big_a) > GLICKO_EPSILON:
+        big_c = big_a + (big_a - big_b) * f_a / (f_b - f_a)
+        f_c = f(big_c)
+        if f_c * f_b <= 0:
+            big_a, f_a = big_b, f_b
+        else:
+            f_a /= 2.0
+        big_b, f_b = big_c, f_c
+    new_volatility = math.exp(big_a / 2.0)
+
+    phi_star = math.sqrt(phi * phi + new_volatility * new_volatility)
+    new_phi = 1.0 / math.sqrt(1.0 / (phi_star * phi_star) + 1.0 / v)
+    new_mu = mu + new_phi * new_phi * g * (score - e)
+    return (
+        GLICKO_SCALE * new_mu + DEFAULT_RATING,
+        min(DEFAULT_DEVIATION, GLICKO_SCALE * new_phi),
+        new_volatility,
+    )
+
+
+def _state(obj):
+    return (
+        obj.rating if obj.rating is not None else DEFAULT_RATING,
+        obj.rating_deviation if obj.rating_deviation is not None else DEFAULT_DEVIATION,
+        obj.rating_volatility if obj.rating_volatility is not None else DEFAULT_VOLATILITY,
+    )
+
+
+def _composite(states):
+    """Average rating and RMS deviation of one side's players."""
+    if not states:
+        return None
+    rating = sum(s[0] for s in states) / len(states)
+    deviation = math.sqrt(sum(s[1] * s[1] for s in states) / len(states))
+    return rating, deviation
+
+
+def _apply(obj, state, opp, score, system, config):
+    rating, deviation, volatility = state
+    if system == "glicko2":
+        rating, deviation, volatility = glicko2_update(
+            rating, deviation, volatility, opp[0], opp[1], score,
+            tau=config.get("GLICKO_TAU", 0.5),
+        )
+    else:
+        rating = elo_update(rating, opp[0], score, k=config.get("ELO_K", 32))
+    obj.rating = rating
+    obj.rating_deviation = deviation
+    obj.rating_volatility = volatility
+
+
+def apply_match_result(match, winning_side, players):
+    """
+    Rate a completed match. winning_side is 'A' (team1) or 'B' (team2);
+    players maps each side to its participants. Called once per result by
+    stats.record_result. The caller commits.
+    """
+    config = current_app.config
+    system = (config.get("RATING_SYSTEM") or "elo").lower()
+    score_a = 1.0 if winning_side == "A" else 0.0
+
+    teams = {"A": match.team1, "B": match.team2}
+
+    # snapshot everything first so update order cannot matter
+    team_state = {side: _state(t) for side, t in teams.items() if t}
+    player_state = {side: [(p, _state(p)) for p in ps] for side, ps in players.items()}
+    side_strength = {}
+    for side in ("A", "B"):
+        side_strength[side] = _composite([s for _, s in player_state[side]]) or team_state.get(side)
+
+    if "A" in team_state and "B" in team_state:
+        _apply(teams["A"], team_state["A"], team_state["B"], score_a, system, config)
+        _apply(teams["B"], team_state["B"], team_state["A"], 1.0 - score_a, system, config)
+
+    for side, opp_side, score in (("A", "B", score_a), ("B", "A", 1.0 - score_a)):
+        opp = side_strength[opp_side]
+        if not opp:
+            continue
+        for p, state in player_state[side]:
+            _apply(p, state, opp, score, system, config)
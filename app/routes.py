@@ -1,10 +1,9 @@
 from flask import current_app as app, render_template, request, redirect, url_for, flash, jsonify, abort
 from . import db
-from .models import Team, Player, Match, MatchAssignment, Invite, PlayerSkill, Dispute, AdminSettings
-from .utils import shuffle_players_list, balance_teams, make_token
+from .models import Team, Player, Match, MatchAssignment, Invite, PlayerSkill, Dispute, AdminSettings, Venue, Schedule
+from .utils import shuffle_players_list, balance_teams, kway_balance, skill_balance, constrained_balance, balance_many, make_token, encode_cursor, decode_cursor
 from datetime import datetime
 from flask import session, redirect, url_for, flash
-from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 from .models import Admin
 import json
@@ -15,14 +14,21 @@ from app import db
 from app.models import Match, Team, PlayerStats, Transaction, Bet
 from flask import render_template, abort
 from app.models import Player, Team  # adjust imports
-from app.ai_recommendations import generate_ai_recommendations, update_skill_rating
-from app.ai_matchmaking import recommend_opponents, recommend_venues
+from app.ai_recommendations import generate_ai_recommendations
+from app.migrations import upgrade, check_query_plans
+from app.stats import record_result, side_of, rebuild_aggregates, append_rating_point, rating_history, migrate_progress_blobs
+from app.ai_matchmaking import recommend_opponents, recommend_venues, recommend_venues_for_match, opponent_index
+from app.events import bus, sse_stream, sse_response
+from app.scheduler import create_schedule
+from app import ledger
+from app.settlement import settle
+from app import payments
+from app import passwords
+from app import tasks
+from app.cache import cached_view, team_keys
 from flask import current_app
-import stripe
-
-
-
-stripe.api_key = app.config["STRIPE_SECRET_KEY"]
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
 
 # -------------------------
@@ -43,104 +49,235 @@ def skill_fields_for_sport(sport):
     return mapping.get(sport.lower(), mapping["default"])
 
 # -------------------------
-# Helper: recalculate team skill rating
+# Helper: per-player skill vectors for balancing
 # -------------------------
-def recalc_team_skill(team):
+def skill_vectors(players, skill_names):
     """
-    Recalculate team's average skill rating as:
-    average of all PlayerSkill.value across all players in the team.
-    If no PlayerSkill rows, fallback to average of player.skill_rating values
-    or the default 1200.
+    One row of skill values per player (ordered like skill_names), loaded with
+    a single PlayerSkill query. Missing skills fall back to the mean of that
+    skill over the pool, or the player's skill_rating if nobody has it.
     """
-    # collect all players on team
-    players = Player.query.filter_by(team_id=team.id).all()
-    total = 0
-    count = 0
-    for p in players:
-        # player skills
-        for s in p.skills:
-            # s.value is the model field
-            total += s.value
-            count += 1
-
-    if count > 0:
-        avg = total / count
-        team.skill_rating = int(round(avg))
-        db.session.add(team)
-        db.session.commit()
-        return team.skill_rating
+    ids = [p.id for p in players]
+    values = {}
+    if ids:
+        rows = PlayerSkill.query.filter(PlayerSkill.player_id.in_(ids), PlayerSkill.name.in_(skill_names)).all()
+        for s in rows:
+            values[(s.player_id, s.name)] = s.value
+    means = {}
+    for name in skill_names:
+        present = [values[(pid, name)] for pid in ids if (pid, name) in values]
+        means[name] = sum(present) / len(present) if present else None
+    return [
+        [values.get((p.id, name), means[name] if means[name] is not None else (p.skill_rating or 0))
+         for name in skill_names]
+        for p in players
+    ]
 
-    # fallback: average player.skill_rating if present
-    if players:
-        sum_ratings = sum((p.skill_rating or 50) for p in players)
-        team.skill_rating = int(round(sum_ratings / len(players)))
-        db.session.add(team)
-        db.session.commit()
-        return team.skill_rating
+# -------------------------
+# Helper: balancing constraints from form fields
+# -------------------------
+def parse_id_groups(raw):
+    """'1,2,3;4,5' -> [[1, 2, 3], [4, 5]] (groups of fewer than two ids are dropped)"""
+    groups = []
+    for chunk in (raw or "").split(";"):
+        ids = [int(x) for x in chunk.split(",") if x.strip().isdigit()]
+        if len(ids) > 1:
+            groups.append(ids)
+    return groups
+
+def parse_role_quota(raw):
+    """'Goalkeeper:1,Defender:2' -> {'Goalkeeper': 1, 'Defender': 2}"""
+    quota = {}
+    for chunk in (raw or "").split(","):
+        role, _, count = chunk.partition(":")
+        if role.strip() and count.strip().isdigit():
+            quota[role.strip()] = int(count)
+    return quota
 
-    # no players: leave default
-    team.skill_rating = team.skill_rating or 50
-    db.session.add(team)
-    db.session.commit()
+# -------------------------
+# Helper: team skill rating from running totals
+# -------------------------
+def _refresh_team_skill(team):
+    """
+    Team rating = average of all PlayerSkill.value across its players; if no
+    PlayerSkill rows, the average player.skill_rating; with no players the
+    current value (or 50) is kept.
+    """
+    if team.skill_value_count:
+        team.skill_rating = int(round(team.skill_value_sum / team.skill_value_count))
+    elif team.player_count:
+        team.skill_rating = int(round(team.player_rating_sum / team.player_count))
+    else:
+        team.skill_rating = team.skill_rating or 50
     return team.skill_rating
 
+def counted_rating(rating):
+    """A player's skill_rating as recalc_team_skill sums it: NULL counts as 50, 0 as 0."""
+    return rating if rating is not None else 50
+
+def recalc_team_skill(team):
+    """
+    Rebuild the team's running totals from the database with two aggregate
+    queries. Does not commit.
+    """
+    skill_sum, skill_count = db.session.query(
+        func.coalesce(func.sum(PlayerSkill.value), 0), func.count(PlayerSkill.id)
+    ).join(Player, Player.id == PlayerSkill.player_id).filter(Player.team_id == team.id).one()
+    rating_sum, player_count = db.session.query(
+        func.coalesce(func.sum(func.coalesce(Player.skill_rating, 50)), 0), func.count(Player.id)
+    ).filter(Player.team_id == team.id).one()
+    team.skill_value_sum, team.skill_value_count = int(skill_sum), skill_count
+    team.player_rating_sum, team.player_count = int(rating_sum), player_count
+    return _refresh_team_skill(team)
+
+def has_skill_totals(team):
+    """Teams that predate the running totals have None in them until rebuilt."""
+    return None not in (team.skill_value_sum, team.skill_value_count, team.player_rating_sum, team.player_count)
+
+def refresh_team_skill(team_id):
+    """
+    Background follow-up to a roster change (app/tasks.py): a team without
+    running totals gets them rebuilt from the committed rows, then the
+    opponent index picks up its rating.
+    """
+    team = db.session.get(Team, team_id)
+    if team is None:
+        return
+    if not has_skill_totals(team):
+        recalc_team_skill(team)
+        db.session.commit()
+    opponent_index.update(team)
+
+def roster_changed(team, **deltas):
+    """
+    Apply a roster change to the team's running totals (if it has them) and
+    queue refresh_team_skill for after the commit, one per team. Call before
+    committing.
+    """
+    if has_skill_totals(team):
+        adjust_team_skill(team, **deltas)
+    tasks.after_commit(refresh_team_skill, team.id, key=f"team-skill:{team.id}")
+
+def adjust_team_skill(team, skill_sum=0, skill_count=0, rating_sum=0, players=0):
+    """O(1) update of the running totals and team.skill_rating. Does not commit."""
+    team.skill_value_sum += skill_sum
+    team.skill_value_count += skill_count
+    team.player_rating_sum += rating_sum
+    team.player_count += players
+    return _refresh_team_skill(team)
+
+def _skill_rows_from_form(player_id, sport, skill_names):
+    """PlayerSkill rows from skill_* form fields (canonical names first, then any extras)."""
+    rows = []
+    sport_key = sport.lower() if sport else "unknown"
+    canonical_keys = {f"skill_{sn.replace(' ','_')}" for sn in skill_names}
+    for sname in skill_names:
+        val = request.form.get(f"skill_{sname.replace(' ','_')}")
+        if val is None or val == "":
+            continue
+        try:
+            v = int(val)
+        except Exception:
+            # ignore invalid entries
+            continue
+        rows.append(PlayerSkill(player_id=player_id, sport=sport_key, name=sname, value=v))
+    for key in request.form:
+        if key.startswith("skill_") and key not in canonical_keys:
+            v_raw = request.form.get(key)
+            if v_raw is None or v_raw == "":
+                continue
+            try:
+                v = int(v_raw)
+            except Exception:
+                continue
+            # name from key after skill_
+            rows.append(PlayerSkill(player_id=player_id, sport=sport_key, name=key[len("skill_"):].replace("_", " "), value=v))
+    return rows
+
 @app.route("/create_checkout_session/<int:match_id>", methods=["POST"])
 def create_checkout_session(match_id):
+    """
+    Queue a card payment for a stake and return at once (202). The session is
+    created by the payment queue; poll the status URL for its checkout_url.
+    A repeated Idempotency-Key header returns the first request's payment.
+    """
     match = Match.query.get_or_404(match_id)
-    amount = float(request.form.get("amount", 0))
-    player_id = current_user.id
-
-    session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        line_items=[{
-            "price_data": {
-                "currency": "usd",
-                "product_data": {"name": f"Stake for Match #{match.id}"},
-                "unit_amount": int(amount * 100),
-            },
-            "quantity": 1,
-        }],
-        mode="payment",
-        success_url=url_for("payment_success", match_id=match.id, _external=True),
-        cancel_url=url_for("payment_cancel", match_id=match.id, _external=True),
-    )
-
-    tx = Transaction(match_id=match.id, player_id=player_id, amount=amount,
-                     type='stake', status='pending', stripe_payment_id=session.id)
-    db.session.add(tx)
-    db.session.commit()
-
-    return redirect(session.url, code=303)
+    amount = request.form.get("amount", 0, type=float)
+    if amount <= 0:
+        return jsonify({"error": "Please enter a valid stake amount."}), 400
+
+    client_key = request.headers.get("Idempotency-Key")
+    key = f"checkout:{client_key}" if client_key else payments.new_key()
+    tx = Transaction.query.filter_by(idempotency_key=key).first() if client_key else None
+    if tx is None:
+        tx = Transaction(match_id=match.id, player_id=request.form.get("player_id", type=int), amount=amount,
+                         type="stake", status="queued", idempotency_key=key, attempts=0)
+        db.session.add(tx)
+        db.session.commit()
+        payments.queue_for(app).submit(tx.id, "create", base=request.host_url)
+
+    status_url = url_for("api_payment_status", tx_id=tx.id)
+    return jsonify({"transaction_id": tx.id, "status": tx.status, "status_url": status_url}), 202, \
+        {"Location": status_url}
+
+@app.route("/api/payments/<int:tx_id>")
+def api_payment_status(tx_id):
+    tx = Transaction.query.get_or_404(tx_id)
+    return jsonify({"transaction_id": tx.id, "match_id": tx.match_id, "amount": tx.amount,
+                    "status": tx.status, "checkout_url": tx.checkout_url})
+
+def _checkout_tx():
+    session_id = request.args.get("session_id")
+    return Transaction.query.filter_by(stripe_payment_id=session_id).first() if session_id else None
+
+@app.route("/payments/success")
+def payment_success():
+    tx = _checkout_tx()
+    if tx is None:
+        abort(404)
+    if tx.status == "pending":
+        # don't wait for the next scheduled poll
+        payments.queue_for(app).submit(tx.id, "poll")
+    flash("Payment received. Your stake is added once it is confirmed.", "success")
+    return redirect(url_for("match_detail", match_id=tx.match_id))
+
+@app.route("/payments/cancel")
+def payment_cancel():
+    tx = _checkout_tx()
+    if tx is None:
+        abort(404)
+    flash("Payment cancelled; no stake was added.", "warning")
+    return redirect(url_for("match_detail", match_id=tx.match_id))
 
 @app.route("/mark_result/<int:match_id>", methods=["POST"])
 def mark_result(match_id):
     match = Match.query.get_or_404(match_id)
-    winner_id = int(request.form.get("winner_id"))
+    winner_id = request.form.get("winner_id", type=int)
     payout_mode = request.form.get("payout_mode")
 
+    # 0 is a draw; any other id must be one of the two teams
+    side = side_of(match, winner_id)
+    if winner_id is None or (winner_id != 0 and side is None):
+        flash("The winner must be one of the two teams.", "danger")
+        return redirect(url_for("admin_dashboard"))
+
     # Identify winner and loser teams
     team1 = match.team1
     team2 = match.team2
-    winner = Team.query.get(winner_id) if winner_id != 0 else None
 
     # Set match result
     match.status = "completed"
-    match.winner_id = winner_id
+    match.winner_team_id = winner_id if side else None
+    # counters and ratings, like admin_approve_result (draws aren't counted)
+    if side:
+        record_result(match, side)
     db.session.commit()
 
-    # 🪙 Calculate winnings
-    if winner:
-        stake = match.stakes or 0
-
-        # Add winnings to winner
-        winner.total_winnings = (winner.total_winnings or 0) + stake
-
-        # Optional: loser stays same
-        loser = team1 if winner.id == team2.id else team2
-
-        # Commit winnings update
-        db.session.commit()
+    # 🪙 Calculate winnings (a draw leaves the stakes in the pot)
+    if side:
+        settle([match.id])
 
+    publish_winnings(team1, team2)
     flash(f"Match #{match_id} marked as completed. Winnings updated.", "success")
     return redirect(url_for("admin_dashboard"))
 
@@ -158,19 +295,59 @@ def place_stake(match_id):
 
     # Add the new amount to the match’s total stakes
     match.stakes += amount
+    ledger.post("stake", [(ledger.EXTERNAL, -amount), (ledger.match_account(match.id), amount)], match_id=match.id)
     db.session.commit()
+    publish_winnings(match.team1, match.team2)
 
     flash(f"Successfully added ${amount:.2f} to the total stake.", "success")
     return redirect(url_for('match_detail', match_id=match_id))
 
 
 # Home
+def _matches_page(query, cursor, size):
+    """Newest-first keyset page over (created_at, id); returns (rows, next_cursor)."""
+    after = decode_cursor(cursor, datetime, int)
+    if after:
+        created_at, match_id = after
+        query = query.filter(db.or_(
+            Match.created_at < created_at,
+            db.and_(Match.created_at == created_at, Match.id < match_id),
+        ))
+    rows = query.options(joinedload(Match.team1), joinedload(Match.team2)) \
+        .order_by(Match.created_at.desc(), Match.id.desc()).limit(size + 1).all()
+    next_cursor = encode_cursor(rows[size - 1].created_at, rows[size - 1].id) if len(rows) > size else None
+    return rows[:size], next_cursor
+
 @app.route("/")
 def index():
-    teams = Team.query.order_by(Team.name).all()
-    matches = Match.query.order_by(Match.created_at.desc()).all()
-    open_matches = [m for m in matches if (not m.team1_id) or (not m.team2_id)]
-    return render_template("index.html", teams=teams, matches=matches, open_matches=open_matches)
+    return cached_view("index", ["teams", "matches", "team:*", "match:*"], _render_index)
+
+def _render_index():
+    size = app.config.get("HOME_PAGE_SIZE", 20)
+    args = request.args
+
+    # teams: alphabetical keyset page over (name, id)
+    team_query = Team.query
+    after = decode_cursor(args.get("teams_after"), str, int)
+    if after:
+        team_query = team_query.filter(db.or_(
+            Team.name > after[0],
+            db.and_(Team.name == after[0], Team.id > after[1]),
+        ))
+    teams = team_query.order_by(Team.name, Team.id).limit(size + 1).all()
+    next_teams = encode_cursor(teams[size - 1].name, teams[size - 1].id) if len(teams) > size else None
+    teams = teams[:size]
+
+    matches, next_matches = _matches_page(Match.query, args.get("matches_after"), size)
+    open_matches, next_open = _matches_page(
+        # bracket matches waiting on an earlier result are not open challenges
+        Match.query.filter(db.or_(Match.team1_id.is_(None), Match.team2_id.is_(None)), Match.status != "awaiting"),
+        args.get("open_after"), size,
+    )
+    return render_template(
+        "index.html", teams=teams, matches=matches, open_matches=open_matches,
+        next_teams=next_teams, next_matches=next_matches, next_open=next_open,
+    )
 
 # -------------------------
 # Team creation & detail
@@ -189,10 +366,12 @@ def create_team():
         team = Team(name=name, color=color, skill_rating=skill, sport=sport)
         db.session.add(team)
         db.session.commit()
+        opponent_index.update(team)
 
         if captain_name:
             captain = Player(name=captain_name, role="Captain", skill_rating=skill, team_id=team.id)
             db.session.add(captain)
+            roster_changed(team, rating_sum=counted_rating(skill), players=1)
             db.session.commit()
             team.captain_id = captain.id
             db.session.commit()
@@ -203,31 +382,28 @@ def create_team():
 
 @app.route("/teams/<int:team_id>")
 def team_detail(team_id):
-    team = Team.query.get_or_404(team_id)
-
-    skill_names = skill_fields_for_sport(team.sport)
-    players = team.players
+    # access is checked before the cache; only a column is read so the page
+    # itself loads after the cache has read its versions
+    name = db.session.query(Team.name).filter_by(id=team_id).scalar()
+    if name is None:
+        abort(404)
 
     # Allow viewing Free Agent Pool always — no redirect
-    if team.name == "Free Agent Pool":
+    # Normal access restriction for logged-in teams
+    if name != "Free Agent Pool" and session.get("team_id") != team_id:
+        flash("Not allowed.", "danger")
+        return redirect(url_for("index"))
+
+    def render():
+        team = Team.query.get_or_404(team_id)
         return render_template(
             "team_detail.html",
             team=team,
-            players=players,
-            skill_names=skill_names
+            players=team.players,
+            skill_names=skill_fields_for_sport(team.sport),
+            winnings=team_winnings(team)
         )
-
-    # Normal access restriction for logged-in teams
-    if "team_id" not in session or session["team_id"] != team_id:
-        flash("Not allowed.", "danger")
-        return redirect(url_for("index"))
-    
-    return render_template(
-        "team_detail.html", 
-        team=team, 
-        players=players, 
-        skill_names=skill_names
-    )
+    return cached_view("team_detail", team_keys(team_id), render)
 
 
 # manual add player to team
@@ -243,51 +419,19 @@ def team_add_player(team_id):
         flash("Player name required", "danger")
         return redirect(url_for("team_detail", team_id=team_id))
 
-    # create player
+    # create player and its PlayerSkill rows in one transaction
     p = Player(name=name, email=email, role=role, skill_rating=skill, team_id=team.id, invited=False)
     db.session.add(p)
-    db.session.commit()
+    db.session.flush()
 
-    # extract skill_* fields from form and store as PlayerSkill rows
     # expected form inputs: skill_Shooting, skill_Passing, etc.
-    skill_names = skill_fields_for_sport(team.sport)
-    any_skill_saved = False
-    canonical_keys = {f"skill_{sn.replace(' ','_')}" for sn in skill_names}
-    for sname in skill_names:
-        key = f"skill_{sname.replace(' ','_')}"
-        val = request.form.get(key)
-        if val is None or val == "":
-            continue
-        try:
-            v = int(val)
-        except Exception:
-            # ignore invalid entries
-            continue
-        ps = PlayerSkill(player_id=p.id, sport=(team.sport.lower() if team.sport else "unknown"), name=sname, value=v)
-        db.session.add(ps)
-        any_skill_saved = True
-
-    # Also support arbitrary skill_ fields not in the canonical set
-    for key in request.form:
-        if key.startswith("skill_") and key not in canonical_keys:
-            v_raw = request.form.get(key)
-            if v_raw is None or v_raw == "":
-                continue
-            try:
-                v = int(v_raw)
-            except Exception:
-                continue
-            # name from key after skill_
-            name_from_key = key[len("skill_"):].replace("_", " ")
-            ps = PlayerSkill(player_id=p.id, sport=(team.sport.lower() if team.sport else "unknown"), name=name_from_key, value=v)
-            db.session.add(ps)
-            any_skill_saved = True
+    rows = _skill_rows_from_form(p.id, team.sport, skill_fields_for_sport(team.sport))
+    db.session.add_all(rows)
 
+    roster_changed(team, skill_sum=sum(r.value for r in rows), skill_count=len(rows),
+                   rating_sum=counted_rating(skill), players=1)
     db.session.commit()
 
-    # Recalculate team skill rating now that player added
-    recalc_team_skill(team)
-
     flash("Player added", "success")
     return redirect(url_for("team_detail", team_id=team_id))
 
@@ -299,6 +443,9 @@ def edit_player(player_id):
     sport = team.sport if team else None
     skill_names = skill_fields_for_sport(sport)
     if request.method == "POST":
+        old_skills = list(player.skills)
+        old_rating = counted_rating(player.skill_rating)
+
         player.name = request.form.get("name") or player.name
         player.email = request.form.get("email") or player.email
         player.role = request.form.get("role") or player.role
@@ -307,45 +454,22 @@ def edit_player(player_id):
             player.skill_rating = int(request.form.get("skill_rating") or player.skill_rating)
         except Exception:
             pass
-        db.session.add(player)
-        db.session.commit()
-
-        # delete old PlayerSkill rows for this player and save new ones
-        PlayerSkill.query.filter_by(player_id=player.id).delete()
-        db.session.commit()
 
-        canonical_keys = {f"skill_{sn.replace(' ','_')}" for sn in skill_names}
-        for sname in skill_names:
-            key = f"skill_{sname.replace(' ','_')}"
-            val = request.form.get(key)
-            if val is None or val == "":
-                continue
-            try:
-                v = int(val)
-            except Exception:
-                continue
-            ps = PlayerSkill(player_id=player.id, sport=(sport.lower() if sport else "unknown"), name=sname, value=v)
-            db.session.add(ps)
-
-        # also save arbitrary skill_ fields
-        for key in request.form:
-            if key.startswith("skill_") and key not in canonical_keys:
-                v_raw = request.form.get(key)
-                if v_raw is None or v_raw == "":
-                    continue
-                try:
-                    v = int(v_raw)
-                except Exception:
-                    continue
-                name_from_key = key[len("skill_"):].replace("_", " ")
-                ps = PlayerSkill(player_id=player.id, sport=(sport.lower() if sport else "unknown"), name=name_from_key, value=v)
-                db.session.add(ps)
+        # replace the player's PlayerSkill rows
+        touches = [f"player:{player.id}"] + ([f"team:{team.id}"] if team else [])
+        PlayerSkill.query.filter_by(player_id=player.id).execution_options(touches=touches).delete()
+        rows = _skill_rows_from_form(player.id, sport, skill_names)
+        db.session.add_all(rows)
 
-        db.session.commit()
-
-        # recalc team rating
+        # apply the difference to the team totals
         if team:
-            recalc_team_skill(team)
+            roster_changed(
+                team,
+                skill_sum=sum(r.value for r in rows) - sum(s.value for s in old_skills),
+                skill_count=len(rows) - len(old_skills),
+                rating_sum=counted_rating(player.skill_rating) - old_rating,
+            )
+        db.session.commit()
 
         flash("Player updated", "success")
         if team:
@@ -363,22 +487,16 @@ def delete_player(player_id):
     player = Player.query.get_or_404(player_id)
     team = player.team
 
-    # Delete the player's skills first
-    PlayerSkill.query.filter_by(player_id=player.id).delete()
+    # take the player's skills out of the team totals, then delete
+    if team:
+        skills = list(player.skills)
+        roster_changed(team, skill_sum=-sum(s.value for s in skills), skill_count=-len(skills),
+                       rating_sum=-counted_rating(player.skill_rating), players=-1)
 
+    # PlayerSkill rows go with the player (delete-orphan cascade)
     db.session.delete(player)
     db.session.commit()
 
-    # Recalculate team's average after deletion using recalc_team_skill
-    if team:
-        try:
-            recalc_team_skill(team)
-        except Exception:
-            # if something odd happens, ensure team.skill_rating isn't left None
-            team.skill_rating = team.skill_rating or 50
-            db.session.add(team)
-            db.session.commit()
-
     flash(f"{player.name} has been deleted{(' from ' + team.name) if team else ''}.", "warning")
     if team:
         return redirect(url_for("team_detail", team_id=team.id))
@@ -485,17 +603,14 @@ def accept_invite(token):
         name = request.form.get("name")
         email = request.form.get("email") or None
         if inv.context_type == "team":
-            # add player into the team
-            p = Player(name=name or inv.invited_name or "Guest", email=email, invited=False, team_id=inv.context_id)
-            db.session.add(p); db.session.commit()
+            # add player into the team (no skills until they edit; counts toward the rating fallback)
+            team = Team.query.get(inv.context_id)
+            p = Player(name=name or inv.invited_name or "Guest", email=email, invited=False, team_id=inv.context_id, skill_rating=50)
+            db.session.add(p)
+            if team:
+                roster_changed(team, rating_sum=50, players=1)
             inv.accepted = True; db.session.commit()
             flash("You joined the team!", "success")
-            # recalc team rating (no skills from invite accepted player until they edit)
-            try:
-                team = Team.query.get(inv.context_id)
-                recalc_team_skill(team)
-            except Exception:
-                pass
             return redirect(url_for("team_detail", team_id=inv.context_id))
         else:
             # match invite - join as a player assigned to match pool (we create a player w/o team)
@@ -506,6 +621,7 @@ def accept_invite(token):
             ma = MatchAssignment(match_id=inv.context_id, player_id=p.id, team_side='A')
             db.session.add(ma)
             inv.accepted = True; db.session.commit()
+            publish_roster(inv.context_id, {}, {p.id: 'A'})
             flash("You joined the match pool!", "success")
             return redirect(url_for("match_detail", match_id=inv.context_id))
     # GET: render accept form
@@ -517,6 +633,9 @@ def join_open_match(match_id, team_id):
     match = Match.query.get_or_404(match_id)
     if match.status == "locked":
         flash("Match is locked", "danger"); return redirect(url_for("match_detail", match_id=match_id))
+    if match.status == "awaiting":
+        flash("This bracket slot is decided by an earlier match", "danger")
+        return redirect(url_for("match_detail", match_id=match_id))
     if not match.team1_id:
         match.team1_id = team_id
     elif not match.team2_id:
@@ -525,9 +644,38 @@ def join_open_match(match_id, team_id):
         flash("Both slots filled", "danger")
         return redirect(url_for("match_detail", match_id=match_id))
     db.session.commit()
+    # the player pool changed; viewers reload to pick it up
+    bus.publish(f"match:{match.id}:roster", {"type": "pool"})
     flash("Team joined the match", "success")
     return redirect(url_for("match_detail", match_id=match_id))
 
+# -------------------------
+# Roster writes
+# -------------------------
+def replace_rosters(rosters):
+    """
+    Swap the assignments of every match in `rosters` ({match_id: [(player_id,
+    side, pinned)]}) in one transaction: one DELETE and one bulk INSERT, so no
+    reader ever sees a half-written roster. Publishes the diffs afterwards.
+    """
+    if not rosters:
+        return
+    before = {match_id: {} for match_id in rosters}
+    rows = db.session.query(MatchAssignment.match_id, MatchAssignment.player_id, MatchAssignment.team_side) \
+        .filter(MatchAssignment.match_id.in_(list(rosters))).all()
+    for match_id, player_id, side in rows:
+        before[match_id][player_id] = side
+    MatchAssignment.query.filter(MatchAssignment.match_id.in_(list(rosters))).delete(synchronize_session=False)
+    values = [
+        {"match_id": match_id, "player_id": player_id, "team_side": side, "pinned": pinned}
+        for match_id, seats in rosters.items() for player_id, side, pinned in seats
+    ]
+    if values:
+        db.session.execute(db.insert(MatchAssignment), values)
+    db.session.commit()
+    for match_id, seats in rosters.items():
+        publish_roster(match_id, before[match_id], {player_id: side for player_id, side, _ in seats})
+
 # -------------------------
 # Balancing & shuffle endpoints (AJAX-friendly JSON)
 # -------------------------
@@ -543,16 +691,46 @@ def match_auto_balance(match_id):
         pool += Player.query.filter_by(team_id=match.team2_id).all()
     if not pool:
         pool = Player.query.all()
-    team_a, team_b = balance_teams(pool)
-    # remove old assignments for match
-    MatchAssignment.query.filter_by(match_id=match.id).delete()
-    db.session.commit()
-    for p in team_a:
-        db.session.add(MatchAssignment(match_id=match.id, player_id=p.id, team_side='A'))
-    for p in team_b:
-        db.session.add(MatchAssignment(match_id=match.id, player_id=p.id, team_side='B'))
-    db.session.commit()
-    return jsonify({"team_a":[p.name for p in team_a],"team_b":[p.name for p in team_b]})
+    # players placed by hand stay on their side
+    pinned = MatchAssignment.query.filter_by(match_id=match.id, pinned=True).all()
+    locked = {a.player_id: a.team_side for a in pinned}
+    pool_ids = {p.id for p in pool}
+    pool += [a.player for a in pinned if a.player_id not in pool_ids]
+    together = parse_id_groups(request.form.get("together"))
+    apart = parse_id_groups(request.form.get("apart"))
+    role_quota = parse_role_quota(request.form.get("role_quota"))
+    constrained = bool(locked or together or apart or role_quota)
+
+    # mode=skills balances every PlayerSkill dimension instead of skill_rating
+    mode = request.form.get("mode") or request.args.get("mode") or "rating"
+    skill_gap = None
+    if mode == "skills" and constrained:
+        return jsonify({"error": "skills mode does not support pinned players or constraints"}), 400
+    if constrained:
+        try:
+            team_a, team_b = constrained_balance(
+                pool, locked=locked, together=together, apart=apart, role_quota=role_quota,
+                deadline_ms=app.config.get("BALANCE_DEADLINE_MS", 200),
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    elif mode == "skills":
+        skill_names = skill_fields_for_sport(match.sport)
+        vectors = skill_vectors(pool, skill_names)
+        team_a, team_b, gaps = skill_balance(pool, vectors, deadline_ms=app.config.get("BALANCE_DEADLINE_MS", 200))
+        skill_gap = {name: round(g, 2) for name, g in zip(skill_names, gaps)}
+    else:
+        team_a, team_b = balance_teams(pool)
+    replace_rosters({match.id: [(p.id, 'A', p.id in locked) for p in team_a] +
+                               [(p.id, 'B', p.id in locked) for p in team_b]})
+    return jsonify({
+        "team_a": [p.name for p in team_a],
+        "team_b": [p.name for p in team_b],
+        "rating_a": sum((p.skill_rating or 0) for p in team_a),
+        "rating_b": sum((p.skill_rating or 0) for p in team_b),
+        "mode": mode,
+        "skill_gap": skill_gap,
+    })
 
 @app.route("/matches/<int:match_id>/shuffle", methods=["POST"])
 def match_shuffle(match_id):
@@ -566,15 +744,120 @@ def match_shuffle(match_id):
     if not pool:
         pool = Player.query.all()
     a, b = shuffle_players_list(pool)
-    MatchAssignment.query.filter_by(match_id=match.id).delete()
-    db.session.commit()
-    for p in a:
-        db.session.add(MatchAssignment(match_id=match.id, player_id=p.id, team_side='A'))
-    for p in b:
-        db.session.add(MatchAssignment(match_id=match.id, player_id=p.id, team_side='B'))
-    db.session.commit()
+    replace_rosters({match.id: [(p.id, 'A', False) for p in a] + [(p.id, 'B', False) for p in b]})
     return jsonify({"team_a":[p.name for p in a],"team_b":[p.name for p in b]})
 
+@app.route("/matches/auto_balance/batch", methods=["POST"])
+def batch_auto_balance():
+    """
+    Balance and save rosters for many matches at once (tournament nights).
+    Form fields: match_ids (comma separated), optional mode ('rating' or
+    'skills'). Pinned players keep their side, as in the single-match endpoint.
+    The balancing runs on a process pool; all rosters are written in one
+    transaction.
+    """
+    match_ids = [int(x) for x in (request.form.get("match_ids") or "").split(",") if x.strip().isdigit()]
+    limit = app.config.get("BALANCE_BATCH_MAX", 64)
+    if not match_ids:
+        return jsonify({"error": "match_ids is required"}), 400
+    if len(match_ids) > limit:
+        return jsonify({"error": "at most %d matches per batch" % limit}), 400
+    mode = request.form.get("mode") or "rating"
+    if mode not in ("rating", "skills"):
+        return jsonify({"error": "mode must be 'rating' or 'skills'"}), 400
+    deadline_ms = app.config.get("BALANCE_DEADLINE_MS", 200)
+
+    matches = Match.query.filter(Match.id.in_(match_ids)).all()
+    team_ids = {t for m in matches for t in (m.team1_id, m.team2_id) if t}
+    by_team = {}
+    for p in (Player.query.filter(Player.team_id.in_(team_ids)).all() if team_ids else []):
+        by_team.setdefault(p.team_id, []).append(p)
+    pins = {}
+    for a in MatchAssignment.query.options(joinedload(MatchAssignment.player)) \
+            .filter(MatchAssignment.match_id.in_(match_ids), MatchAssignment.pinned.is_(True)):
+        pins.setdefault(a.match_id, []).append(a)
+
+    skipped, jobs, pools = [], [], {}
+    found = {m.id for m in matches}
+    skipped += [{"match_id": mid, "reason": "not found"} for mid in match_ids if mid not in found]
+    for m in matches:
+        pool = by_team.get(m.team1_id, []) + by_team.get(m.team2_id, [])
+        pinned = pins.get(m.id, [])
+        pool_ids = {p.id for p in pool}
+        pool += [a.player for a in pinned if a.player_id not in pool_ids]
+        if m.status == "locked":
+            skipped.append({"match_id": m.id, "reason": "match locked"})
+        elif len(pool) < 2:
+            skipped.append({"match_id": m.id, "reason": "not enough players"})
+        elif mode == "skills" and pinned:
+            skipped.append({"match_id": m.id, "reason": "skills mode does not support pinned players"})
+        else:
+            pools[m.id] = pool
+            jobs.append({
+                "match_id": m.id,
+                "players": [(p.id, p.skill_rating, p.role) for p in pool],
+                "mode": mode,
+                "vectors": skill_vectors(pool, skill_fields_for_sport(m.sport)) if mode == "skills" else None,
+                "locked": {a.player_id: a.team_side for a in pinned},
+                "deadline_ms": deadline_ms,
+            })
+
+    rosters, results = {}, []
+    outcomes = balance_many(jobs, app.config.get("BALANCE_WORKERS", 2))
+    for job, (match_id, side_a, side_b, error) in zip(jobs, outcomes):
+        if error:
+            skipped.append({"match_id": match_id, "reason": error})
+            continue
+        locked = job["locked"]
+        rosters[match_id] = [(pid, 'A', pid in locked) for pid in side_a] + [(pid, 'B', pid in locked) for pid in side_b]
+        rating = {p.id: p.skill_rating or 0 for p in pools[match_id]}
+        results.append({
+            "match_id": match_id,
+            "team_a": side_a,
+            "team_b": side_b,
+            "rating_a": sum(rating[pid] for pid in side_a),
+            "rating_b": sum(rating[pid] for pid in side_b),
+        })
+    replace_rosters(rosters)
+    return jsonify({"balanced": results, "skipped": skipped, "mode": mode})
+
+@app.route("/balance/kway", methods=["POST"])
+def kway_balance_players():
+    """
+    Split a large pool into k teams at once (league draft nights).
+    Form fields: k, optional player_ids (comma separated), optional team_ids
+    (comma separated, pools their players), optional deadline_ms.
+    """
+    try:
+        k = int(request.form.get("k") or 2)
+        deadline_ms = int(request.form.get("deadline_ms") or app.config.get("BALANCE_DEADLINE_MS", 200))
+    except ValueError:
+        return jsonify({"error": "k and deadline_ms must be integers"}), 400
+    if k < 2:
+        return jsonify({"error": "k must be at least 2"}), 400
+    deadline_ms = max(1, min(deadline_ms, app.config.get("BALANCE_DEADLINE_MS", 200)))
+
+    query = Player.query
+    player_ids = [int(x) for x in (request.form.get("player_ids") or "").split(",") if x.strip().isdigit()]
+    team_ids = [int(x) for x in (request.form.get("team_ids") or "").split(",") if x.strip().isdigit()]
+    if player_ids:
+        query = query.filter(Player.id.in_(player_ids))
+    elif team_ids:
+        query = query.filter(Player.team_id.in_(team_ids))
+    pool = query.all()
+    if len(pool) < k:
+        return jsonify({"error": "not enough players for %d teams" % k}), 400
+
+    teams = kway_balance(pool, k, deadline_ms=deadline_ms)
+    ratings = [sum((p.skill_rating or 0) for p in t) for t in teams]
+    return jsonify({
+        "teams": [
+            {"players": [{"id": p.id, "name": p.name} for p in t], "rating": r}
+            for t, r in zip(teams, ratings)
+        ],
+        "spread": max(ratings) - min(ratings),
+    })
+
 @app.route("/matches/<int:match_id>/toggle_lock", methods=["POST"])
 def match_toggle_lock(match_id):
     match = Match.query.get_or_404(match_id)
@@ -586,6 +869,7 @@ def match_toggle_lock(match_id):
             return jsonify({"error":"no assignments to lock"}), 400
         match.status = "locked"
     db.session.commit()
+    bus.publish(f"match:{match.id}:roster", {"type": "status", "status": match.status})
     return jsonify({"status":match.status})
 
 # manual assignment (AJAX POST) - assign/remove players to side
@@ -596,17 +880,55 @@ def match_assign_player(match_id):
         return jsonify({"error":"match locked"}), 400
     player_id = int(request.form.get("player_id"))
     side = request.form.get("team_side")  # 'A' or 'B', or 'remove'
+    before = roster_sides(match.id, [player_id])
     if request.form.get("remove") == "1" or side == "remove":
         MatchAssignment.query.filter_by(match_id=match.id, player_id=player_id).delete()
         db.session.commit()
+        publish_roster(match.id, before, {})
         return jsonify({"ok":True})
     # remove existing then add
     MatchAssignment.query.filter_by(match_id=match.id, player_id=player_id).delete()
     db.session.commit()
-    ma = MatchAssignment(match_id=match.id, player_id=player_id, team_side=side)
+    ma = MatchAssignment(match_id=match.id, player_id=player_id, team_side=side, pinned=True)
     db.session.add(ma); db.session.commit()
+    publish_roster(match.id, before, {player_id: side})
     return jsonify({"ok":True})
 
+# -------------------------
+# Live roster: per-match SSE channel carrying assignment diffs
+# -------------------------
+def roster_sides(match_id, player_ids=None):
+    """{player_id: side} for a match, optionally limited to some players."""
+    query = db.session.query(MatchAssignment.player_id, MatchAssignment.team_side).filter_by(match_id=match_id)
+    if player_ids is not None:
+        query = query.filter(MatchAssignment.player_id.in_(player_ids))
+    return dict(query.all())
+
+def roster_entries(sides):
+    if not sides:
+        return []
+    players = Player.query.filter(Player.id.in_(list(sides))).all()
+    return [{"player_id": p.id, "name": p.name, "skill_rating": p.skill_rating, "side": sides[p.id]}
+            for p in players]
+
+def publish_roster(match_id, before, after):
+    """Broadcast what changed between two {player_id: side} maps; call after the commit."""
+    changed = {pid: side for pid, side in after.items() if before.get(pid) != side}
+    removed = [pid for pid in before if pid not in after]
+    if changed or removed:
+        bus.publish(f"match:{match_id}:roster", {"type": "diff", "set": roster_entries(changed), "removed": removed})
+
+@app.route("/matches/<int:match_id>/roster/stream")
+def match_roster_stream(match_id):
+    """Server-Sent Events: a roster snapshot, then one diff per assignment change."""
+    match = Match.query.get_or_404(match_id)
+    if bus.subscriber_count() >= app.config.get("SSE_MAX_SUBSCRIBERS", 5000):
+        return jsonify({"error": "too many live connections"}), 503, {"Retry-After": "10"}
+    initial = {"type": "snapshot", "status": match.status, "assignments": roster_entries(roster_sides(match.id))}
+    sub = bus.subscribe(f"match:{match.id}:roster", resync={"type": "resync"})
+    return sse_response(sse_stream(sub, initial, event="roster",
+                                   keepalive=app.config.get("SSE_KEEPALIVE_S", 15)))
+
 # -------------------------
 # NEW: Admin dashboard, disputes, payouts, and dispute resolution
 # -------------------------
@@ -638,6 +960,14 @@ def admin_required_check(player_id=None):
             return True
     return False
 
+def admin_summary():
+    """Open disputes, pending matches and total stakes in a single SQL round trip."""
+    open_disputes = db.session.query(func.count(Dispute.id)).filter(Dispute.status == "open").scalar_subquery()
+    pending_matches = db.session.query(func.count(Match.id)).filter(Match.status == "pending").scalar_subquery()
+    total_stakes = db.session.query(func.coalesce(func.sum(Match.stakes), 0.0)).scalar_subquery()
+    row = db.session.query(open_disputes, pending_matches, total_stakes).one()
+    return {"open_disputes": row[0], "pending_matches": row[1], "total_stakes": row[2]}
+
 @app.route("/admin/dashboard")
 def admin_dashboard():
     # ✅ Allow local testing with ?admin=true
@@ -648,14 +978,23 @@ def admin_dashboard():
     if not session.get("admin"):
         return "Admin access required. For quick local testing add ?admin=true", 403
 
-    # ✅ Proceed to render dashboard
+    # ✅ Proceed to render dashboard: one page per tab, relationships loaded up front
+    per_page = app.config.get("ADMIN_PAGE_SIZE", 25)
+    args = request.args
     settings = get_admin_settings()
-    matches = Match.query.order_by(Match.created_at.desc()).all()
-    disputes = Dispute.query.order_by(Dispute.created_at.desc()).all()
-    players = Player.query.order_by(Player.name).all()
+    matches = Match.query.options(joinedload(Match.team1), joinedload(Match.team2)) \
+        .order_by(Match.created_at.desc(), Match.id.desc()) \
+        .paginate(page=args.get("matches_page", 1, type=int), per_page=per_page, error_out=False)
+    disputes = Dispute.query.options(joinedload(Dispute.match), joinedload(Dispute.filed_by)) \
+        .order_by(Dispute.created_at.desc(), Dispute.id.desc()) \
+        .paginate(page=args.get("disputes_page", 1, type=int), per_page=per_page, error_out=False)
+    players = Player.query.options(joinedload(Player.team)) \
+        .order_by(Player.name, Player.id) \
+        .paginate(page=args.get("players_page", 1, type=int), per_page=per_page, error_out=False)
     return render_template(
         "admin_dashboard.html",
         settings=settings,
+        summary=admin_summary(),
         matches=matches,
         disputes=disputes,
         players=players,
@@ -686,7 +1025,9 @@ def admin_add_stakes(match_id):
     amount = float(request.form.get("amount") or 0.0)
     match.stakes = (match.stakes or 0.0) + amount
     db.session.add(match)
+    ledger.post("stake", [(ledger.EXTERNAL, -amount), (ledger.match_account(match.id), amount)], match_id=match.id)
     db.session.commit()
+    publish_winnings(match.team1, match.team2)
     flash(f"Added {amount} stakes to match #{match.id}.", "success")
     return redirect(url_for("admin_dashboard"))
 
@@ -695,7 +1036,7 @@ def admin_approve_result(match_id):
     """
     Admin approves a match result. For MVP we expect a form field
     'winning_side' = 'A' or 'B'. When approved, we set match.status='completed'
-    and (optionally) compute mock payouts according to AdminSettings.
+    and settle the payout according to AdminSettings (app/settlement.py).
     """
     if not admin_required_check():
         return jsonify({"error":"admin required"}), 403
@@ -709,38 +1050,133 @@ def admin_approve_result(match_id):
         flash("Invalid winning side", "danger")
         return redirect(url_for("admin_dashboard"))
 
-    # Simple payout example: total_stake * multiplier -> distributed to winning team's players evenly.
-    total_stake = match.stakes or 0.0
-    payout_pool = total_stake * settings.payout_multiplier
-
-    # who is on side A/B? use MatchAssignment for this match
-    assignments = MatchAssignment.query.filter_by(match_id=match.id).all()
-    winners = [a.player for a in assignments if a.team_side == winning_side]
-    losers = [a.player for a in assignments if a.team_side != winning_side]
-
     # mark match as completed and save admin note in status (or extended storage)
     match.status = "completed"
-    db.session.add(match)
-    db.session.commit()
-
-    # Distribute payouts (this is placeholder behavior)
-    per_winner = (payout_pool / len(winners)) if winners else 0.0
-
-    # --- NEW: Update total winnings for the winning team ---
     if winning_side == "A":
-        winning_team = match.team1
+        match.winner_team_id = match.team1_id
     else:
-        winning_team = match.team2
+        match.winner_team_id = match.team2_id
+    record_result(match, winning_side)
+    db.session.add(match)
+    db.session.commit()
 
-    if winning_team:
-        winning_team.total_winnings = (winning_team.total_winnings or 0) + payout_pool
-        db.session.commit()
+    # Pay out: stakes * multiplier less APP_COMMISSION, split between the winners
+    # (a no-op if this match was already settled)
+    settled = settle([match.id])
+    per_winner = settled["paid"] / settled["winners"] if settled["winners"] else 0.0
+    publish_winnings(match.team1, match.team2)
 
-    # In real app you'd record transactions. For MVP, add flash messages:
     flash(f"Match #{match.id} approved. Winning side: {winning_side}. Each winner receives ~{per_winner:.2f}. Note: {note}", "success")
     return redirect(url_for("admin_dashboard"))
 
 
+@app.route("/admin/settle", methods=["POST"])
+def admin_settle():
+    """End-of-day settlement: pay out every completed match that has not been settled yet."""
+    if not admin_required_check():
+        return jsonify({"error":"admin required"}), 403
+    summary = settle()
+    if summary["teams"]:
+        publish_winnings(*Team.query.filter(Team.id.in_(summary["teams"])).all())
+    return jsonify({k: v for k, v in summary.items() if k != "teams"})
+
+@app.route("/admin/cache")
+def admin_cache_stats():
+    """Response cache hit/miss counters for this worker."""
+    if not admin_required_check():
+        return jsonify({"error":"admin required"}), 403
+    return jsonify(app.extensions["response_cache"].stats())
+
+@app.route("/admin/venues", methods=["POST"])
+def admin_add_venue():
+    if not admin_required_check():
+        return jsonify({"error":"admin required"}), 403
+    name = request.form.get("name")
+    latitude = request.form.get("latitude", type=float)
+    longitude = request.form.get("longitude", type=float)
+    if not name or latitude is None or longitude is None:
+        return jsonify({"error": "name, latitude and longitude are required"}), 400
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return jsonify({"error": "coordinates out of range"}), 400
+    v = Venue(name=name, city=request.form.get("city"), address=request.form.get("address"))
+    v.set_location(latitude, longitude)
+    db.session.add(v)
+    db.session.commit()
+    return jsonify({"id": v.id, "grid_cell": v.grid_cell})
+
+@app.route("/admin/schedules", methods=["POST"])
+def admin_create_schedule():
+    """
+    Generate a season. Form fields: sport, format ('round_robin' or
+    'elimination'), starts_at (ISO datetime), optional name, slot_minutes,
+    day_slots (slots per day), rounds (cap for big round robins), legs (2 for
+    home and away), team_ids / venue_ids (comma separated; default: every team
+    of the sport, no venues).
+    """
+    if not admin_required_check():
+        return jsonify({"error":"admin required"}), 403
+    form = request.form
+    sport = form.get("sport")
+    fmt = form.get("format") or "round_robin"
+    try:
+        starts_at = datetime.fromisoformat(form.get("starts_at") or "")
+        slot_minutes = int(form.get("slot_minutes") or 90)
+        day_slots = int(form.get("day_slots") or 8)
+        rounds = int(form["rounds"]) if form.get("rounds") else None
+        legs = int(form.get("legs") or 1)
+    except ValueError:
+        return jsonify({"error": "starts_at must be an ISO datetime; slot_minutes, day_slots, rounds, legs integers"}), 400
+    if not sport:
+        return jsonify({"error": "sport is required"}), 400
+    if slot_minutes < 1 or day_slots < 1 or legs not in (1, 2) or (rounds is not None and rounds < 1):
+        return jsonify({"error": "slot_minutes, day_slots and rounds must be positive; legs 1 or 2"}), 400
+
+    team_ids = [int(x) for x in (form.get("team_ids") or "").split(",") if x.strip().isdigit()]
+    venue_ids = [int(x) for x in (form.get("venue_ids") or "").split(",") if x.strip().isdigit()]
+    query = Team.query.filter(Team.id.in_(team_ids)) if team_ids else \
+        Team.query.filter(Team.sport == sport, Team.is_free_agent_pool.isnot(True), Team.name != "Free Agent Pool")
+    teams = query.order_by(Team.id).all()
+    venues = Venue.query.filter(Venue.id.in_(venue_ids)).order_by(Venue.id).all() if venue_ids else []
+
+    # the size a round robin would reach, checked before generating anything
+    n = len(teams)
+    full_rounds = (n - 1 if n % 2 == 0 else n) * legs
+    expected = n - 1 if fmt == "elimination" else min(rounds or full_rounds, full_rounds) * (n // 2)
+    if expected > app.config.get("SCHEDULE_MAX_MATCHES", 200000):
+        return jsonify({"error": "%d matches is too many; pass rounds to cap the round robin" % expected}), 400
+    try:
+        schedule = create_schedule(sport, fmt, teams, starts_at, venues=venues, slot_minutes=slot_minutes,
+                                   day_slots=day_slots, rounds=rounds, legs=legs, name=form.get("name"))
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    db.session.commit()
+    return jsonify({
+        "id": schedule.id, "format": schedule.format, "teams": schedule.team_count,
+        "matches": schedule.match_count, "starts_at": schedule.starts_at.isoformat(),
+        "ends_at": schedule.ends_at.isoformat(),
+    })
+
+@app.route("/api/schedules/<int:schedule_id>")
+def api_schedule(schedule_id):
+    """Fixtures of one round of a schedule (?round=N, default 1)."""
+    schedule = Schedule.query.get_or_404(schedule_id)
+    round_no = request.args.get("round", 1, type=int)
+    fixtures = Match.query.options(joinedload(Match.team1), joinedload(Match.team2), joinedload(Match.venue)) \
+        .filter_by(schedule_id=schedule.id, round_no=round_no).order_by(Match.date, Match.id).all()
+    return jsonify({
+        "id": schedule.id, "name": schedule.name, "sport": schedule.sport, "format": schedule.format,
+        "round": round_no, "matches": schedule.match_count,
+        "fixtures": [{
+            "match_id": m.id,
+            "date": m.date.isoformat() if m.date else None,
+            "venue": m.venue.name if m.venue else None,
+            "team1": m.team1.name if m.team1 else None,
+            "team2": m.team2.name if m.team2 else None,
+            "status": m.status,
+        } for m in fixtures],
+    })
+
 @app.route("/matches/<int:match_id>/dispute", methods=["GET","POST"])
 def submit_dispute(match_id):
     match = Match.query.get_or_404(match_id)
@@ -821,7 +1257,14 @@ def admin_login():
         username = request.form["username"]
         password = request.form["password"]
         admin = Admin.query.filter_by(username=username).first()
-        if admin and admin.check_password(password):
+        stored = admin.password_hash if admin else None
+        # don't hold the writer connection through the KDF
+        db.session.rollback()
+        ok, upgraded = passwords.check(stored, password)
+        if ok:
+            if upgraded:
+                admin.password_hash = upgraded
+                db.session.commit()
             session["admin_id"] = True
             flash("Logged in successfully.", "success")
             return redirect(url_for("admin_dashboard"))
@@ -837,91 +1280,6 @@ def admin_logout():
     return redirect(url_for("admin_login"))
 
 
-# --- Admin dashboard ---
-@app.route("/admin/dashboard")
-def admin_dashboard_view():
-    # ✅ Allow local testing with ?admin=true
-    if request.args.get("admin") == "true":
-        session["admin"] = True
-
-    # ✅ Check session state
-    if not session.get("admin"):
-        return "Admin access required. For quick local testing add ?admin=true", 403
-
-    # ✅ Proceed to render dashboard
-    settings = get_admin_settings()
-    matches = Match.query.order_by(Match.created_at.desc()).all()
-    disputes = Dispute.query.order_by(Dispute.created_at.desc()).all()
-    players = Player.query.order_by(Player.name).all()
-    return render_template(
-        "admin_dashboard.html",
-        settings=settings,
-        matches=matches,
-        disputes=disputes,
-        players=players,
-    )
-
-
-# ============================
-# 🛡️ Admin Authentication System
-# ============================
-
-from werkzeug.security import generate_password_hash, check_password_hash
-
-# Optional: only if not already imported
-from flask import session, redirect, url_for, flash, render_template, request
-
-# Create a single admin account (you can extend this to a DB later)
-ADMIN_USERNAME = "admin"
-ADMIN_PASSWORD_HASH = generate_password_hash("admin123")  # default password: admin123
-
-@app.route("/admin/login", methods=["GET", "POST"])
-def admin_login_page():
-    if request.method == "POST":
-        username = request.form["username"]
-        password = request.form["password"]
-
-        if username == ADMIN_USERNAME and check_password_hash(ADMIN_PASSWORD_HASH, password):
-            session["admin"] = True
-            flash("Welcome, Admin!", "success")
-            return redirect(url_for("admin_dashboard"))
-        else:
-            flash("Invalid credentials. Please try again.", "danger")
-            return redirect(url_for("admin_login"))
-
-    return render_template("admin_login.html")
-
-
-@app.route("/admin/logout")
-def admin_logout_page():
-    session.pop("admin", None)
-    flash("You have been logged out.", "info")
-    return redirect(url_for("admin_login"))
-
-
-@app.route("/admin/dashboard")
-def admin_dashboard_page():
-    # ✅ Allow local testing with ?admin=true
-    if request.args.get("admin") == "true":
-        session["admin"] = True
-
-    # ✅ Check session state
-    if not session.get("admin"):
-        return "Admin access required. For quick local testing add ?admin=true", 403
-
-    # ✅ Proceed to render dashboard
-    settings = get_admin_settings()
-    matches = Match.query.order_by(Match.created_at.desc()).all()
-    disputes = Dispute.query.order_by(Dispute.created_at.desc()).all()
-    players = Player.query.order_by(Player.name).all()
-    return render_template(
-        "admin_dashboard.html",
-        settings=settings,
-        matches=matches,
-        disputes=disputes,
-        players=players,
-    )
-
 def generate_ai_recommendations(player_stats):
     # Basic AI logic (you can expand this later)
     tips_pool = {
@@ -968,9 +1326,7 @@ def update_player_stats(player_id):
         stats.skill_rating = max(800, stats.skill_rating - 15)
 
     stats.matches_played += 1
-    history = json.loads(stats.progress_data) if stats.progress_data else []
-    history.append({"match": stats.matches_played, "rating": stats.skill_rating})
-    stats.progress_data = json.dumps(history)
+    append_rating_point(player_id, stats.skill_rating, sport=stats.sport, kind="skill")
     stats.last_updated = datetime.utcnow()
     db.session.commit()
 
@@ -994,40 +1350,31 @@ def view_player(player_id):
 
 @app.route("/player/<int:player_id>/stats")
 def player_stats(player_id):
-    from app.models import Player, Team, Match  # local import to avoid circulars
-    from app import db
-    from app.ai_recommendations import update_skill_rating, generate_ai_recommendations
-
-    player = Player.query.get(player_id)
+    team_id = db.session.query(Player.team_id).filter_by(id=player_id).scalar()
+    keys = [f"player:{player_id}", "player:*", "player_skill:*"]
+    if team_id:
+        keys += [f"team:{team_id}", "team:*"]
+    return cached_view("player_stats", keys, lambda: _render_player_stats(player_id))
+
+def _render_player_stats(player_id):
+    # routes.py redefines generate_ai_recommendations further up; use the module one
+    from app.ai_recommendations import generate_ai_recommendations
+
+    # read-only: counters and rating are maintained by stats.record_result
+    player = db.session.get(Player, player_id, options=[joinedload(Player.team)])
     if not player:
         abort(404, description="Player not found")
 
-    team = Team.query.get(player.team_id) if player.team_id else None
-
-    # --- Compute average skill ---
-    if hasattr(player, "skills") and player.skills:
-        skill_values = [s.value if hasattr(s, "value") else 0 for s in player.skills]
-        avg_skill = sum(skill_values) / len(skill_values) if skill_values else 0
-    else:
-        avg_skill = getattr(player, "skill_rating", 1000)
-
-    # --- Gather match data ---
-    matches_played = Match.query.filter(
-        (Match.team1_id == player.team_id) | (Match.team2_id == player.team_id)
-    ).all() if player.team_id else []
-
-    wins = sum(1 for m in matches_played if m.winner_team_id == player.team_id)
-    total_matches = len(matches_played)
+    team = player.team
+    total_matches = player.games_played or 0
+    wins = player.wins or 0
     win_rate = (wins / total_matches * 100) if total_matches else 0
-
-    # --- Update player’s skill dynamically ---
-    new_rating = update_skill_rating(player, wins, total_matches)
-    db.session.commit()
+    rating = round(player.rating if player.rating is not None else 1500)
 
     # --- Prepare stats object for AI ---
     stats_obj = {
         "win_rate": win_rate,
-        "skill_rating": new_rating
+        "skill_rating": rating
     }
 
     ai_tips = generate_ai_recommendations(
@@ -1043,18 +1390,111 @@ def player_stats(player_id):
         team=team,
         matches_played=total_matches,
         wins=wins,
-        avg_skill=new_rating,
+        avg_skill=rating,
         win_rate=win_rate,
         ai_tips=ai_tips
     )
 
 
+@app.route("/api/player/<int:player_id>/rating_history")
+def api_player_rating_history(player_id):
+    """
+    Rating points for charts: ?kind=rating (Elo, default) or skill, ?start=&end=
+    (seq range), ?max_points= (default 100).
+    """
+    kind = request.args.get("kind", "rating")
+    if kind not in ("rating", "skill"):
+        return jsonify({"error": "kind must be rating or skill"}), 400
+    max_points = min(max(request.args.get("max_points", 100, type=int), 2), 1000)
+    points = rating_history(
+        player_id,
+        start=request.args.get("start", type=int),
+        end=request.args.get("end", type=int),
+        max_points=max_points,
+        kind=kind,
+    )
+    return jsonify({"points": [{"seq": seq, "rating": round(rating, 1)} for seq, rating in points]})
+
+
+@app.cli.command("migrate-rating-history")
+def migrate_rating_history_command():
+    """Move legacy PlayerStats.progress_data blobs into the rating_history table."""
+    print(f"Moved {migrate_progress_blobs()} rating points.")
+
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create tables, apply migrations and seed the Free Agent Pool (run once per deploy)."""
+    from app import setup_database
+    applied = setup_database()
+    print(f"Database ready; applied migrations: {applied}" if applied else "Database ready.")
+
+
+@app.cli.command("db-upgrade")
+def db_upgrade_command():
+    """Apply pending schema migrations (app/migrations.py)."""
+    applied = upgrade()
+    print(f"Applied migrations: {applied}" if applied else "Schema is up to date.")
+
+
+@app.cli.command("check-indexes")
+def check_indexes_command():
+    """Fail if any hot route query is planned as a full table scan."""
+    failures = check_query_plans()
+    for label, plan in failures:
+        print(f"FULL SCAN: {label}: {'; '.join(plan)}")
+    if failures:
+        raise SystemExit(1)
+    print("All hot queries use an index.")
+
+
+@app.cli.command("ledger-open")
+def ledger_open_command():
+    """Post opening ledger journals for winnings and stakes recorded before the ledger."""
+    print(f"Opened {ledger.open_balances()} accounts.")
+
+
+@app.cli.command("ledger-snapshot")
+def ledger_snapshot_command():
+    """Snapshot every ledger account with entries since its last snapshot."""
+    print(f"Snapshotted {ledger.snapshot_all()} accounts.")
+
+
+@app.cli.command("settle")
+def settle_command():
+    """Settle every completed-but-unsettled match (safe to re-run)."""
+    summary = settle()
+    print(f"Settled {summary['matches']} matches: paid {summary['paid']:.2f} "
+          f"to {summary['winners']} winners, commission {summary['commission']:.2f}.")
+
+
+@app.cli.command("payments-recover")
+def payments_recover_command():
+    """Re-queue stake payments left in flight by a restart and run them to an end state."""
+    queue = payments.queue_for(app)
+    print(f"Re-queued {queue.recover()} payments.")
+    db.session.remove()
+    queue.wait_idle()
+    print(", ".join(f"{k} {v}" for k, v in queue.stats.items()))
+
+
+@app.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    """Recompute team/player win-loss counters from completed matches."""
+    print(f"Recounted {rebuild_aggregates()} completed matches.")
+
+
 
 @app.route("/dashboard")
 def dashboard():
-    current_team = ...  # however you determine the logged-in user’s team
+    current_team = Team.query.get(session["team_id"]) if session.get("team_id") else None
     opponents = recommend_opponents(current_team)
-    suggested_venues = recommend_venues(current_team)
+    # ?match_id=N suggests venues between the two teams of that match
+    match_id = request.args.get("match_id", type=int)
+    if match_id:
+        suggested_venues = recommend_venues_for_match(Match.query.get_or_404(match_id))
+    else:
+        suggested_venues = recommend_venues(current_team)
     return render_template(
         "dashboard.html",
         current_team=current_team,
@@ -1063,32 +1503,45 @@ def dashboard():
     )
 
 
+def record_match_result(match_id, winning_side):
+    """Background half of admin_set_match_result: counters, ratings, bracket advance."""
+    match = db.session.get(Match, match_id)
+    if match is not None and record_result(match, winning_side):
+        db.session.commit()
+
+
 @app.route("/admin/match/<int:match_id>/set_result", methods=["POST"])
 def admin_set_match_result(match_id):
     match = Match.query.get_or_404(match_id)
-    winner_team_id = request.form.get("winner_team_id")
+    winner_team_id = request.form.get("winner_team_id", type=int)
 
-    if not winner_team_id:
+    if winner_team_id is None:
         flash("No team selected as winner", "danger")
         return redirect(url_for("admin_dashboard"))
 
-    winner_team_id = int(winner_team_id)
-    winner_team = Team.query.get(winner_team_id)
-    loser_team = match.team1 if match.team2_id == winner_team_id else match.team2
+    # validated before anything is written or queued: 0 is a draw, any
+    # other id must be one of the two teams
+    side = side_of(match, winner_team_id)
+    if winner_team_id != 0 and side is None:
+        flash("The winner must be one of the two teams.", "danger")
+        return redirect(url_for("admin_dashboard"))
 
-    # Update match result
     match.status = "completed"
-    match.winner_team_id = winner_team_id
-
-    # Update team stats
-    winner_team.matches_played = (winner_team.matches_played or 0) + 1
-    winner_team.matches_won = (winner_team.matches_won or 0) + 1
+    if side is None:
+        # a draw: no counters, ratings or settlement
+        match.winner_team_id = None
+        db.session.commit()
+        flash("Match result updated: draw.", "success")
+        return redirect(url_for("admin_dashboard"))
 
-    loser_team.matches_played = (loser_team.matches_played or 0) + 1
-    loser_team.matches_lost = (loser_team.matches_lost or 0) + 1
+    # team/player counters and ratings are recorded once, in the background
+    # after the commit
+    match.winner_team_id = winner_team_id
+    winner_name = (match.team1 if side == "A" else match.team2).name
+    tasks.after_commit(record_match_result, match.id, side, key=f"result:{match.id}")
 
     db.session.commit()
-    flash(f"Match result updated: {winner_team.name} won!", "success")
+    flash(f"Match result updated: {winner_name} won!", "success")
     return redirect(url_for("admin_dashboard"))
 
 
@@ -1113,11 +1566,74 @@ def admin_update_player_stats(player_id):
 
     return render_template("admin_update_player_stats.html", player=player, stats=stats)
 
+# -------------------------
+# Team winnings: snapshot + SSE push
+# -------------------------
+def team_winnings(team):
+    """Winnings payload shared by the JSON endpoint and the change bus."""
+    open_stakes = db.session.query(func.coalesce(func.sum(Match.stakes), 0.0)).filter(
+        db.or_(Match.team1_id == team.id, Match.team2_id == team.id),
+        Match.status != "completed",
+    ).scalar()
+    return {
+        "team_id": team.id,
+        "total_winnings": ledger.team_winnings_cents(team.id) / 100.0,
+        "open_stakes": round(open_stakes or 0, 2),
+    }
+
+def publish_winnings(*teams):
+    """Push fresh winnings to SSE subscribers; call after the commit."""
+    for team in teams:
+        if team is not None and bus.subscriber_count(f"team:{team.id}:winnings"):
+            bus.publish(f"team:{team.id}:winnings", team_winnings(team))
+
 @app.route("/api/team/<int:team_id>/winnings")
 def api_get_team_winnings(team_id):
-    """Return the total winnings for a team (used by team_detail auto-refresh)."""
+    """Return the total winnings for a team (snapshot / fallback for the stream)."""
+    return cached_view("team_winnings", [f"team:{team_id}", "team:*", "match:*"],
+                       lambda: jsonify(team_winnings(Team.query.get_or_404(team_id))))
+
+def _balance_json(account):
+    """Balance now, or at ?at=<ISO datetime>, as JSON."""
+    at = request.args.get("at")
+    try:
+        at = datetime.fromisoformat(at) if at else None
+    except ValueError:
+        return jsonify({"error": "at must be an ISO datetime"}), 400
+    cents, _ = ledger.balance_cents(account, at)
+    return jsonify({"account": account, "balance": cents / 100.0, "at": at.isoformat() if at else None})
+
+@app.route("/api/team/<int:team_id>/balance")
+def api_team_balance(team_id):
+    Team.query.get_or_404(team_id)
+    return _balance_json(ledger.team_account(team_id))
+
+@app.route("/api/player/<int:player_id>/balance")
+def api_player_balance(player_id):
+    Player.query.get_or_404(player_id)
+    return _balance_json(ledger.player_account(player_id))
+
+@app.route("/api/team/<int:team_id>/ledger")
+def api_team_ledger(team_id):
+    """Newest-first ledger entries of a team (?before=<entry id> for the next page)."""
+    Team.query.get_or_404(team_id)
+    rows = ledger.entries(ledger.team_account(team_id), before_id=request.args.get("before", type=int))
+    return jsonify({"entries": [
+        {"id": e.id, "transaction_id": e.transaction_id, "amount": e.amount_cents / 100.0,
+         "match_id": e.match_id, "created_at": e.created_at.isoformat()}
+        for e in rows
+    ]})
+
+@app.route("/api/team/<int:team_id>/winnings/stream")
+def api_stream_team_winnings(team_id):
+    """Server-Sent Events: current winnings, then one message per change."""
     team = Team.query.get_or_404(team_id)
-    return jsonify({"total_winnings": round(team.total_winnings or 0, 2)})
+    if bus.subscriber_count() >= app.config.get("SSE_MAX_SUBSCRIBERS", 5000):
+        return jsonify({"error": "too many live connections"}), 503, {"Retry-After": "10"}
+    initial = team_winnings(team)
+    sub = bus.subscribe(f"team:{team_id}:winnings")
+    return sse_response(sse_stream(sub, initial, event="winnings",
+                                   keepalive=app.config.get("SSE_KEEPALIVE_S", 15)))
 
 @app.route("/register", methods=["GET", "POST"])
 def register():
@@ -1130,6 +1646,8 @@ def register():
         if Team.query.filter_by(email=email).first():
             flash("Email already in use.", "danger")
             return redirect(url_for("register"))
+        # don't hold the writer connection through the KDF in set_password
+        db.session.rollback()
 
         team = Team(
             name=name,
@@ -1137,14 +1655,15 @@ def register():
             color=request.form.get("color"),
             skill=request.form.get("skill", 50),
             sport=request.form.get("sport"),
+            latitude=request.form.get("latitude", type=float),
+            longitude=request.form.get("longitude", type=float),
         )
 
         team.set_password(password)
 
         db.session.add(team)
         db.session.commit()
-
-        
+        opponent_index.update(team)
 
         flash("Team registered successfully! Please log in.", "success")
         return redirect(url_for("login"))
@@ -1159,14 +1678,21 @@ def login():
         password = request.form["password"]
 
         team = Team.query.filter_by(email=email).first()
+        team_id, stored = (team.id, team.password_hash) if team else (None, None)
+        # don't hold the writer connection through the KDF
+        db.session.rollback()
 
-        if not team or not team.check_password(password):
+        ok, upgraded = passwords.check(stored, password)
+        if not ok:
             flash("Invalid email or password.", "danger")
             return redirect(url_for("login"))
+        if upgraded:
+            team.password_hash = upgraded
+            db.session.commit()
 
-        session["team_id"] = team.id
+        session["team_id"] = team_id
         flash("Logged in successfully!", "success")
-        return redirect(url_for("team_detail", team_id=team.id))
+        return redirect(url_for("team_detail", team_id=team_id))
 
     return render_template("login.html")
 
@@ -1187,19 +1713,18 @@ def add_free_agent():
     pool = Team.query.filter_by(is_free_agent_pool=True).first_or_404()
 
     name = request.form["name"]
-    sport = request.form.get("sport", "Unknown")
     role = request.form.get("role", None)
-    skill = request.form.get("skill", 50)
+    skill = int(request.form.get("skill") or 50)
 
     player = Player(
         name=name,
         role=role,
-        sport=sport,
         skill_rating=skill,
         team_id=pool.id
     )
 
     db.session.add(player)
+    roster_changed(pool, rating_sum=counted_rating(skill), players=1)
     db.session.commit()
 
     flash("You have been added to the Free Agent Pool!", "success")
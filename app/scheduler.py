@@ -0,0 +1,206 @@
+# scheduler.py
+"""
+Season fixtures: full round robins and rating-seeded elimination brackets.
+
+Pairings are built round by round so no team appears twice in a round; each
+round then fills consecutive time slots, one match per venue per slot, so
+neither teams nor venues are ever double-booked. The Match rows are written
+with Core executemany INSERTs (no per-row ORM bookkeeping); the caller
+commits.
+"""
+from datetime import datetime, timedelta
+from app import db
+from app.models import Match, Schedule
+
+
+# -------------------------
+# Pairings
+# -------------------------
+def round_robin_rounds(team_ids, rounds=None, legs=1):
+    """
+    Circle method: every team meets every other once per leg. Returns a list
+    of rounds, each a list of (home, away); an odd field gives one team a bye
+    per round. `rounds` caps how many rounds are produced.
+    """
+    ids = list(team_ids)
+    if len(ids) % 2:
+        ids.append(None)
+    n = len(ids)
+    fixed, rest = ids[0], ids[1:]
+    single = []
+    # a capped first leg stops early instead of building every round
+    for r in range(min(n - 1, rounds or n)):
+        line = [fixed] + rest
+        pairs = []
+        for i in range(n // 2):
+            a, b = line[i], line[n - 1 - i]
+            if a is None or b is None:
+                continue
+            # the fixed team alternates home/away; the rotation balances the rest
+            pairs.append((b, a) if i == 0 and r % 2 else (a, b))
+        single.append(pairs)
+        rest = rest[-1:] + rest[:-1]
+    out = list(single)
+    if legs > 1 and len(single) == n - 1:
+        out += [[(b, a) for a, b in pairs] for pairs in single]
+    return out[:rounds] if rounds else out
+
+
+def bracket_order(size):
+    """Seed at each bracket position so 1 and 2 can only meet in the final: 1, 8, 4, 5, 2, 7, 3, 6."""
+    order = [1]
+    while len(order) < size:
+        m = len(order) * 2
+        order = [x for s in order for x in (s, m + 1 - s)]
+    return order
+
+
+def elimination_rounds(seeded_ids):
+    """
+    Single-elimination bracket over teams listed best seed first. Returns a
+    list of rounds; each node is [team1, team2] where None is a slot still to
+    be decided. Node i of a round feeds node i // 2 of the next as slot
+    i % 2 + 1. Top seeds get the byes: their first-round node holds None on
+    the other side and is not played (see _is_bye).
+    """
+    n = len(seeded_ids)
+    size = 1 << (n - 1).bit_length()
+    seat = [seeded_ids[s - 1] if s <= n else None for s in bracket_order(size)]
+    rounds = [[[seat[2 * i], seat[2 * i + 1]] for i in range(size // 2)]]
+    while len(rounds[-1]) > 1:
+        nodes = [[None, None] for _ in range(len(rounds[-1]) // 2)]
+        if len(rounds) == 1:
+            for i, node in enumerate(rounds[0]):
+                if _is_bye(node):
+                    nodes[i // 2][i % 2] = node[0] if node[0] is not None else node[1]
+        rounds.append(nodes)
+    return rounds
+
+
+def _is_bye(node):
+    return (node[0] is None) != (node[1] is None)
+
+
+# -------------------------
+# Slotting
+# -------------------------
+def slot_times(starts_at, slot_minutes, day_slots):
+    """Kickoff time of slot k: day_slots slots a day, back to back from the start time."""
+    def at(k):
+        day, slot = divmod(k, day_slots)
+        return starts_at + timedelta(days=day, minutes=slot * slot_minutes)
+    return at
+
+
+def assign_slots(rounds, per_slot, at):
+    """
+    (kickoff, venue index) for every match of every round. Each round starts
+    on a fresh slot and takes ceil(len(round) / per_slot) of them, so a team
+    plays at most once per slot and each venue hosts one match per slot.
+    Returns (placements per round, slots used).
+    """
+    placed, k = [], 0
+    for matches in rounds:
+        row = []
+        for i in range(len(matches)):
+            slot, venue = divmod(i, per_slot)
+            row.append((at(k + slot), venue))
+        placed.append(row)
+        k += -(-len(matches) // per_slot) if matches else 0
+    return placed, k
+
+
+# -------------------------
+# Persist
+# -------------------------
+def _row_maker(schedule, venues):
+    """Row dicts for the bulk INSERT; ORM attributes are read once, not per match."""
+    base = {"sport": schedule.sport, "schedule_id": schedule.id, "stakes": 0.0,
+            "created_at": schedule.created_at, "venue_id": None, "location": None}
+    places = [(v.id, v.name) for v in venues]
+
+    def row(round_no, team1, team2, kickoff, venue_index, status="pending"):
+        r = dict(base, round_no=round_no, team1_id=team1, team2_id=team2, date=kickoff, status=status)
+        if places:
+            r["venue_id"], r["location"] = places[venue_index]
+        return r
+    return row
+
+
+def seed_key(team):
+    return (-(team.rating or 0), -(team.skill_rating or 0), team.id)
+
+
+def create_schedule(sport, fmt, teams, starts_at, venues=(), slot_minutes=90, day_slots=8,
+                    rounds=None, legs=1, name=None):
+    """
+    Generate and bulk-insert a season for `teams`. fmt is "round_robin" or
+    "elimination" (seeded by rating). With venues, each slot holds one match
+    per venue; without, a whole round shares a slot. Returns the Schedule.
+    """
+    if len(teams) < 2:
+        raise ValueError("a schedule needs at least two teams")
+    if fmt not in ("round_robin", "elimination"):
+        raise ValueError("format must be 'round_robin' or 'elimination'")
+    venues = list(venues)
+    at = slot_times(starts_at, slot_minutes, day_slots)
+    schedule = Schedule(name=name, sport=sport, format=fmt, starts_at=starts_at, slot_minutes=slot_minutes,
+                        team_count=len(teams), created_at=datetime.utcnow())
+    db.session.add(schedule)
+    db.session.flush()
+    row = _row_maker(schedule, venues)
+
+    if fmt == "round_robin":
+        pairings = round_robin_rounds([t.id for t in teams], rounds=rounds, legs=legs)
+        per_slot = len(venues) or max(len(r) for r in pairings)
+        placed, used = assign_slots(pairings, per_slot, at)
+        values = [
+            row(r + 1, a, b, kickoff, v)
+            for r, (pairs, slots) in enumerate(zip(pairings, placed))
+            for (a, b), (kickoff, v) in zip(pairs, slots)
+        ]
+        if values:
+            db.session.execute(Match.__table__.insert(), values)
+        schedule.match_count = len(values)
+    else:
+        bracket = elimination_rounds([t.id for t in sorted(teams, key=seed_key)])
+        # first-round byes are not played; every later node is a real match
+        played = [[i for i, node in enumerate(bracket[0]) if not _is_bye(node)]]
+        played += [list(range(len(nodes))) for nodes in bracket[1:]]
+        per_slot = len(venues) or max(len(p) for p in played)
+        placed, used = assign_slots(played, per_slot, at)
+        # insert from the final backwards so every row knows its next match id
+        next_ids, total = None, 0
+        for r in range(len(bracket) - 1, -1, -1):
+            nodes = bracket[r]
+            values = []
+            for i, (kickoff, v) in zip(played[r], placed[r]):
+                team1, team2 = nodes[i]
+                values.append(dict(
+                    row(r + 1, team1, team2, kickoff, v, status="pending" if team1 and team2 else "awaiting"),
+                    next_match_id=next_ids[i // 2] if next_ids else None,
+                    next_slot=i % 2 + 1 if next_ids else None,
+                ))
+            ids = db.session.execute(
+                Match.__table__.insert().returning(Match.__table__.c.id, sort_by_parameter_order=True), values
+            ).scalars().all()
+            next_ids = dict(zip(played[r], ids))
+            total += len(values)
+        schedule.match_count = total
+    schedule.ends_at = at(used - 1) + timedelta(minutes=slot_minutes) if used else starts_at
+    return schedule
+
+
+def advance_winner(match, winning_side):
+    """Move a bracket winner into its next match; the caller commits."""
+    if not match.next_match_id:
+        return None
+    nxt = db.session.get(Match, match.next_match_id)
+    winner = match.team1_id if winning_side == "A" else match.team2_id
+    if match.next_slot == 1:
+        nxt.team1_id = winner
+    else:
+        nxt.team2_id = winner
+    if nxt.team1_id and nxt.team2_id and nxt.status == "awaiting":
+        nxt.status = "pending"
+    return nxt
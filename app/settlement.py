@@ -0,0 +1,164 @@
+# settlement.py
+"""
+Batch settlement of completed matches.
+
+A completed match won by one of its two teams and with no settled_at is
+paid out like this (draws and results naming any other team are never
+settled; their stakes stay in the pot):
+payout pool = stakes * AdminSettings.payout_multiplier, APP_COMMISSION of
+the pool goes to the house, and the rest is split evenly, to the cent,
+between the winning side's players (the winning team's account if nobody
+was assigned). The stake pot is emptied and the house covers or keeps the
+difference, so every journal balances.
+
+Amounts for a whole batch are computed as numpy arrays in one pass. Each
+match gets one Transaction keyed "settle:<match_id>", inserted with ON
+CONFLICT DO NOTHING, and only the rows that actually went in get ledger
+legs. Running it twice, or from two workers at once, pays nobody twice.
+"""
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.ledger import HOUSE, match_account, player_account, team_account, refresh_snapshots
+from app.models import AdminSettings, LedgerEntry, Match, MatchAssignment, Player, Transaction
+
+SETTLE_BATCH = 2000
+
+
+def _insert_ignore(table):
+    """INSERT .. ON CONFLICT DO NOTHING for the configured backend."""
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table).on_conflict_do_nothing()
+
+
+def unsettled(match_ids=None, limit=SETTLE_BATCH):
+    query = db.session.query(Match.id, Match.team1_id, Match.team2_id, Match.winner_team_id, Match.stakes) \
+        .filter(Match.status == "completed", Match.settled_at.is_(None),
+                Match.winner_team_id.in_([Match.team1_id, Match.team2_id]))
+    if match_ids is not None:
+        query = query.filter(Match.id.in_(match_ids))
+    return query.order_by(Match.id).limit(limit).all()
+
+
+def winners_of(matches):
+    """{match_id: [player_id]} for the winning side: assignments, else the winning team's roster."""
+    ids = [m.id for m in matches]
+    side_of = {m.id: "A" if m.winner_team_id == m.team1_id else "B" for m in matches}
+    winners = defaultdict(list)
+    rows = db.session.query(MatchAssignment.match_id, MatchAssignment.player_id, MatchAssignment.team_side) \
+        .filter(MatchAssignment.match_id.in_(ids)).order_by(MatchAssignment.id)
+    for match_id, player_id, side in rows:
+        if side == side_of[match_id]:
+            winners[match_id].append(player_id)
+    need = {m.winner_team_id for m in matches if not winners[m.id]}
+    roster = defaultdict(list)
+    if need:
+        for player_id, team_id in db.session.query(Player.id, Player.team_id) \
+                .filter(Player.team_id.in_(need)).order_by(Player.id):
+            roster[team_id].append(player_id)
+    for m in matches:
+        if not winners[m.id]:
+            winners[m.id] = roster.get(m.winner_team_id, [])
+    return winners
+
+
+def compute(matches, winners, multiplier, commission_rate):
+    """
+    Vectorised payout maths for a batch, all in integer cents. Returns
+    per-match arrays (pot, pool, commission, net, house) and, per winner in
+    match order, the (match index, share) arrays.
+    """
+    import numpy as np
+    pot = np.rint(np.array([m.stakes or 0.0 for m in matches]) * 100).astype(np.int64)
+    pool = np.rint(pot * multiplier).astype(np.int64)
+    commission = np.rint(pool * commission_rate).astype(np.int64)
+    net = pool - commission
+    house = pot - net
+    counts = np.array([max(len(winners[m.id]), 1) for m in matches], dtype=np.int64)
+    base, rem = np.divmod(net, counts)
+    owner = np.repeat(np.arange(len(matches)), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    # spread the leftover cents over the first `rem` winners of each match
+    shares = base[owner] + ((np.arange(len(owner)) - first) < rem[owner])
+    return {"pot": pot, "pool": pool, "commission": commission, "net": net, "house": house,
+            "owner": owner, "shares": shares}
+
+
+def settle(match_ids=None, batch=SETTLE_BATCH):
+    """
+    Settle every completed-but-unsettled match (or just `match_ids`), one
+    committed batch at a time. Returns a summary with the winning team ids
+    so callers can push fresh winnings.
+    """
+    settings = AdminSettings.query.first()
+    multiplier = settings.payout_multiplier if settings else 1.9
+    rate = current_app.config.get("APP_COMMISSION", 0.05)
+    summary = {"matches": 0, "winners": 0, "entries": 0, "paid": 0.0, "commission": 0.0, "teams": set()}
+    done = set()
+    while True:
+        matches = [m for m in unsettled(match_ids, batch) if m.id not in done]
+        if not matches:
+            break
+        done.update(m.id for m in matches)
+        _settle_batch(matches, multiplier, rate, summary)
+        if len(matches) < batch:
+            break
+    summary["teams"] = sorted(summary["teams"])
+    return summary
+
+
+def _settle_batch(matches, multiplier, rate, summary):
+    now = datetime.utcnow()
+    winners = winners_of(matches)
+    calc = compute(matches, winners, multiplier, rate)
+    headers = [{
+        "match_id": m.id, "type": "settlement", "status": "completed", "created_at": now,
+        "amount": int(calc["net"][i]) / 100.0, "idempotency_key": f"settle:{m.id}",
+    } for i, m in enumerate(matches)]
+    inserted = db.session.execute(
+        _insert_ignore(Transaction.__table__).returning(Transaction.__table__.c.id, Transaction.__table__.c.match_id),
+        headers,
+    ).all()
+    tx_of = {match_id: tx_id for tx_id, match_id in inserted}
+
+    entries, team_net, accounts = [], defaultdict(int), set()
+
+    def leg(tx_id, match_id, account, cents):
+        if cents:
+            entries.append({"transaction_id": tx_id, "account": account, "amount_cents": int(cents),
+                            "match_id": match_id, "created_at": now})
+            accounts.add(account)
+
+    shares = calc["shares"]
+    start = 0
+    for i, m in enumerate(matches):
+        count = max(len(winners[m.id]), 1)
+        tx_id = tx_of.get(m.id)
+        if tx_id is not None:
+            leg(tx_id, m.id, match_account(m.id), -calc["pot"][i])
+            leg(tx_id, m.id, HOUSE, calc["house"][i])
+            payees = [player_account(p) for p in winners[m.id]] or [team_account(m.winner_team_id)]
+            for account, cents in zip(payees, shares[start:start + count]):
+                leg(tx_id, m.id, account, cents)
+            team_net[m.winner_team_id] += int(calc["net"][i])
+            summary["commission"] += int(calc["commission"][i]) / 100.0
+            summary["paid"] += int(calc["net"][i]) / 100.0
+            summary["matches"] += 1
+            summary["winners"] += len(payees)
+        start += count
+    if entries:
+        db.session.execute(LedgerEntry.__table__.insert(), entries)
+    summary["entries"] += len(entries)
+    if tx_of:
+        # team winnings are read from the ledger, so their pages go stale with the match
+        touches = [f"match:{m.id}" for m in matches if m.id in tx_of] + ["matches"] + \
+            [f"team:{tid}" for tid in team_net] + ["teams"]
+        db.session.execute(Match.__table__.update().where(Match.__table__.c.id.in_(list(tx_of))).values(settled_at=now),
+                           execution_options={"touches": touches})
+    summary["teams"].update(team_net)
+    refresh_snapshots(accounts)
+    db.session.commit()
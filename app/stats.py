@@ -0,0 +1,148 @@
+# stats.py
+"""
+Materialized win/loss aggregates and the append-only rating history.
+
+Team.matches_played / matches_won / matches_lost and Player.games_played /
+wins / losses are bumped once when a result is recorded, so read pages never
+have to count matches themselves. Every rating change appends one
+RatingHistory row.
+"""
+import json
+from sqlalchemy import func
+from app import db
+from app.models import Match, MatchAssignment, Player, PlayerStats, RatingHistory, Team
+from app.ratings import apply_match_result
+from app.scheduler import advance_winner
+
+
+def match_participants(match):
+    """
+    Players per side: the match assignments, or the team roster for a side
+    nobody was assigned to.
+    """
+    sides = {"A": [], "B": []}
+    for a in MatchAssignment.query.filter_by(match_id=match.id).all():
+        if a.team_side in sides and a.player:
+            sides[a.team_side].append(a.player)
+    for side, team_id in (("A", match.team1_id), ("B", match.team2_id)):
+        if not sides[side] and team_id:
+            sides[side] = Player.query.filter_by(team_id=team_id).all()
+    return sides
+
+
+def _count_result(match, winning_side, sides):
+    teams = {"A": match.team1, "B": match.team2}
+    for side in ("A", "B"):
+        won = side == winning_side
+        team = teams[side]
+        if team:
+            team.matches_played = (team.matches_played or 0) + 1
+            if won:
+                team.matches_won = (team.matches_won or 0) + 1
+            else:
+                team.matches_lost = (team.matches_lost or 0) + 1
+        for p in sides[side]:
+            p.games_played = (p.games_played or 0) + 1
+            if won:
+                p.wins = (p.wins or 0) + 1
+            else:
+                p.losses = (p.losses or 0) + 1
+
+
+def side_of(match, team_id):
+    """'A' for team1, 'B' for team2, None for anything else (a draw, a bad id)."""
+    if team_id is not None and team_id == match.team1_id:
+        return "A"
+    if team_id is not None and team_id == match.team2_id:
+        return "B"
+    return None
+
+
+def record_result(match, winning_side):
+    """
+    Record a completed match once: win/loss counters for both teams and all
+    participants, then ratings; bracket winners move on to their next match.
+    winning_side is 'A' (team1) or 'B' (team2). Returns False if the result
+    was already recorded. The caller commits.
+    """
+    if match.result_recorded:
+        return False
+    sides = match_participants(match)
+    _count_result(match, winning_side, sides)
+    apply_match_result(match, winning_side, sides)
+    for p in sides["A"] + sides["B"]:
+        append_rating_point(p.id, p.rating, sport=match.sport, match_id=match.id)
+    advance_winner(match, winning_side)
+    match.result_recorded = True
+    return True
+
+
+def rebuild_aggregates():
+    """
+    Recompute every counter from completed matches (one-off backfill for
+    databases that predate the aggregates). Ratings are left untouched.
+    """
+    Team.query.update({"matches_played": 0, "matches_won": 0, "matches_lost": 0})
+    Player.query.update({"games_played": 0, "wins": 0, "losses": 0})
+    done = Match.query.filter(Match.status == "completed", Match.winner_team_id.isnot(None)).all()
+    for match in done:
+        side = "A" if match.winner_team_id == match.team1_id else "B"
+        _count_result(match, side, match_participants(match))
+        match.result_recorded = True
+    db.session.commit()
+    return len(done)
+
+
+def append_rating_point(player_id, rating, sport=None, match_id=None, kind="rating"):
+    """Append one point to a player's `kind` series (an index seek plus one insert)."""
+    last = db.session.query(func.max(RatingHistory.seq)).filter(
+        RatingHistory.player_id == player_id, RatingHistory.kind == kind).scalar()
+    point = RatingHistory(player_id=player_id, kind=kind, seq=(last or 0) + 1, rating=rating, sport=sport,
+                          match_id=match_id)
+    db.session.add(point)
+    return point
+
+
+def rating_history(player_id, start=None, end=None, max_points=100, kind="rating"):
+    """
+    (seq, rating) pairs of one series for seq in [start, end], thinned to at
+    most max_points by keeping every n-th point (plus the last one) in SQL.
+    """
+    q = db.session.query(RatingHistory.seq, RatingHistory.rating).filter(
+        RatingHistory.player_id == player_id, RatingHistory.kind == kind)
+    if start is not None:
+        q = q.filter(RatingHistory.seq >= start)
+    if end is not None:
+        q = q.filter(RatingHistory.seq <= end)
+    bounds = q.with_entities(func.min(RatingHistory.seq), func.max(RatingHistory.seq)).one()
+    if bounds[0] is None:
+        return []
+    first, last = bounds
+    step = max(1, -(-(last - first + 1) // max(1, max_points)))
+    if step > 1:
+        q = q.filter(db.or_((RatingHistory.seq - first) % step == 0, RatingHistory.seq == last))
+    return [(seq, rating) for seq, rating in q.order_by(RatingHistory.seq).all()]
+
+
+def migrate_progress_blobs():
+    """
+    One-time move of PlayerStats.progress_data JSON into RatingHistory.
+    Blobs are cleared once copied, so running it again is a no-op.
+    """
+    moved = 0
+    for stats in PlayerStats.query.filter(PlayerStats.progress_data.isnot(None)).all():
+        try:
+            points = json.loads(stats.progress_data) or []
+        except ValueError:
+            points = []
+        # the blobs tracked PlayerStats.skill_rating
+        last = db.session.query(func.max(RatingHistory.seq)).filter(
+            RatingHistory.player_id == stats.player_id, RatingHistory.kind == "skill").scalar() or 0
+        for point in points:
+            last += 1
+            db.session.add(RatingHistory(player_id=stats.player_id, kind="skill", seq=last,
+                                         rating=point.get("rating", 0), sport=stats.sport))
+            moved += 1
+        stats.progress_data = None
+    db.session.commit()
+    return moved
@@ -0,0 +1,88 @@
+# storage.py
+"""
+SQLite storage profile.
+
+- every connection gets the SQLITE_PRAGMAS (WAL, synchronous, cache, mmap,
+  busy timeout) when it is opened
+- writes go through the default engine, kept to a single pooled connection
+  per process so writers queue in-process instead of fighting over the file
+  lock
+- GET/HEAD requests read through a separate "reader" bind whose connections
+  are query_only; WAL lets them run alongside the writer
+
+Only file-backed SQLite URLs get the reader bind; anything else is left as is.
+"""
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+READER_BIND = "reader"
+READ_METHODS = ("GET", "HEAD")
+
+
+def _is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def configure_storage(app):
+    """Fill in engine options and the reader bind. Call before db.init_app."""
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI")
+    if not uri or not _is_sqlite_file(uri):
+        return
+    timeout = app.config["SQLITE_PRAGMAS"].get("busy_timeout", 5000) / 1000.0
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {}).update({
+        "pool_size": app.config["SQLITE_WRITER_POOL_SIZE"],
+        "max_overflow": 0,
+        "connect_args": {"timeout": timeout},
+    })
+    if app.config.get("SQLITE_READ_ENGINE"):
+        app.config.setdefault("SQLALCHEMY_BINDS", {})[READER_BIND] = {
+            "url": uri,
+            "pool_size": app.config["SQLITE_READ_POOL_SIZE"],
+            "max_overflow": app.config["SQLITE_READ_POOL_SIZE"],
+            "connect_args": {"timeout": timeout},
+        }
+
+
+def apply_pragmas(engine, pragmas, read_only=False):
+    """Run the PRAGMAs on every new DBAPI connection of a SQLite engine."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        cur = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cur.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cur.execute("PRAGMA query_only=ON")
+        cur.close()
+
+
+def init_storage(app, db):
+    """Attach the PRAGMAs to the engines db.init_app created. Needs an app context."""
+    pragmas = app.config["SQLITE_PRAGMAS"]
+    for key, engine in db.engines.items():
+        apply_pragmas(engine, pragmas, read_only=(key == READER_BIND))
+
+
+class RoutingSession(Session):
+    """
+    Sends plain reads during GET/HEAD requests to the reader bind. Flushes,
+    bulk UPDATE/DELETE/INSERT and anything outside a request use the writer.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not getattr(clause, "is_dml", False)
+            and has_request_context()
+            and request.method in READ_METHODS
+        ):
+            reader = self._db.engines.get(READER_BIND)
+            if reader is not None:
+                return reader
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
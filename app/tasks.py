@@ -0,0 +1,168 @@
+# tasks.py
+"""
+In-process background tasks for follow-up work a request should not wait on.
+
+    tasks.after_commit(refresh_team_skill, team.id, key=f"team-skill:{team.id}")
+    db.session.commit()
+
+after_commit() attaches the call to the current session; it is submitted
+when that session commits and dropped if it rolls back, so a task never
+sees data that was not written. Tasks run on a bounded thread pool, each in
+its own app context and session.
+
+- key: at most one pending task per key. A duplicate of a queued task is
+  dropped; a duplicate of a running task makes it run once more after it
+  finishes, since it may have read the old state.
+- backpressure: when TASK_QUEUE_MAX tasks are waiting, submit() runs the
+  task in the caller instead of growing the queue.
+- shutdown: drain() stops taking new work and waits for what is queued; it
+  is registered with atexit, so a worker finishes its tasks on exit.
+- TASKS_EAGER runs everything inline (CLI scripts, debugging).
+"""
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import event
+from app import db
+from app.storage import RoutingSession
+
+HOOKS = "after_commit_tasks"
+READY = "committed_tasks"
+
+
+class TaskRunner:
+    def __init__(self, app):
+        self.app = app
+        self.workers = app.config.get("TASK_WORKERS", 2)
+        self.max_queued = app.config.get("TASK_QUEUE_MAX", 1000)
+        self.eager = app.config.get("TASKS_EAGER", False)
+        self._pool = None
+        self._lock = threading.Condition()
+        self._queued = {}       # key -> None while waiting
+        self._running = set()
+        self._again = {}        # key -> (fn, args, kwargs) to rerun after the running one
+        self._inflight = 0
+        self._closed = False
+        self.stats = {"submitted": 0, "deduplicated": 0, "ran": 0, "failed": 0, "inline": 0}
+
+    def _executor(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="tasks")
+        return self._pool
+
+    def submit(self, fn, *args, key=None, **kwargs):
+        """Run fn(*args, **kwargs) in the background. Returns False if it was deduplicated."""
+        with self._lock:
+            if key is not None:
+                if key in self._queued:
+                    self.stats["deduplicated"] += 1
+                    return False
+                if key in self._running:
+                    if key in self._again:
+                        self.stats["deduplicated"] += 1
+                    self._again[key] = (fn, args, kwargs)
+                    return True
+            self.stats["submitted"] += 1
+            inline = self.eager or self._closed or self._inflight >= self.max_queued
+            if not inline:
+                self._inflight += 1
+                if key is not None:
+                    self._queued[key] = None
+        if inline:
+            with self._lock:
+                self.stats["inline"] += 1
+            self._call(fn, args, kwargs)
+            return True
+        self._executor().submit(self._run, fn, args, kwargs, key)
+        return True
+
+    def _call(self, fn, args, kwargs):
+        try:
+            with self.app.app_context():
+                try:
+                    fn(*args, **kwargs)
+                finally:
+                    db.session.remove()
+            ok = True
+        except Exception:
+            self.app.logger.exception("background task %s failed", getattr(fn, "__name__", fn))
+            ok = False
+        with self._lock:
+            self.stats["ran" if ok else "failed"] += 1
+
+    def _run(self, fn, args, kwargs, key):
+        while True:
+            with self._lock:
+                if key is not None:
+                    self._queued.pop(key, None)
+                    self._running.add(key)
+            self._call(fn, args, kwargs)
+            with self._lock:
+                if key is not None:
+                    self._running.discard(key)
+                    again = self._again.pop(key, None)
+                    if again is not None:
+                        fn, args, kwargs = again
+                        continue
+                self._inflight -= 1
+                self._lock.notify_all()
+                return
+
+    def pending(self):
+        with self._lock:
+            return self._inflight
+
+    def drain(self, timeout=None):
+        """Stop accepting background work and wait for queued tasks. True if all finished."""
+        with self._lock:
+            self._closed = True
+            done = self._lock.wait_for(lambda: self._inflight == 0, timeout)
+        if done and self._pool is not None:
+            self._pool.shutdown(wait=True)
+        return done
+
+    def wait(self, timeout=None):
+        """Wait for the queue to empty without closing it (benchmarks, CLI)."""
+        with self._lock:
+            return self._lock.wait_for(lambda: self._inflight == 0, timeout)
+
+
+def init_tasks(app):
+    runner = app.extensions["tasks"] = TaskRunner(app)
+    atexit.register(runner.drain, app.config.get("TASK_DRAIN_TIMEOUT_S", 30))
+    return runner
+
+
+def runner():
+    return current_app.extensions["tasks"]
+
+
+def submit(fn, *args, key=None, **kwargs):
+    return runner().submit(fn, *args, key=key, **kwargs)
+
+
+def after_commit(fn, *args, key=None, **kwargs):
+    """Queue fn to run in the background once the current session commits."""
+    db.session().info.setdefault(HOOKS, []).append((current_app.extensions["tasks"], fn, args, key, kwargs))
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _commit_hooks(session):
+    # the connection is still checked out here; submit once it is released
+    if HOOKS in session.info:
+        session.info.setdefault(READY, []).extend(session.info.pop(HOOKS))
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _drop_hooks(session):
+    session.info.pop(HOOKS, None)
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _run_hooks(session, transaction):
+    if transaction.parent is None:
+        for task_runner, fn, args, key, kwargs in session.info.pop(READY, ()):
+            task_runner.submit(fn, *args, key=key, **kwargs)
@@ -1,14 +1,61 @@
+import multiprocessing
 import random
-from itertools import combinations
-from math import inf
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from bisect import bisect_left
+from math import inf, radians, sin, cos, asin, sqrt, floor, atan2, degrees
+from types import SimpleNamespace
 import string
 import secrets
-import stripe
+import base64
+import json
+from datetime import datetime
 
 
+# upper bound on the summed (shifted) ratings the exact balancer will handle
+MAX_DP_SUM = 2_000_000
+
+# venue grid: fixed-size lat/lon cells (0.1 deg is ~11 km north-south)
+VENUE_CELL_DEG = 0.1
+_GRID_COLS = int(round(360 / VENUE_CELL_DEG))
+_GRID_ROWS = int(round(180 / VENUE_CELL_DEG))
+EARTH_RADIUS_KM = 6371.0
+
 def make_token(n=10):
     return secrets.token_urlsafe(n)[:n]
 
+def encode_cursor(*values):
+    """Opaque, URL-safe keyset cursor for a page boundary."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, *types):
+    """
+    Values packed by encode_cursor, checked against `types` (one per value;
+    datetime values come back parsed). None if the cursor is missing, garbled
+    or the wrong shape.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(types):
+        return None
+    out = []
+    for value, kind in zip(values, types):
+        if kind is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (ValueError, TypeError):
+                return None
+        elif not isinstance(value, kind) or isinstance(value, bool):
+            return None
+        out.append(value)
+    return out
+
 def shuffle_players_list(players):
     p = list(players)
     random.shuffle(p)
@@ -26,27 +73,418 @@ def greedy_balance(players):
             team_b.append(p); sum_b += p.skill_rating
     return team_a, team_b
 
+def _rating(p):
+    return int(round(p.skill_rating or 0))
+
 def optimal_balance(players):
+    """
+    Exact equal-size split via subset-sum DP. reach[k] is a bitset (python int)
+    of the rating sums reachable with exactly k players; one layer is kept per
+    player so the chosen side can be walked back afterwards.
+    Returns None when the rating range is too wide for the bitset.
+    """
+    players = list(players)
     n = len(players)
     half = n // 2
-    best, best_diff = None, inf
-    for combo in combinations(players, half):
-        team_a = list(combo)
-        team_b = [p for p in players if p not in team_a]
-        diff = abs(sum(p.skill_rating for p in team_a) - sum(p.skill_rating for p in team_b))
-        if diff < best_diff:
-            best_diff = diff
-            best = (team_a, team_b)
-            if best_diff == 0:
-                break
-    return best
+    ratings = [_rating(p) for p in players]
+    shift = -min(min(ratings), 0)
+    vals = [r + shift for r in ratings]
+    if sum(vals) > MAX_DP_SUM:
+        return None
+    total = sum(ratings)
+
+    reach = [1] + [0] * half
+    layers = [reach]
+    for i, v in enumerate(vals):
+        reach = list(reach)
+        lo = max(1, half - (n - i - 1))
+        for k in range(min(i + 1, half), lo - 1, -1):
+            reach[k] |= reach[k - 1] << v
+        layers.append(reach)
+
+    # pick the reachable half-sum closest to total / 2
+    bits = bin(reach[half])[:1:-1]
+    target = (total + 2 * half * shift) // 2
+    below = bits.rfind("1", 0, target + 1)
+    above = bits.find("1", target + 1)
+    candidates = [s for s in (below, above) if s >= 0]
+    best_s = min(candidates, key=lambda s: abs(2 * (s - half * shift) - total))
+
+    in_a = [False] * n
+    s, k = best_s, half
+    for i in range(n, 0, -1):
+        v = vals[i - 1]
+        if k and s >= v and (layers[i - 1][k - 1] >> (s - v)) & 1:
+            in_a[i - 1] = True
+            s -= v
+            k -= 1
+    team_a = [p for p, a in zip(players, in_a) if a]
+    team_b = [p for p, a in zip(players, in_a) if not a]
+    return team_a, team_b
 
 def balance_teams(players):
     n = len(players)
     if n < 2:
         return players, []
-    if n <= 10:
-        res = optimal_balance(players)
-        if res:
-            return res
+    res = optimal_balance(players)
+    if res:
+        return res
     return greedy_balance(players)
+
+
+def _differencing_seed(ratings, k):
+    """
+    Balanced k-way differencing: players sorted by rating are cut into rows of
+    k (one per team), then the two rows with the largest spread are merged by
+    pairing the heaviest side of one with the lightest side of the other.
+    Rows are padded with dummies (index None) so every team gets the same count.
+    """
+    order = sorted(range(len(ratings)), key=lambda i: ratings[i], reverse=True)
+    order += [None] * (-len(order) % k)
+    rows = []
+    for start in range(0, len(order), k):
+        row = [([i] if i is not None else [], ratings[i] if i is not None else 0)
+               for i in order[start:start + k]]
+        rows.append(row)
+    while len(rows) > 1:
+        rows.sort(key=lambda r: max(s for _, s in r) - min(s for _, s in r))
+        a = sorted(rows.pop(), key=lambda t: t[1], reverse=True)
+        b = sorted(rows.pop(), key=lambda t: t[1])
+        rows.append([(ma + mb, sa + sb) for (ma, sa), (mb, sb) in zip(a, b)])
+    return [members for members, _ in rows[0]] if rows else [[] for _ in range(k)]
+
+def _best_swap(ratings, big, small, gap):
+    """Best (i, j) swap moving rating from `big` to `small` that narrows `gap`."""
+    lookup = sorted((ratings[j], j) for j in small)
+    values = [r for r, _ in lookup]
+    best, best_d = None, 0
+    for i in big:
+        want = ratings[i] - gap / 2.0
+        pos = bisect_left(values, want)
+        for p in (pos - 1, pos):
+            if 0 <= p < len(values):
+                d = ratings[i] - values[p]
+                if 0 < d < gap and abs(gap - 2 * d) < abs(gap - 2 * best_d):
+                    best, best_d = (i, lookup[p][1]), d
+    return best, best_d
+
+def kway_balance(players, k, deadline_ms=200):
+    """
+    Split players into k teams of equal size (+/- 1) with ratings as even as
+    possible. Seeded by differencing, then improved with pairwise swaps between
+    teams until no swap helps or the deadline passes; whatever is best by the
+    deadline is returned, so callers get a bounded response time.
+    """
+    if k < 2:
+        raise ValueError("k must be at least 2")
+    players = list(players)
+    deadline = time.perf_counter() + deadline_ms / 1000.0
+    ratings = [_rating(p) for p in players]
+    teams = _differencing_seed(ratings, k)
+    sums = [sum(ratings[i] for i in t) for t in teams]
+
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        order = sorted(range(k), key=lambda t: sums[t], reverse=True)
+        for hi in order:
+            for lo in reversed(order):
+                gap = sums[hi] - sums[lo]
+                if gap <= 1:
+                    break
+                swap, d = _best_swap(ratings, teams[hi], teams[lo], gap)
+                if swap:
+                    i, j = swap
+                    teams[hi].remove(i); teams[hi].append(j)
+                    teams[lo].remove(j); teams[lo].append(i)
+                    sums[hi] -= d
+                    sums[lo] += d
+                    improved = True
+                    break
+                if time.perf_counter() >= deadline:
+                    break
+            if improved or time.perf_counter() >= deadline:
+                break
+    return [[players[i] for i in t] for t in teams]
+
+
+def skill_balance(players, vectors, deadline_ms=200, restarts=8):
+    """
+    Equal-size split minimising the worst per-skill gap between the sides.
+    `vectors` holds one row of skill values per player. Every A<->B swap is
+    scored at once as a |A| x |B| x skills array; the best one is applied until
+    none improves, restarting from random splits while time remains.
+    Returns (team_a, team_b, gap) where gap is the signed per-skill A - B sum.
+    """
+    import numpy as np
+
+    players = list(players)
+    n = len(players)
+    if n < 2:
+        return players, [], [float(v) for v in vectors[0]] if n else []
+    half = n // 2
+    X = np.asarray(vectors, dtype=float).reshape(n, -1)
+    deadline = time.perf_counter() + deadline_ms / 1000.0
+    rng = np.random.default_rng()
+
+    def score(gaps):
+        # worst dimension first, total squared gap as the tie-break
+        return np.abs(gaps).max(axis=-1) * 1e6 + (gaps ** 2).sum(axis=-1) / 1e6
+
+    # first start: exact scalar split on the summed skill vector
+    rows = [SimpleNamespace(idx=i, skill_rating=float(X[i].sum())) for i in range(n)]
+    seed = optimal_balance(rows)
+    start = np.zeros(n, dtype=bool)
+    if seed:
+        start[[r.idx for r in seed[0]]] = True
+    else:
+        start[:half] = True
+
+    best_side, best_score = None, inf
+    in_a = start
+    for attempt in range(max(1, restarts)):
+        if attempt:
+            if time.perf_counter() >= deadline:
+                break
+            in_a = np.zeros(n, dtype=bool)
+            in_a[rng.permutation(n)[:half]] = True
+        gap = X[in_a].sum(axis=0) - X[~in_a].sum(axis=0)
+        current = score(gap)
+        while time.perf_counter() < deadline:
+            a_idx = np.flatnonzero(in_a)
+            b_idx = np.flatnonzero(~in_a)
+            if not len(a_idx) or not len(b_idx):
+                break
+            # moving i: A->B and j: B->A shifts the gap by 2 * (X[j] - X[i])
+            cand = gap + 2 * (X[b_idx][None, :, :] - X[a_idx][:, None, :])
+            scores = score(cand)
+            flat = int(scores.argmin())
+            if scores.flat[flat] >= current:
+                break
+            i, j = np.unravel_index(flat, scores.shape)
+            in_a[a_idx[i]] = False
+            in_a[b_idx[j]] = True
+            gap = cand[i, j]
+            current = scores.flat[flat]
+        if current < best_score:
+            best_side, best_score = in_a.copy(), current
+
+    team_a = [p for p, a in zip(players, best_side) if a]
+    team_b = [p for p, a in zip(players, best_side) if not a]
+    gap = X[best_side].sum(axis=0) - X[~best_side].sum(axis=0)
+    return team_a, team_b, gap.tolist()
+
+
+def constrained_balance(players, locked=None, together=(), apart=(), role_quota=None, deadline_ms=200):
+    """
+    Equal-size (+/- 1) split that honours:
+      locked     - {player_id: 'A' | 'B'} pinned sides
+      together   - groups of player ids that must share a side
+      apart      - groups of player ids that must not share a side (pairwise)
+      role_quota - {role: n}, each side needs at least n players of that role
+    Keep-together groups are collapsed into single units first, then a
+    branch-and-bound search assigns units heaviest first, pruning on side
+    sizes, remaining role supply and the best reachable rating gap.
+    Raises ValueError when the constraints cannot be met.
+    """
+    players = list(players)
+    n = len(players)
+    locked = locked or {}
+    role_quota = {r: q for r, q in (role_quota or {}).items() if q > 0}
+    deadline = time.perf_counter() + deadline_ms / 1000.0
+    index = {p.id: i for i, p in enumerate(players)}
+
+    # union-find over keep-together groups
+    parent = list(range(n))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for group in together:
+        members = [index[pid] for pid in group if pid in index]
+        for m in members[1:]:
+            parent[find(m)] = find(members[0])
+
+    units = {}
+    for i in range(n):
+        units.setdefault(find(i), []).append(i)
+    units = list(units.values())
+
+    roles = sorted(role_quota)
+    unit_of = {}
+    info = []
+    for u, members in enumerate(units):
+        sides = {locked[players[i].id] for i in members if players[i].id in locked}
+        if len(sides) > 1:
+            raise ValueError("players kept together are pinned to different sides")
+        for i in members:
+            unit_of[i] = u
+        info.append({
+            "members": members,
+            "weight": sum(_rating(players[i]) for i in members),
+            "size": len(members),
+            "side": sides.pop() if sides else None,
+            "roles": [sum(1 for i in members if players[i].role == r) for r in roles],
+            "apart": set(),
+        })
+    for group in apart:
+        ids = [unit_of[index[pid]] for pid in group if pid in index]
+        if len(set(ids)) < len(ids):
+            raise ValueError("players kept apart are also kept together")
+        for u in ids:
+            info[u]["apart"].update(v for v in ids if v != u)
+
+    # heaviest and pinned units first so bounds tighten early
+    order = sorted(range(len(info)), key=lambda u: (info[u]["side"] is None, -info[u]["weight"]))
+    rem_weight = [0] * (len(order) + 1)
+    rem_size = [0] * (len(order) + 1)
+    rem_roles = [[0] * len(roles) for _ in range(len(order) + 1)]
+    for pos in range(len(order) - 1, -1, -1):
+        u = info[order[pos]]
+        rem_weight[pos] = rem_weight[pos + 1] + u["weight"]
+        rem_size[pos] = rem_size[pos + 1] + u["size"]
+        rem_roles[pos] = [a + b for a, b in zip(rem_roles[pos + 1], u["roles"])]
+
+    lo_size, hi_size = n // 2, n - n // 2
+    quotas = [role_quota[r] for r in roles]
+    best = {"diff": inf, "side": None}
+    side_of = [None] * len(info)
+    symmetric = not any(u["side"] for u in info)
+
+    def search(pos, diff, size_a, size_b, roles_a, roles_b):
+        if best["diff"] <= 1 or time.perf_counter() >= deadline:
+            return
+        if pos == len(order):
+            if abs(diff) < best["diff"]:
+                best["diff"] = abs(diff)
+                best["side"] = list(side_of)
+            return
+        if abs(diff) - rem_weight[pos] >= best["diff"]:
+            return
+        u = order[pos]
+        unit = info[u]
+        options = ("A", "B") if diff <= 0 else ("B", "A")
+        if unit["side"]:
+            options = (unit["side"],)
+        elif symmetric and pos == 0:
+            options = ("A",)
+        for side in options:
+            if any(side_of[v] == side for v in unit["apart"]):
+                continue
+            na = size_a + (unit["size"] if side == "A" else 0)
+            nb = size_b + (unit["size"] if side == "B" else 0)
+            rest = rem_size[pos + 1]
+            if na > hi_size or nb > hi_size or na + rest < lo_size or nb + rest < lo_size:
+                continue
+            ra = [a + (c if side == "A" else 0) for a, c in zip(roles_a, unit["roles"])]
+            rb = [b + (c if side == "B" else 0) for b, c in zip(roles_b, unit["roles"])]
+            if any(max(0, q - a) + max(0, q - b) > left
+                   for q, a, b, left in zip(quotas, ra, rb, rem_roles[pos + 1])):
+                continue
+            side_of[u] = side
+            search(pos + 1, diff + (unit["weight"] if side == "A" else -unit["weight"]), na, nb, ra, rb)
+            side_of[u] = None
+
+    search(0, 0, 0, 0, [0] * len(roles), [0] * len(roles))
+    if best["side"] is None:
+        if time.perf_counter() >= deadline:
+            raise ValueError("no split satisfying the constraints was found in time")
+        raise ValueError("no split satisfies the constraints")
+    team_a, team_b = [], []
+    for u, side in enumerate(best["side"]):
+        for i in info[u]["members"]:
+            (team_a if side == "A" else team_b).append(players[i])
+    return team_a, team_b
+
+
+# -------------------------
+# Batch balancing (worker processes)
+# -------------------------
+_balance_pool = None
+
+
+def balance_job(job):
+    """
+    Balance one match for the batch endpoint. `job` is plain data so it can be
+    sent to a worker process: match_id, players [(id, skill_rating, role)],
+    mode, vectors (skills mode), locked {player_id: side}, deadline_ms.
+    Returns (match_id, side_a_ids, side_b_ids, error).
+    """
+    players = [SimpleNamespace(id=i, skill_rating=r, role=role) for i, r, role in job["players"]]
+    try:
+        if job.get("locked"):
+            team_a, team_b = constrained_balance(players, locked=job["locked"], deadline_ms=job["deadline_ms"])
+        elif job["mode"] == "skills":
+            team_a, team_b, _ = skill_balance(players, job["vectors"], deadline_ms=job["deadline_ms"])
+        else:
+            team_a, team_b = balance_teams(players)
+    except ValueError as e:
+        return job["match_id"], None, None, str(e)
+    return job["match_id"], [p.id for p in team_a], [p.id for p in team_b], None
+
+
+def balance_many(jobs, workers):
+    """Run balance_job over many matches, spread over a process pool."""
+    global _balance_pool
+    if workers <= 1 or len(jobs) < 2:
+        return [balance_job(j) for j in jobs]
+    if _balance_pool is None:
+        # spawn: forking a threaded web server can copy held locks
+        _balance_pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        return list(_balance_pool.map(balance_job, jobs))
+    except BrokenProcessPool:
+        # a dead worker breaks the pool; start a fresh one next time
+        _balance_pool = None
+        return [balance_job(j) for j in jobs]
+
+
+# -------------------------
+# Geo helpers (venue grid index)
+# -------------------------
+def _grid_row_col(lat, lon):
+    row = min(_GRID_ROWS - 1, max(0, int(floor((lat + 90.0) / VENUE_CELL_DEG))))
+    col = int(floor((lon + 180.0) / VENUE_CELL_DEG)) % _GRID_COLS
+    return row, col
+
+def grid_cell_for(lat, lon):
+    """Integer id of the grid cell containing (lat, lon)."""
+    row, col = _grid_row_col(lat, lon)
+    return row * _GRID_COLS + col
+
+def ring_cells(lat, lon, r):
+    """Cell ids exactly r cells away (Chebyshev distance) from the cell of (lat, lon)."""
+    row, col = _grid_row_col(lat, lon)
+    if r == 0:
+        return [row * _GRID_COLS + col]
+    cells = set()
+    for dr in range(-r, r + 1):
+        rr = row + dr
+        if rr < 0 or rr >= _GRID_ROWS:
+            continue
+        dcs = range(-r, r + 1) if abs(dr) == r else (-r, r)
+        for dc in dcs:
+            cells.add(rr * _GRID_COLS + (col + dc) % _GRID_COLS)
+    return list(cells)
+
+def ring_clearance_km(lat, r):
+    """Lower bound on the distance from a point to any cell outside rings 0..r."""
+    lat_km = r * VENUE_CELL_DEG * (EARTH_RADIUS_KM * 3.141592653589793 / 180.0)
+    worst_lat = min(89.9, abs(lat) + (r + 1) * VENUE_CELL_DEG)
+    return lat_km * cos(radians(worst_lat))
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+def geo_midpoint(lat1, lon1, lat2, lon2):
+    """Great-circle midpoint of two points."""
+    p1, p2, dl = radians(lat1), radians(lat2), radians(lon2 - lon1)
+    bx = cos(p2) * cos(dl)
+    by = cos(p2) * sin(dl)
+    lat = atan2(sin(p1) + sin(p2), sqrt((cos(p1) + bx) ** 2 + by ** 2))
+    lon = radians(lon1) + atan2(by, cos(p1) + bx)
+    return degrees(lat), (degrees(lon) + 540) % 360 - 180
@@ -0,0 +1,93 @@
+"""
+Read-heavy traffic with the response cache on and off.
+
+    python -m benchmarks.bench_cache [requests] [teams] [write_pct]
+
+Runs the real app against a throwaway SQLite file, one process per mode
+(CACHE_ENABLED=1/0). Traffic is the hot read pages (home page, team page,
+player stats, team winnings JSON) picked at random, plus write_pct percent
+POST /teams/<id>/add_player, each of which invalidates that team's pages
+and the home page. Reports requests/s, read p50/p99 and the hit rate from
+/admin/cache.
+"""
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_payments import percentile
+
+
+def run(enabled, count, n_teams, write_pct, out):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_cache.db')}"
+    os.environ["CACHE_ENABLED"] = "1" if enabled else "0"
+    os.environ["TASKS_EAGER"] = "1"
+    from app import create_app, db
+    from app.models import Match, Player, Team
+
+    app = create_app()
+    with app.app_context():
+        teams = [Team(name=f"bench-{i}", email=f"{i}@bench", sport="soccer") for i in range(n_teams)]
+        for t in teams:
+            t.password_hash = "x"
+        db.session.add_all(teams)
+        db.session.flush()
+        db.session.add_all([Player(name=f"p{t.id}-{i}", team_id=t.id, skill_rating=50)
+                            for t in teams for i in range(11)])
+        db.session.add_all([Match(team1_id=t.id, team2_id=teams[(i + 1) % n_teams].id, sport="soccer",
+                                  status="pending", stakes=10.0) for i, t in enumerate(teams)])
+        db.session.commit()
+        team_ids = [t.id for t in teams]
+        player_ids = [p for (p,) in db.session.query(Player.id)]
+
+    rng = random.Random(7)
+    clients = {}
+
+    def client(team_id):
+        if team_id not in clients:
+            clients[team_id] = c = app.test_client()
+            with c.session_transaction() as s:
+                s["team_id"] = team_id
+        return clients[team_id]
+
+    latencies, start = [], time.perf_counter()
+    for i in range(count):
+        team_id = rng.choice(team_ids)
+        c = client(team_id)
+        if rng.random() * 100 < write_pct:
+            c.post(f"/teams/{team_id}/add_player", data={"name": f"new{i}", "skill": "60"})
+            continue
+        url = rng.choice(["/", f"/teams/{team_id}", f"/player/{rng.choice(player_ids)}/stats",
+                          f"/api/team/{team_id}/winnings"])
+        t = time.perf_counter()
+        r = c.get(url)
+        latencies.append((time.perf_counter() - t) * 1000)
+        assert r.status_code == 200, (url, r.status_code)
+    total = time.perf_counter() - start
+    stats = app.test_client().get("/admin/cache?admin=true").json
+    label = "cache on" if enabled else "cache off"
+    print(f"{label:9s} {count / total:7.1f} req/s  read p50 {percentile(latencies, 0.5):6.2f} ms  "
+          f"p99 {percentile(latencies, 0.99):6.2f} ms  hit rate {stats['hit_rate']}  "
+          f"{stats['entries']} entries / {stats['bytes'] or 0} bytes")
+    out.put(count / total)
+
+
+def main(count=4000, n_teams=50, write_pct=2.0):
+    print(f"{count} requests over {n_teams} teams, {write_pct}% writes")
+    # routes register on the first app of a process, so each mode gets its own
+    ctx = mp.get_context("spawn")
+    out, rates = ctx.Queue(), []
+    for enabled in (False, True):
+        proc = ctx.Process(target=run, args=(enabled, count, n_teams, write_pct, out))
+        proc.start()
+        rates.append(out.get())
+        proc.join()
+    print(f"speedup {rates[1] / rates[0]:.1f}x")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 4000, int(args[1]) if len(args) > 1 else 50,
+         float(args[2]) if len(args) > 2 else 2.0)
@@ -0,0 +1,113 @@
+"""
+Winnings push: fan-out cost of the change bus with thousands of idle
+SSE subscribers.
+
+    python -m benchmarks.bench_events [subscribers] [teams]
+
+Each subscriber is a thread parked inside sse_stream(), which is what a
+threaded server holds per open EventSource. Reports the memory held by idle
+subscribers and how long a publish takes to reach all of them, next to the
+query load the old 8-second polling put on the database.
+"""
+import sys
+import threading
+import time
+import tracemalloc
+
+from app.events import ChangeBus, sse_stream
+
+POLL_INTERVAL_S = 8
+
+
+class Round:
+    """Counts deliveries for one publish round across subscriber threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ready = threading.Semaphore(0)
+        self.start(0)
+
+    def start(self, expected):
+        self.received, self.expected = 0, expected
+        self.done = threading.Event()
+
+    def hit(self):
+        with self.lock:
+            self.received += 1
+            if self.received == self.expected:
+                self.done.set()
+
+
+def subscriber(bus, channel, rnd):
+    stream = sse_stream(bus.subscribe(channel), {"total_winnings": 0}, event="winnings", keepalive=60)
+    next(stream)  # retry hint
+    next(stream)  # initial snapshot
+    rnd.ready.release()
+    for chunk in stream:
+        if '"stop"' in chunk:
+            stream.close()
+            return
+        if chunk.startswith("event:"):
+            rnd.hit()
+
+
+def connect(bus, channels, n, rnd):
+    threads = [threading.Thread(target=subscriber, args=(bus, channels[i % len(channels)], rnd), daemon=True)
+               for i in range(n)]
+    for t in threads:
+        t.start()
+    for _ in threads:
+        rnd.ready.acquire()
+    return threads
+
+
+def publish_round(bus, channels, expected, rnd):
+    rnd.start(expected)
+    start = time.perf_counter()
+    for channel in channels:
+        bus.publish(channel, {"total_winnings": 12.5})
+    done = rnd.done.wait(30)
+    return (time.perf_counter() - start) * 1000, done
+
+
+def main(n_subs=3000, n_teams=500):
+    threading.stack_size(256 * 1024)
+    rnd = Round()
+    bus = ChangeBus()
+    channels = [f"team:{i}:winnings" for i in range(n_teams)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    threads = connect(bus, channels, n_subs, rnd)
+    connect_s = time.perf_counter() - start
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{bus.subscriber_count()} idle subscribers over {n_teams} team channels "
+          f"(connected in {connect_s:.2f}s, ~{heap / n_subs / 1024:.1f} KiB Python heap each)")
+
+    per_team = bus.subscriber_count(channels[0])
+    ms, _ = publish_round(bus, channels[:1], per_team, rnd)
+    print(f"one team's result  -> {per_team} subscribers in {ms:.2f} ms")
+
+    ms, done = publish_round(bus, channels, n_subs, rnd)
+    print(f"all {n_teams} teams updated -> {n_subs} subscribers in {ms:.1f} ms{'' if done else ' (TIMED OUT)'}")
+
+    hot = ChangeBus()
+    threads += connect(hot, ["team:0:winnings"], n_subs, rnd)
+    ms, done = publish_round(hot, ["team:0:winnings"], n_subs, rnd)
+    print(f"one hot team, {n_subs} subscribers on one channel -> {ms:.1f} ms{'' if done else ' (TIMED OUT)'}")
+
+    print(f"polling baseline: {n_subs} tabs every {POLL_INTERVAL_S}s = "
+          f"{n_subs / POLL_INTERVAL_S:.0f} winnings queries/s while nothing changes; push: 0")
+
+    for b, chans in ((bus, channels), (hot, ["team:0:winnings"])):
+        for channel in chans:
+            b.publish(channel, {"stop": True})
+    for t in threads:
+        t.join(5)
+    print(f"after disconnect: {bus.subscriber_count() + hot.subscriber_count()} subscribers left")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 3000, int(args[1]) if len(args) > 1 else 500)
@@ -0,0 +1,89 @@
+"""
+Ledger balances: snapshot + tail vs. summing an account's whole history.
+
+    python -m benchmarks.bench_ledger [entries_per_account] [accounts]
+
+Runs against a throwaway in-memory SQLite database. Entries are bulk-loaded
+and then snapshotted every LEDGER_SNAPSHOT_EVERY entries, as ledger.post
+would have done while they were written.
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import func
+
+from app import db
+from app import ledger
+from app.config import Config
+from app.models import BalanceSnapshot, LedgerEntry, Transaction
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["LEDGER_SNAPSHOT_EVERY"] = Config.LEDGER_SNAPSHOT_EVERY
+    db.init_app(app)
+    return app
+
+
+def seed(per_account, accounts, every):
+    start = datetime(2025, 1, 1)
+    db.session.execute(Transaction.__table__.insert(), [{"id": 1, "amount": 0, "type": "bench"}])
+    rows, snaps, totals, counts = [], [], {}, {}
+    for i in range(per_account * accounts):
+        account = ledger.team_account(i % accounts)
+        cents = random.randint(-500, 1000)
+        at = start + timedelta(minutes=i)
+        rows.append({"id": i + 1, "transaction_id": 1, "account": account, "amount_cents": cents, "created_at": at})
+        totals[account] = totals.get(account, 0) + cents
+        counts[account] = counts.get(account, 0) + 1
+        if counts[account] % every == 0:
+            snaps.append({"account": account, "entry_id": i + 1, "balance_cents": totals[account], "as_of": at})
+    db.session.execute(LedgerEntry.__table__.insert(), rows)
+    db.session.execute(BalanceSnapshot.__table__.insert(), snaps)
+    db.session.commit()
+    return totals, start + timedelta(minutes=len(rows))
+
+
+def full_scan(account, at=None):
+    query = db.session.query(func.coalesce(func.sum(LedgerEntry.amount_cents), 0)).filter(LedgerEntry.account == account)
+    if at is not None:
+        query = query.filter(LedgerEntry.created_at <= at)
+    return query.scalar()
+
+
+def timed(fn, calls):
+    t = time.perf_counter()
+    out = [fn(*args) for args in calls]
+    return (time.perf_counter() - t) * 1000 / len(calls), out
+
+
+def main(per_account=20_000, accounts=20):
+    random.seed(11)
+    app = make_app()
+    every = app.config["LEDGER_SNAPSHOT_EVERY"]
+    with app.app_context():
+        db.create_all()
+        t = time.perf_counter()
+        totals, end = seed(per_account, accounts, every)
+        print(f"{per_account * accounts} entries over {accounts} accounts, snapshot every {every} "
+              f"(seeded in {time.perf_counter() - t:.1f}s)")
+        names = list(totals)
+        now_calls = [(random.choice(names),) for _ in range(200)]
+        past_calls = [(random.choice(names), end - timedelta(minutes=random.randint(0, per_account * accounts)))
+                      for _ in range(200)]
+
+        for label, calls in (("current balance", now_calls), ("balance at a time", past_calls)):
+            snap_ms, snap = timed(lambda *a: ledger.balance_cents(*a)[0], calls)
+            scan_ms, scan = timed(full_scan, calls)
+            assert snap == scan, "snapshot balance disagrees with full scan"
+            print(f"{label:18s} snapshot {snap_ms:7.3f} ms   full scan {scan_ms:7.3f} ms   x{scan_ms / snap_ms:.0f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 20_000, int(args[1]) if len(args) > 1 else 20)
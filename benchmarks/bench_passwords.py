@@ -0,0 +1,111 @@
+"""
+Login throughput and the latency of other routes across KDF cost settings.
+
+    python -m benchmarks.bench_passwords [logins] [concurrency] [pool_workers] [method ...]
+
+Runs the real app against a throwaway SQLite file. For each cost setting
+(werkzeug method string) and for hashing inline (PASSWORD_HASH_WORKERS=0)
+vs. on app/passwords.py's process pool, `concurrency` threads POST /login
+until `logins` have succeeded while a probe thread keeps requesting the
+home page (response cache off). Reports logins/s, login p50 and the probe's
+p50/p99: the stall the burst causes for everyone else. Finally checks that
+a login after a cost change rehashes the stored password.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_payments import percentile
+
+METHODS = ["scrypt:16384:8:1", "scrypt:32768:8:1", "scrypt:65536:8:1", "pbkdf2:sha256:600000"]
+
+
+def burst(app, emails, logins, concurrency):
+    login_ms, probe_ms, done = [], [], threading.Event()
+    lock = threading.Lock()
+    remaining = [logins]
+
+    def login_worker(i):
+        client = app.test_client()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            t = time.perf_counter()
+            r = client.post("/login", data={"email": emails[i % len(emails)], "password": "pw"})
+            assert r.status_code == 302 and "/teams/" in r.location, r.location
+            with lock:
+                login_ms.append((time.perf_counter() - t) * 1000)
+
+    def probe():
+        client = app.test_client()
+        while not done.is_set():
+            t = time.perf_counter()
+            client.get("/")
+            probe_ms.append((time.perf_counter() - t) * 1000)
+            time.sleep(0.01)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=login_worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - start
+    done.set()
+    prober.join()
+    return logins / total, login_ms, probe_ms
+
+
+def main(logins=64, concurrency=8, pool_workers=None, methods=None):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_passwords.db')}"
+    os.environ["CACHE_ENABLED"] = "0"
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import Team
+    from app.passwords import PasswordHasher
+
+    app = create_app()
+    pool_workers = pool_workers or app.config["PASSWORD_HASH_WORKERS"]
+    with app.app_context():
+        teams = [Team(name=f"bench-{i}", email=f"{i}@bench", sport="soccer", password_hash="x") for i in range(16)]
+        db.session.add_all(teams)
+        db.session.commit()
+        emails = [t.email for t in teams]
+    print(f"{logins} logins, {concurrency} concurrent, pool of {pool_workers}, {os.cpu_count()} CPUs")
+
+    for method in methods or METHODS:
+        with app.app_context():
+            Team.query.filter(Team.email.in_(emails)).update({"password_hash": generate_password_hash("pw", method)})
+            db.session.commit()
+        for workers in (0, pool_workers):
+            old = app.extensions["passwords"]
+            app.extensions["passwords"] = hasher = PasswordHasher(method, workers)
+            old.shutdown()
+            if workers:
+                with app.test_request_context():
+                    hasher.verify("x", "warm up the pool")
+            rate, login_ms, probe_ms = burst(app, emails, logins, concurrency)
+            label = f"pool x{workers}" if workers else "inline"
+            print(f"{method:22s} {label:8s} {rate:6.1f} logins/s  login p50 {percentile(login_ms, 0.5):7.1f} ms  "
+                  f"home page p50 {percentile(probe_ms, 0.5):6.1f} ms  p99 {percentile(probe_ms, 0.99):7.1f} ms")
+
+    # a login after a cost change upgrades the stored hash
+    hasher.method = "scrypt:16384:8:2"
+    app.test_client().post("/login", data={"email": emails[0], "password": "pw"})
+    with app.app_context():
+        stored = Team.query.filter_by(email=emails[0]).one().password_hash.split("$")[0]
+    assert stored == hasher.method, stored
+    print(f"rehash on login after a cost change: {method} -> {stored}")
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 64, int(args[1]) if len(args) > 1 else 8,
+         int(args[2]) if len(args) > 2 else None, args[3:] or None)
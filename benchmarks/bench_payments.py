@@ -0,0 +1,94 @@
+"""
+Stake checkout: session creation inline in the request vs. the payment queue.
+
+    python -m benchmarks.bench_payments [payments] [latency_ms] [failure_rate]
+
+Runs the real app against a throwaway SQLite file with the FakeStripe
+backend from app/payments.py. "inline" is the old handler: create the
+checkout session (retrying transient failures) before responding. "queued"
+is POST /create_checkout_session today; the queue then creates, polls and
+books every payment, and the run checks each one was booked exactly once.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import func
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def report(label, latencies, total, done):
+    ms = [x * 1000 for x in latencies]
+    print(f"{label:7s} request p50 {percentile(ms, 0.5):7.1f} ms  p99 {percentile(ms, 0.99):7.1f} ms  "
+          f"{done} in {total:5.2f}s")
+
+
+def main(count=200, latency_ms=150, failure_rate=0.1):
+    path = os.path.join(tempfile.mkdtemp(), "bench_payments.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    from app import create_app, db
+    from app import payments
+    from app.models import LedgerEntry, Match, Team, Transaction
+
+    app = create_app()
+    fake = payments.FakeStripe(latency=latency_ms / 1000.0, failure_rate=failure_rate, complete_after=2, seed=3)
+    queue = payments.init_payments(app, fake)
+    queue.poll_every, queue.backoff, queue.max_attempts = 0.2, 0.05, 20
+    with app.app_context():
+        a = Team(name="bench-a", email="a@bench", sport="soccer")
+        b = Team(name="bench-b", email="b@bench", sport="soccer")
+        a.password_hash = b.password_hash = "x"
+        db.session.add_all([a, b])
+        db.session.flush()
+        match = Match(team1_id=a.id, team2_id=b.id, stakes=0.0, status="pending")
+        db.session.add(match)
+        db.session.commit()
+        match_id = match.id
+    print(f"{count} stakes, backend latency {latency_ms} ms, {failure_rate:.0%} transient failures, "
+          f"{queue.workers} queue workers")
+
+    # inline: the request waits on the backend, retrying like the queue would
+    latencies, start = [], time.perf_counter()
+    for i in range(count):
+        t = time.perf_counter()
+        for attempt in range(queue.max_attempts):
+            try:
+                fake.create_session(500, "bench", "", "", f"inline:{i}")
+                break
+            except payments.TransientPaymentError:
+                time.sleep(queue.backoff * 2 ** attempt)
+        latencies.append(time.perf_counter() - t)
+    # confirming the payments would still come on top of this
+    report("inline", latencies, time.perf_counter() - start, "all sessions created")
+
+    client = app.test_client()
+    latencies, start = [], time.perf_counter()
+    for _ in range(count):
+        t = time.perf_counter()
+        r = client.post(f"/create_checkout_session/{match_id}", data={"amount": "5"})
+        latencies.append(time.perf_counter() - t)
+        assert r.status_code == 202, r.data
+    queue.wait_idle()
+    report("queued", latencies, time.perf_counter() - start, "all created, paid and booked")
+
+    with app.app_context():
+        statuses = dict(db.session.query(Transaction.status, func.count())
+                        .filter(Transaction.type == "stake").group_by(Transaction.status).all())
+        stakes = db.session.get(Match, match_id).stakes
+        trial = db.session.query(func.sum(LedgerEntry.amount_cents)).scalar()
+    assert statuses == {"completed": count}, statuses
+    assert stakes == 5.0 * count and trial == 0, (stakes, trial)
+    print(f"queue {queue.stats}; backend calls {fake.calls}, injected failures {fake.failures}, "
+          f"sessions {fake.sessions_created - count} for {count} payments")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 200,
+         int(args[1]) if len(args) > 1 else 150,
+         float(args[2]) if len(args) > 2 else 0.1)
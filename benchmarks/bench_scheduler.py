@@ -0,0 +1,87 @@
+"""
+Season generation: round robin and elimination for 50 / 500 / 5000 teams.
+
+    python -m benchmarks.bench_scheduler [venues]
+
+Runs against a throwaway in-memory SQLite database and times the whole
+create_schedule call (pairing, slotting and the bulk INSERTs), then checks
+that no team or venue is booked twice in a slot. A full round robin for 5000
+teams is 12.5M matches, so that size runs with a rounds cap.
+"""
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import Flask
+
+from app import db
+from app.models import Match, Team, Venue
+from app.scheduler import create_schedule
+from app.utils import grid_cell_for
+
+SIZES = (50, 500, 5000)
+ROUND_CAP = 20
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def seed(n_teams, n_venues):
+    db.session.execute(Team.__table__.insert(), [
+        {"name": f"Team {i}", "email": f"t{i}@bench", "password_hash": "x", "sport": "soccer",
+         "rating": random.gauss(1500, 200), "skill_rating": random.randint(30, 99)}
+        for i in range(n_teams)
+    ])
+    db.session.execute(Venue.__table__.insert(), [
+        {"name": f"Pitch {i}", "latitude": 43.6, "longitude": -79.4, "grid_cell": grid_cell_for(43.6, -79.4)}
+        for i in range(n_venues)
+    ])
+    db.session.commit()
+
+
+def clashes(schedule_id):
+    rows = db.session.query(Match.team1_id, Match.team2_id, Match.venue_id, Match.date) \
+        .filter(Match.schedule_id == schedule_id).all()
+    teams = Counter((t, d) for a, b, _, d in rows for t in (a, b) if t)
+    venues = Counter((v, d) for _, _, v, d in rows)
+    return max(teams.values(), default=0) - 1 + max(venues.values(), default=0) - 1
+
+
+def run(fmt, n, n_venues, rounds=None):
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        seed(n, n_venues)
+        teams = Team.query.all()
+        venues = Venue.query.all()
+        t = time.perf_counter()
+        schedule = create_schedule("soccer", fmt, teams, datetime(2026, 1, 3, 9), venues=venues,
+                                   rounds=rounds, day_slots=6)
+        db.session.commit()
+        elapsed = time.perf_counter() - t
+        bad = clashes(schedule.id)
+        days = (schedule.ends_at - schedule.starts_at).days + 1
+        label = f"{fmt}{f' ({rounds} rounds)' if rounds else ''}"
+        print(f"{n:5d} teams  {label:26s} {schedule.match_count:8d} matches  {elapsed:6.2f}s  "
+              f"{schedule.match_count / elapsed:9.0f} matches/s  {days:4d} days  clashes={bad}")
+        db.session.remove()
+        db.engine.dispose()
+
+
+def main(n_venues=40):
+    random.seed(3)
+    print(f"{n_venues} venues, 6 slots a day")
+    for n in SIZES:
+        run("round_robin", n, n_venues, rounds=ROUND_CAP if n > 500 else None)
+        run("elimination", n, n_venues)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
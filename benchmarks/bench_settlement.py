@@ -0,0 +1,103 @@
+"""
+Settlement throughput: settlement.settle() vs. settling match by match.
+
+    python -m benchmarks.bench_settlement [matches] [players_per_side]
+
+Runs against a throwaway in-memory SQLite database. The per-match baseline
+is what approving results one at a time does: read the winning side, post
+one journal through ledger.post, bump the team and commit.
+"""
+import random
+import sys
+import time
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import func
+
+from app import db
+from app import ledger
+from app.config import Config
+from app.models import LedgerEntry, Match, MatchAssignment, Player, Team
+from app.settlement import settle
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["LEDGER_SNAPSHOT_EVERY"] = Config.LEDGER_SNAPSHOT_EVERY
+    app.config["APP_COMMISSION"] = Config.APP_COMMISSION
+    db.init_app(app)
+    return app
+
+
+def seed(matches, per_side, teams=200):
+    now = datetime(2025, 1, 1)
+    db.session.execute(Team.__table__.insert(), [
+        {"id": t + 1, "name": f"t{t}", "email": f"t{t}@bench", "password_hash": "x", "sport": "soccer"}
+        for t in range(teams)
+    ])
+    db.session.execute(Player.__table__.insert(), [
+        {"id": t * per_side + p + 1, "name": f"p{t}-{p}", "team_id": t + 1}
+        for t in range(teams) for p in range(per_side)
+    ])
+    rows, assigns = [], []
+    for m in range(matches):
+        a, b = random.sample(range(1, teams + 1), 2)
+        rows.append({"id": m + 1, "team1_id": a, "team2_id": b, "sport": "soccer", "status": "completed",
+                     "stakes": round(random.uniform(1, 200), 2), "winner_team_id": random.choice((a, b)),
+                     "created_at": now, "date": now})
+        for side, team in (("A", a), ("B", b)):
+            assigns += [{"match_id": m + 1, "player_id": (team - 1) * per_side + p + 1, "team_side": side}
+                        for p in range(per_side)]
+    db.session.execute(Match.__table__.insert(), rows)
+    db.session.execute(MatchAssignment.__table__.insert(), assigns)
+    db.session.commit()
+
+
+def per_match(multiplier=1.9, rate=Config.APP_COMMISSION):
+    for match in Match.query.filter(Match.status == "completed", Match.settled_at.is_(None)).all():
+        side = "A" if match.winner_team_id == match.team1_id else "B"
+        players = [a.player_id for a in MatchAssignment.query.filter_by(match_id=match.id, team_side=side)]
+        pot = ledger.to_cents(match.stakes)
+        net = round(pot * multiplier) - round(round(pot * multiplier) * rate)
+        share, rem = divmod(net, len(players))
+        legs = [(ledger.match_account(match.id), -pot / 100), (ledger.HOUSE, (pot - net) / 100)]
+        legs += [(ledger.player_account(p), (share + (i < rem)) / 100) for i, p in enumerate(players)]
+        ledger.post("settlement", legs, match_id=match.id)
+        match.settled_at = datetime.utcnow()
+        team = db.session.get(Team, match.winner_team_id)
+        team.total_winnings = (team.total_winnings or 0) + net / 100
+        db.session.commit()
+
+
+def run(label, fn, matches, per_side):
+    random.seed(5)
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        seed(matches, per_side)
+        t = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t
+        trial = db.session.query(func.sum(LedgerEntry.amount_cents)).scalar()
+        paid = db.session.query(func.sum(LedgerEntry.amount_cents)).filter(LedgerEntry.account.like("player:%")).scalar()
+        assert trial == 0, "books do not balance"
+        print(f"{label:10s} {elapsed:6.2f}s  {matches / elapsed:8.0f} matches/s  paid {paid / 100:.2f}")
+        if fn is settle:
+            assert settle()["matches"] == 0, "second settle() paid again"
+        db.session.remove()
+    return paid
+
+
+def main(matches=2_000, per_side=5):
+    print(f"{matches} completed matches, {per_side} players a side")
+    batch = run("settle()", settle, matches, per_side)
+    loop = run("per match", per_match, matches, per_side)
+    assert batch == loop, "batch and per-match payouts differ"
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 2_000, int(args[1]) if len(args) > 1 else 5)
@@ -0,0 +1,73 @@
+"""
+Worker boot time: importing the app, create_app() and the first request.
+
+    python -m benchmarks.bench_startup [runs] [history.jsonl]
+
+Every sample is a fresh interpreter (what a prefork worker or an autoscaled
+instance pays), against a throwaway SQLite file that `flask init-db` has
+already set up. Two modes: SCHEMA_ON_BOOT=1 (create_all, migrations and
+the Free Agent Pool lookup in every worker) and SCHEMA_ON_BOOT=0 (the
+production setting). Prints the median of each phase and which heavy
+modules a booted worker has loaded. With a history file, appends one JSON
+line per run tagged with the git commit, so boot time can be tracked
+across releases.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+app.test_client().get("/")
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "first_request": t3 - t2,
+                  "loaded": sorted(m for m in ("stripe", "numpy", "redis") if m in sys.modules)}))
+"""
+
+
+def sample(env):
+    t = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD], env=env, check=True, capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - t
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main(runs=7, history=None):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_startup.db')}",
+               FLASK_APP="app")
+    subprocess.run([sys.executable, "-m", "flask", "init-db"], env=env, check=True, capture_output=True)
+    print(f"median of {runs} fresh interpreters (seconds)")
+    phases = ("import", "create_app", "first_request", "process")
+    record = {"commit": git_commit(), "runs": runs}
+    for on_boot in ("1", "0"):
+        samples = [sample(dict(env, SCHEMA_ON_BOOT=on_boot)) for _ in range(runs)]
+        medians = {p: round(statistics.median(s[p] for s in samples), 4) for p in phases}
+        record[f"schema_on_boot={on_boot}"] = medians
+        print(f"SCHEMA_ON_BOOT={on_boot}  " + "  ".join(f"{p} {medians[p]:.3f}" for p in phases)
+              + f"  loaded: {', '.join(samples[-1]['loaded']) or 'none'}")
+    if history:
+        with open(history, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"appended to {history}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 7, args[1] if len(args) > 1 else None)
@@ -0,0 +1,119 @@
+"""
+SQLite storage profile: concurrent readers + writers, default vs. tuned.
+
+    python -m benchmarks.bench_storage [seconds] [readers] [writers]
+
+Each reader/writer is a separate process with its own engine, like separate
+web workers. "default" is SQLite's rollback journal with a short busy
+timeout; "tuned" uses the SQLITE_PRAGMAS from Config, a single-connection
+writer pool and query_only reader connections (see app/storage.py).
+"""
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.config import Config
+from app.storage import apply_pragmas
+
+DEFAULT_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": 100}
+
+
+def make_engine(path, profile, read_only=False):
+    pragmas = Config.SQLITE_PRAGMAS if profile == "tuned" else DEFAULT_PRAGMAS
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": pragmas["busy_timeout"] / 1000.0},
+                           pool_size=1, max_overflow=0)
+    apply_pragmas(engine, pragmas, read_only=read_only and profile == "tuned")
+    return engine
+
+
+def setup(path):
+    engine = make_engine(path, "tuned")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE team (id INTEGER PRIMARY KEY, name TEXT, skill_rating INTEGER)"))
+        conn.execute(text("CREATE TABLE match (id INTEGER PRIMARY KEY, team1_id INTEGER, team2_id INTEGER, stakes FLOAT)"))
+        conn.execute(text("CREATE INDEX ix_match_team1_id ON match (team1_id)"))
+        conn.execute(text("INSERT INTO team (name, skill_rating) VALUES " +
+                          ",".join(f"('t{i}', {random.randint(500, 2000)})" for i in range(2000))))
+        conn.execute(text("INSERT INTO match (team1_id, team2_id, stakes) VALUES " +
+                          ",".join(f"({random.randint(1, 2000)}, {random.randint(1, 2000)}, 5)" for _ in range(20000))))
+    engine.dispose()
+
+
+def reader(path, profile, seconds, out):
+    engine = make_engine(path, profile, read_only=True)
+    ops = errors = 0
+    stop = time.perf_counter() + seconds
+    while time.perf_counter() < stop:
+        try:
+            with engine.connect() as conn:
+                tid = random.randint(1, 2000)
+                conn.execute(text(
+                    "SELECT m.id, t.name FROM match m JOIN team t ON t.id = m.team2_id WHERE m.team1_id = :t"
+                ), {"t": tid}).fetchall()
+            ops += 1
+        except OperationalError:
+            errors += 1
+    out.put(("read", ops, errors))
+
+
+def writer(path, profile, seconds, out):
+    engine = make_engine(path, profile)
+    ops = errors = 0
+    stop = time.perf_counter() + seconds
+    while time.perf_counter() < stop:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("INSERT INTO match (team1_id, team2_id, stakes) VALUES (:a, :b, 5)"),
+                             {"a": random.randint(1, 2000), "b": random.randint(1, 2000)})
+                conn.execute(text("UPDATE team SET skill_rating = skill_rating + 1 WHERE id = :a"),
+                             {"a": random.randint(1, 2000)})
+            ops += 1
+        except OperationalError:
+            errors += 1
+    out.put(("write", ops, errors))
+
+
+def run(profile, seconds, readers, writers):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    setup(path)
+    if profile == "default":
+        with make_engine(path, "default").begin() as conn:
+            conn.execute(text("PRAGMA journal_mode=DELETE"))
+    out = mp.Queue()
+    procs = [mp.Process(target=reader, args=(path, profile, seconds, out)) for _ in range(readers)]
+    procs += [mp.Process(target=writer, args=(path, profile, seconds, out)) for _ in range(writers)]
+    for p in procs:
+        p.start()
+    totals = {"read": [0, 0], "write": [0, 0]}
+    for _ in procs:
+        kind, ops, errors = out.get()
+        totals[kind][0] += ops
+        totals[kind][1] += errors
+    for p in procs:
+        p.join()
+    return {k: (ops / seconds, errors) for k, (ops, errors) in totals.items()}
+
+
+def main(seconds=3.0, readers=6, writers=2):
+    print(f"{readers} reader / {writers} writer processes, {seconds:.0f}s per profile")
+    results = {}
+    for profile in ("default", "tuned"):
+        results[profile] = run(profile, seconds, readers, writers)
+        r, w = results[profile]["read"], results[profile]["write"]
+        print(f"{profile:8s} reads {r[0]:9.0f}/s ({r[1]} locked)   writes {w[0]:7.0f}/s ({w[1]} locked)")
+    base, tuned = results["default"], results["tuned"]
+    print(f"read throughput x{tuned['read'][0] / max(base['read'][0], 1):.1f}, "
+          f"write throughput x{tuned['write'][0] / max(base['write'][0], 1):.1f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(float(args[0]) if args else 3.0,
+         int(args[1]) if len(args) > 1 else 6,
+         int(args[2]) if len(args) > 2 else 2)
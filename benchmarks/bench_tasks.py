@@ -0,0 +1,84 @@
+"""
+Request latency with follow-up work inline vs. on the background runner.
+
+    python -m benchmarks.bench_tasks [results] [players_per_side] [interval_ms]
+
+Runs the real app against a throwaway SQLite file, one process per mode.
+Each request is POST /admin/match/<id>/set_result, one every interval_ms;
+its follow-up (win/loss counters, ratings and rating history for every
+participant) runs either inline (TASKS_EAGER) or after the commit on
+app/tasks.py's runner, in which case the run waits for the queue to drain
+and checks every result was recorded. Both modes share the single SQLite
+writer connection, so with no gap between requests (interval 0) each
+request queues behind the previous follow-up and latency is the same.
+"""
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_payments import percentile
+
+
+def run(eager, results, per_side, interval):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_tasks.db')}"
+    os.environ["TASKS_EAGER"] = "1" if eager else "0"
+    from app import create_app, db
+    from app.models import Match, MatchAssignment, Player, Team
+
+    app = create_app()
+    with app.app_context():
+        teams = [Team(name=f"bench-{eager}-{i}", email=f"{eager}{i}@bench", sport="soccer") for i in range(2)]
+        for t in teams:
+            t.password_hash = "x"
+        db.session.add_all(teams)
+        db.session.flush()
+        players = {side: [Player(name=f"p{side}{i}", team_id=t.id) for i in range(per_side)]
+                   for side, t in zip("AB", teams)}
+        db.session.add_all(players["A"] + players["B"])
+        db.session.flush()
+        ids = []
+        for _ in range(results):
+            m = Match(team1_id=teams[0].id, team2_id=teams[1].id, sport="soccer", status="pending", stakes=0.0)
+            db.session.add(m)
+            db.session.flush()
+            db.session.add_all([MatchAssignment(match_id=m.id, player_id=p.id, team_side=side)
+                                for side, ps in players.items() for p in ps])
+            ids.append(m.id)
+        db.session.commit()
+        winner = teams[0].id
+
+    client = app.test_client()
+    latencies, start = [], time.perf_counter()
+    for i, match_id in enumerate(ids):
+        time.sleep(max(0.0, start + i * interval / 1000.0 - time.perf_counter()))
+        t = time.perf_counter()
+        client.post(f"/admin/match/{match_id}/set_result?admin=true", data={"winner_team_id": str(winner)})
+        latencies.append((time.perf_counter() - t) * 1000)
+    runner = app.extensions["tasks"]
+    runner.wait()
+    total = time.perf_counter() - start
+    with app.app_context():
+        recorded = Match.query.filter(Match.id.in_(ids), Match.result_recorded.is_(True)).count()
+    assert recorded == results, f"{recorded}/{results} results recorded"
+    label = "inline" if eager else "background"
+    print(f"{label:10s} request p50 {percentile(latencies, 0.5):6.1f} ms  p99 {percentile(latencies, 0.99):6.1f} ms  "
+          f"all recorded in {total:5.2f}s  {runner.stats}")
+    runner.drain()
+
+
+def main(results=300, per_side=11, interval=60):
+    print(f"{results} results, {per_side} players a side, one request every {interval} ms")
+    # routes register on the first app of a process, so each mode gets its own
+    ctx = mp.get_context("spawn")
+    for eager in (True, False):
+        proc = ctx.Process(target=run, args=(eager, results, per_side, interval))
+        proc.start()
+        proc.join()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 300, int(args[1]) if len(args) > 1 else 11,
+         int(args[2]) if len(args) > 2 else 60)
@@ -0,0 +1,75 @@
+"""
+Nearest-venue lookup: grid-cell index vs. scanning every venue.
+
+    python -m benchmarks.bench_venues [n_venues]
+
+Runs against a throwaway in-memory SQLite database.
+"""
+import random
+import sys
+import time
+
+from flask import Flask
+
+from app import db
+from app.models import Venue
+from app.ai_matchmaking import nearest_venues
+from app.utils import grid_cell_for, haversine_km
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def seed(n):
+    # clustered around a few metro areas, like real venues
+    centres = [(43.65, -79.38), (40.71, -74.00), (51.50, -0.12), (34.05, -118.24), (-33.86, 151.20)]
+    rows = []
+    for i in range(n):
+        clat, clon = random.choice(centres)
+        lat = clat + random.gauss(0, 0.8)
+        lon = clon + random.gauss(0, 0.8)
+        rows.append({"name": f"Venue {i}", "latitude": lat, "longitude": lon,
+                     "grid_cell": grid_cell_for(lat, lon)})
+    db.session.execute(Venue.__table__.insert(), rows)
+    db.session.commit()
+
+
+def scan(lat, lon, k):
+    venues = Venue.query.all()
+    return sorted(venues, key=lambda v: haversine_km(lat, lon, v.latitude, v.longitude))[:k]
+
+
+def main(n=100_000, queries=50, k=3):
+    random.seed(7)
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        t = time.perf_counter()
+        seed(n)
+        print(f"seeded {n} venues in {time.perf_counter() - t:.2f}s")
+
+        points = [(43.65 + random.uniform(-1, 1), -79.38 + random.uniform(-1, 1)) for _ in range(queries)]
+
+        t = time.perf_counter()
+        grid = [[v.id for v in nearest_venues(lat, lon, k)] for lat, lon in points]
+        grid_ms = (time.perf_counter() - t) * 1000 / queries
+        db.session.expunge_all()
+
+        scan_points = points[:5]
+        t = time.perf_counter()
+        full = [[v.id for v in scan(lat, lon, k)] for lat, lon in scan_points]
+        scan_ms = (time.perf_counter() - t) * 1000 / len(scan_points)
+
+        assert grid[:len(full)] == full, "grid index disagrees with full scan"
+        print(f"grid index : {grid_ms:8.2f} ms / query")
+        print(f"full scan  : {scan_ms:8.2f} ms / query")
+        print(f"speedup    : {scan_ms / grid_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -1,7 +1,9 @@
 from app import create_app
-import stripe
 
-app = create_app()
+# process-pool workers (balance_many, password hashing) are spawned and
+# re-import this file as __mp_main__; they must not boot an app of their own
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,23 @@
+import os
+import tempfile
+
+import pytest
+
+# one app per test session: routes only register on the first create_app()
+_DB_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ["PAYMENT_BACKEND"] = "fake"
+os.environ["TASKS_EAGER"] = "1"
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import create_app
+    app = create_app()
+    app.config.update(TESTING=True, PAYMENT_POLL_S=0.05, PAYMENT_RETRY_BACKOFF_S=0.01)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,179 @@
+import itertools
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import balance_teams, constrained_balance, kway_balance, optimal_balance, skill_balance
+
+SEEDS = range(40)
+
+
+def _players(rng, n, lo=0, hi=100, roles=("GK", "DF", "FW")):
+    return [SimpleNamespace(id=i, skill_rating=rng.randint(lo, hi), role=rng.choice(roles)) for i in range(n)]
+
+
+def _gap(team_a, team_b):
+    return abs(sum(p.skill_rating for p in team_a) - sum(p.skill_rating for p in team_b))
+
+
+def _is_split(players, *teams):
+    ids = sorted(p.id for t in teams for p in t)
+    sizes = [len(t) for t in teams]
+    return ids == sorted(p.id for p in players) and max(sizes) - min(sizes) <= 1
+
+
+def _best_gap(players, ok=lambda side_a: True):
+    """Smallest rating gap over every equal-size (+/- 1) split that `ok` accepts, or None."""
+    n = len(players)
+    best = None
+    for size in {n // 2, n - n // 2}:
+        for side_a in itertools.combinations(players, size):
+            ids = {p.id for p in side_a}
+            if not ok(ids):
+                continue
+            gap = _gap(side_a, [p for p in players if p.id not in ids])
+            best = gap if best is None else min(best, gap)
+    return best
+
+
+# -------------------------
+# optimal_balance / balance_teams (exact)
+# -------------------------
+@pytest.mark.parametrize("seed", SEEDS)
+def test_optimal_balance_matches_brute_force(seed):
+    rng = random.Random(seed)
+    players = _players(rng, rng.randint(2, 12))
+    team_a, team_b = optimal_balance(players)
+    assert _is_split(players, team_a, team_b) and len(team_a) == len(players) // 2
+    assert _gap(team_a, team_b) == _best_gap(players)
+
+
+@pytest.mark.parametrize("n", [0, 1])
+def test_balance_teams_tiny(n):
+    players = _players(random.Random(n), n)
+    assert balance_teams(players) == (players, [])
+
+
+@pytest.mark.parametrize("n", [2, 7, 12])
+def test_equal_ratings_split_evenly(n):
+    players = [SimpleNamespace(id=i, skill_rating=50, role=None) for i in range(n)]
+    team_a, team_b = balance_teams(players)
+    assert _is_split(players, team_a, team_b) and _gap(team_a, team_b) == 50 * (n % 2)
+    sums = [sum(p.skill_rating for p in t) for t in kway_balance(players, 3)]
+    assert max(sums) - min(sums) == (50 if n % 3 else 0)
+
+
+# -------------------------
+# kway_balance / skill_balance (local search: valid, near the optimum)
+# -------------------------
+@pytest.mark.parametrize("seed", SEEDS)
+def test_kway_balance_against_brute_force(seed):
+    rng = random.Random(seed)
+    n, k = rng.randint(0, 8), 3
+    players = _players(rng, n)
+    teams = kway_balance(players, k, deadline_ms=1000)
+    assert len(teams) == k and _is_split(players, *teams)
+
+    spread = lambda sums: max(sums) - min(sums)
+    best = min(
+        spread([sum(p.skill_rating for p, t in zip(players, labels) if t == team) for team in range(k)])
+        for labels in itertools.product(range(k), repeat=n)
+        if max(labels.count(t) for t in range(k)) - min(labels.count(t) for t in range(k)) <= 1
+    )
+    got = spread([sum(p.skill_rating for p in t) for t in teams])
+    assert best <= got <= best + max([p.skill_rating for p in players], default=0)
+
+
+def test_kway_balance_rejects_k_below_two():
+    with pytest.raises(ValueError):
+        kway_balance(_players(random.Random(0), 4), 1)
+
+
+def test_skill_balance_against_brute_force():
+    rng = random.Random(7)
+    exact = 0
+    for _ in range(40):
+        n = rng.randint(2, 10)
+        vectors = [[rng.randint(0, 10) for _ in range(3)] for _ in range(n)]
+        players = [SimpleNamespace(id=i) for i in range(n)]
+        team_a, team_b, gap = skill_balance(players, vectors, deadline_ms=1000)
+        assert _is_split(players, team_a, team_b) and len(team_a) == n // 2
+        in_a = {p.id for p in team_a}
+        assert gap == [sum(v[d] * (1 if i in in_a else -1) for i, v in enumerate(vectors)) for d in range(3)]
+
+        best = min(
+            max(abs(sum(v[d] * (1 if i in side_a else -1) for i, v in enumerate(vectors))) for d in range(3))
+            for side_a in map(set, itertools.combinations(range(n), n // 2))
+        )
+        got = max(abs(g) for g in gap)
+        assert best <= got <= best + 10
+        exact += got == best
+    assert exact >= 36
+
+
+@pytest.mark.parametrize("n", [0, 1])
+def test_skill_balance_tiny(n):
+    players = [SimpleNamespace(id=i) for i in range(n)]
+    vectors = [[3, 4]] * n
+    assert skill_balance(players, vectors) == (players, [], [3.0, 4.0] if n else [])
+
+
+def test_skill_balance_equal_vectors():
+    players = [SimpleNamespace(id=i) for i in range(6)]
+    team_a, team_b, gap = skill_balance(players, [[5, 5]] * 6)
+    assert len(team_a) == len(team_b) == 3 and gap == [0.0, 0.0]
+
+
+# -------------------------
+# constrained_balance (exact search within the deadline)
+# -------------------------
+@pytest.mark.parametrize("seed", SEEDS)
+def test_constrained_balance_matches_brute_force(seed):
+    rng = random.Random(seed)
+    n = rng.randint(2, 12)
+    players = _players(rng, n, lo=1)
+    ids = [p.id for p in players]
+    rng.shuffle(ids)
+    locked = {ids[0]: "A", ids[1]: "B"} if n >= 4 else {}
+    together = [ids[2:4]] if n >= 6 else []
+    apart = [ids[4:6]] if n >= 8 else []
+    quota = {"GK": 1} if sum(p.role == "GK" for p in players) >= 2 else None
+
+    def ok(side_a):
+        return all((pid in side_a) == (side == "A") for pid, side in locked.items()) \
+            and all(len({pid in side_a for pid in g}) == 1 for g in together) \
+            and all(len({pid in side_a for pid in g}) == len(g) for g in apart) \
+            and all(sum(p.role == r and p.id in side_a for p in players) >= q and
+                    sum(p.role == r and p.id not in side_a for p in players) >= q for r, q in (quota or {}).items())
+
+    best = _best_gap(players, ok)
+    if best is None:
+        with pytest.raises(ValueError):
+            constrained_balance(players, locked, together, apart, quota, deadline_ms=2000)
+        return
+    team_a, team_b = constrained_balance(players, locked, together, apart, quota, deadline_ms=2000)
+    assert _is_split(players, team_a, team_b) and ok({p.id for p in team_a})
+    # the search stops early once the gap is 0 or 1
+    got = _gap(team_a, team_b)
+    assert got == best or got <= 1 and best <= 1
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"apart": [[0, 1, 2]]},                        # three players, two sides
+    {"together": [[0, 1]], "locked": {0: "A", 1: "B"}},
+    {"together": [[0, 1]], "apart": [[0, 1]]},
+    {"together": [[0, 1, 2, 3]]},                  # bigger than a side
+    {"role_quota": {"GK": 4}},
+])
+def test_constrained_balance_unsatisfiable(kwargs):
+    players = _players(random.Random(0), 6, roles=("GK",))
+    with pytest.raises(ValueError):
+        constrained_balance(players, **kwargs)
+
+
+@pytest.mark.parametrize("n", [0, 1])
+def test_constrained_balance_tiny(n):
+    players = _players(random.Random(n), n)
+    team_a, team_b = constrained_balance(players)
+    assert _is_split(players, team_a, team_b)
@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import func
+
+from app import db, ledger
+from app.models import LedgerEntry, Match, Player, Team
+from app.settlement import settle
+
+
+def _teams(prefix, players=0):
+    a = Team(name=f"{prefix}-a", email=f"{prefix}-a@test", sport="soccer", password_hash="x")
+    b = Team(name=f"{prefix}-b", email=f"{prefix}-b@test", sport="soccer", password_hash="x")
+    db.session.add_all([a, b])
+    db.session.flush()
+    db.session.add_all([Player(name=f"{prefix}-p{i}", team_id=a.id) for i in range(players)])
+    return a, b
+
+
+def test_settlement_balances_and_runs_once(app):
+    with app.app_context():
+        a, b = _teams("led-settle", players=3)
+        c, d = _teams("led-noroster")
+        matches = [
+            Match(team1_id=a.id, team2_id=b.id, sport="soccer", status="completed", stakes=10.0, winner_team_id=a.id),
+            Match(team1_id=d.id, team2_id=c.id, sport="soccer", status="completed", stakes=7.0, winner_team_id=c.id),
+        ]
+        db.session.add_all(matches)
+        db.session.commit()
+        ids = [m.id for m in matches]
+
+        assert settle(ids)["matches"] == 2
+        per_tx = db.session.query(LedgerEntry.transaction_id, func.sum(LedgerEntry.amount_cents)) \
+            .filter(LedgerEntry.match_id.in_(ids)).group_by(LedgerEntry.transaction_id).all()
+        assert per_tx and all(total == 0 for _, total in per_tx)
+
+        count = LedgerEntry.query.count()
+        assert settle(ids)["matches"] == 0
+        db.session.expire_all()
+        for m in matches:
+            db.session.get(Match, m.id).settled_at = None
+        db.session.commit()
+        assert settle(ids)["entries"] == 0
+        assert LedgerEntry.query.count() == count
+
+        # paid to the roster (split to the cent), or the team's own account without one
+        players = sum(ledger.balance_cents(ledger.player_account(p.id))[0] for p in Player.query.filter_by(team_id=a.id))
+        assert ledger.team_winnings_cents(a.id) == players > 0
+        assert ledger.team_winnings_cents(c.id) == ledger.balance_cents(ledger.team_account(c.id))[0] > 0
+        assert ledger.team_winnings_cents(b.id) == ledger.team_winnings_cents(d.id) == 0
+
+
+def test_snapshot_plus_later_entries_is_the_balance(app):
+    with app.app_context():
+        account = "team:snapshot-test"
+        for amount in (5, 2.5, -1.25):
+            ledger.post("adjustment", [(ledger.HOUSE, -amount), (account, amount)])
+        ledger.snapshot(account)
+        db.session.commit()
+        for amount in (3, -0.5):
+            ledger.post("adjustment", [(ledger.HOUSE, -amount), (account, amount)])
+        db.session.commit()
+
+        total, read = ledger.balance_cents(account)
+        assert total == db.session.query(func.sum(LedgerEntry.amount_cents)).filter_by(account=account).scalar() == 875
+        assert read == 2
+
+
+def test_unbalanced_journal_is_rejected(app):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            ledger.post("adjustment", [(ledger.HOUSE, -1), ("team:unbalanced", 2)])
+        db.session.rollback()
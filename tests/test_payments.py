@@ -0,0 +1,34 @@
+import time
+
+from app import db
+from app.models import Match, Team, Transaction
+
+
+def _match(app):
+    with app.app_context():
+        a = Team(name="pay-a", email="pay-a@test", sport="soccer", password_hash="x")
+        b = Team(name="pay-b", email="pay-b@test", sport="soccer", password_hash="x")
+        db.session.add_all([a, b])
+        db.session.flush()
+        match = Match(team1_id=a.id, team2_id=b.id, sport="soccer", status="pending", stakes=0.0)
+        db.session.add(match)
+        db.session.commit()
+        return match.id
+
+
+def test_checkout_is_booked_by_the_queue(app, client):
+    match_id = _match(app)
+    r = client.post(f"/create_checkout_session/{match_id}", data={"amount": "5"})
+    assert r.status_code == 202
+    status_url = r.headers["Location"]
+
+    # the queue is built lazily by the route, from current_app
+    deadline = time.monotonic() + 10
+    while client.get(status_url).json["status"] != "completed" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert client.get(status_url).json["status"] == "completed"
+
+    with app.app_context():
+        tx = db.session.get(Transaction, r.json["transaction_id"])
+        assert tx.stripe_payment_id and tx.checkout_url
+        assert db.session.get(Match, match_id).stakes == 5.0
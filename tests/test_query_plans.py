@@ -0,0 +1,56 @@
+import os
+import shutil
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app import db
+from app.migrations import MIGRATIONS, check_query_plans, upgrade
+
+LEGACY_DB = os.path.join(os.path.dirname(__file__), os.pardir, "instance", "sports.db")
+
+
+@pytest.fixture
+def engine_for(tmp_path):
+    engines = []
+
+    def make(name, source=None):
+        path = tmp_path / name
+        if source:
+            shutil.copy(source, path)
+        engine = create_engine(f"sqlite:///{path}")
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+def _build(engine):
+    # what create_app does on boot and `flask init-db` does once
+    db.metadata.create_all(engine)
+    return upgrade(engine)
+
+
+def test_app_database_uses_indexes(app):
+    with app.app_context():
+        assert check_query_plans() == []
+
+
+def test_fresh_database_uses_indexes(app, engine_for):
+    engine = engine_for("fresh.db")
+    assert _build(engine) == [number for number, _, _ in MIGRATIONS]
+    with app.app_context():
+        assert check_query_plans(engine) == []
+
+
+def test_upgraded_legacy_database_uses_indexes(app, engine_for):
+    engine = engine_for("legacy.db", source=LEGACY_DB)
+    with engine.connect() as conn:
+        assert "schema_version" not in {r[0] for r in conn.execute(text("SELECT name FROM sqlite_master"))}
+    _build(engine)
+    with app.app_context():
+        assert check_query_plans(engine) == []
+    # a second run is a no-op
+    assert upgrade(engine) == []
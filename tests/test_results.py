@@ -0,0 +1,82 @@
+from app import db
+from app.models import Match, Player, RatingHistory, Team
+from app.stats import record_result
+
+
+def _match(app, prefix, stakes=0.0):
+    with app.app_context():
+        a = Team(name=f"{prefix}-a", email=f"{prefix}-a@test", sport="soccer", password_hash="x")
+        b = Team(name=f"{prefix}-b", email=f"{prefix}-b@test", sport="soccer", password_hash="x")
+        db.session.add_all([a, b])
+        db.session.flush()
+        db.session.add_all([Player(name=f"{prefix}-{t.name}-{i}", team_id=t.id) for t in (a, b) for i in range(2)])
+        match = Match(team1_id=a.id, team2_id=b.id, sport="soccer", status="pending", stakes=stakes)
+        db.session.add(match)
+        db.session.commit()
+        return match.id, a.id, b.id
+
+
+def _ratings(team_id):
+    team = db.session.get(Team, team_id)
+    return team.rating, [p.rating for p in Player.query.filter_by(team_id=team_id).order_by(Player.id)]
+
+
+def test_recorded_result_moves_both_sides(app, client):
+    match_id, a, b = _match(app, "res-rate")
+    with app.app_context():
+        before = _ratings(a), _ratings(b)
+
+    r = client.post(f"/mark_result/{match_id}", data={"winner_id": b})
+    assert r.status_code == 302
+
+    with app.app_context():
+        (team_a, players_a), (team_b, players_b) = _ratings(a), _ratings(b)
+        (old_a, old_players_a), (old_b, old_players_b) = before
+        assert team_b > old_b and team_a < old_a
+        assert all(new > old for new, old in zip(players_b, old_players_b))
+        assert all(new < old for new, old in zip(players_a, old_players_a))
+        match = db.session.get(Match, match_id)
+        assert match.result_recorded and match.winner_team_id == b
+        assert RatingHistory.query.filter_by(match_id=match_id, kind="rating").count() == 4
+
+        # a second recording changes nothing
+        assert record_result(match, "A") is False
+        assert _ratings(a) == (team_a, players_a)
+
+
+def test_draw_leaves_ratings_alone(app, client):
+    match_id, a, b = _match(app, "res-draw")
+    with app.app_context():
+        before = _ratings(a), _ratings(b)
+    client.post(f"/mark_result/{match_id}", data={"winner_id": 0})
+    with app.app_context():
+        assert (_ratings(a), _ratings(b)) == before
+        assert db.session.get(Match, match_id).winner_team_id is None
+
+
+def test_writes_invalidate_cached_pages(app):
+    match_id, a, b = _match(app, "res-cache", stakes=10.0)
+    reader, writer = app.test_client(), app.test_client()
+    with reader.session_transaction() as s:
+        s["team_id"] = a
+
+    def get(url):
+        r = reader.get(url)
+        assert r.status_code == 200
+        return r
+
+    for url in (f"/teams/{a}", f"/api/team/{a}/winnings"):
+        assert get(url).headers["X-Cache"] == "MISS"
+        assert get(url).headers["X-Cache"] == "HIT"
+
+    # an ORM write (player added to the roster) bumps the team's version
+    writer.post(f"/teams/{a}/add_player", data={"name": "res-cache-new"})
+    r = get(f"/teams/{a}")
+    assert r.headers["X-Cache"] == "MISS" and b"res-cache-new" in r.data
+
+    # settlement's bulk writes bump it too: the new winnings are served, not the cached zero
+    assert get(f"/api/team/{a}/winnings").json["total_winnings"] == 0
+    writer.post(f"/mark_result/{match_id}", data={"winner_id": a})
+    r = get(f"/api/team/{a}/winnings")
+    assert r.headers["X-Cache"] == "MISS" and r.json["total_winnings"] > 0
+    assert get(f"/api/team/{a}/winnings").headers["X-Cache"] == "HIT"